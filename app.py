@@ -1,100 +1,362 @@
 import os
 os.environ['PYTHONIOENCODING'] = 'utf-8'
 
-from flask import Flask, render_template, request, redirect, url_for, session, flash, g
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g, jsonify, Response, send_from_directory
 import sqlite3
 import re
-from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
+import io
+import csv
+import gzip
+import mimetypes
+import json
+import hashlib
+import tempfile
+import base64
+import random
+import threading
+import functools
+import collections
+import queue
+import atexit
+import multiprocessing
+import click
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from time import perf_counter, sleep, time as unix_time
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from jinja2 import FileSystemBytecodeCache
 from datetime import datetime, timedelta, timezone
 
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it uploads are stored and served as uploaded
+    Image = ImageOps = None
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional: assets are then precompressed with gzip only
+    brotli = None
+
+# Password hashing processes are started with 'spawn', which re-runs the main script as __mp_main__
+# when the app is launched with `python app.py`; they only need the hashing functions, not the boot work
+SPAWNED_CHILD = __name__ == '__mp_main__'
+
+# Milliseconds spent on each step of bringing a worker up (see boot_step)
+BOOT_STARTED = perf_counter()
+boot_timings = {}
+
+@contextmanager
+def boot_step(name):
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        boot_timings[name] = (perf_counter() - started) * 1000
+
 def get_now():
     """Returns current time in IST (UTC+5:30)"""
     return datetime.now(timezone(timedelta(hours=5, minutes=30)))
 
 class SQLite:
-    def __init__(self, db_path):
+    """Per-worker pool of long-lived, tuned SQLite connections.
+
+    db.connection hands the current request a pooled connection and teardown
+    returns it, so PRAGMAs and the statement cache survive across requests.
+    WAL mode lets page views read while a booking holds the write lock.
+    Connections idle longer than health_check_after are pinged before reuse,
+    and the pool is discarded if the process forks.
+    """
+    def __init__(self, db_path, pool_size=8, pool_timeout=10, busy_timeout_ms=5000, journal_mode='WAL',
+                 synchronous='NORMAL', cache_size_kb=16384, mmap_size=256 * 1024 * 1024,
+                 statement_cache=256, health_check_after=30):
         self.db_path = db_path
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.statement_cache = statement_cache
+        self.health_check_after = health_check_after
+        self._reset_pool()
+
+    def _reset_pool(self):
+        self._pid = os.getpid()
+        self._idle = []  # (connection, released_at), most recently used last
+        self._created = 0
+        self._available = threading.Condition()
+
+    def connect(self):
+        """Opens a new tuned connection (not tracked by the pool)"""
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False,
+                               cached_statements=self.statement_cache)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        conn.execute(f'PRAGMA cache_size = -{int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        # Enable foreign keys for SQLite
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        if self._pid != os.getpid():
+            self._reset_pool()
+        with self._available:
+            while True:
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    if unix_time() - released_at < self.health_check_after or self._is_healthy(conn):
+                        return conn
+                    self._created -= 1
+                    continue
+                if self._created < self.pool_size:
+                    self._created += 1
+                    break
+                if not self._available.wait(self.pool_timeout):
+                    raise RuntimeError(f'No database connection available after {self.pool_timeout}s (pool size {self.pool_size})')
+        try:
+            return self.connect()
+        except Exception:
+            with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
+
+    def release(self, conn):
+        if self._pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.set_trace_callback(None)
+        except sqlite3.Error:
+            conn.close()
+            with self._available:
+                self._created -= 1
+                self._available.notify()
+            return
+        with self._available:
+            self._idle.append((conn, unix_time()))
+            self._available.notify()
+
+    @contextmanager
+    def borrow(self):
+        """Pooled connection for work outside a request (background threads, CLI)"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
 
     @property
     def connection(self):
         if 'db_conn' not in g:
-            g.db_conn = sqlite3.connect(self.db_path)
-            g.db_conn.row_factory = sqlite3.Row
-            # Enable foreign keys for SQLite
-            g.db_conn.execute("PRAGMA foreign_keys = ON")
+            g.db_conn = self.acquire()
         return g.db_conn
 
     def teardown(self, exception):
         db_conn = g.pop('db_conn', None)
         if db_conn is not None:
-            db_conn.close()
+            self.release(db_conn)
 
 # --- DS (Data Structures) for Search ---
 class TrieNode:
     def __init__(self):
         self.children = {}
         self.is_end_of_word = False
+        self.terms = {}   # (kind, display) -> how many shops/services use the term
+        self.top = {}     # kind -> best (count, display) in this subtree, highest first
+        self.size = {}    # kind -> distinct terms in this subtree
+
+def _rank_key(entry):
+    return (-entry[0], entry[1])
 
 class ShopTrie:
-    def __init__(self):
+    """Prefix index over areas, shop names and service names.
+
+    Terms are reference counted per kind, so removing one shop's area only
+    drops the area once no shop uses it. Every node keeps the top_k most used
+    terms of its subtree per kind, which lets ranked prefix queries stop at
+    the prefix node instead of walking the whole subtree.
+    """
+    def __init__(self, top_k=10):
         self.root = TrieNode()
+        self.top_k = top_k
+        self.counts = {}  # (kind, display) -> count, for listing and removal
 
-    def insert(self, word):
+    def insert(self, word, kind='area', count=1, refresh=True):
         if not word: return
+        key = (kind, word)
+        self.counts[key] = self.counts.get(key, 0) + count
+        path = [self.root]
         node = self.root
         for char in word.lower():
             if char not in node.children:
                 node.children[char] = TrieNode()
             node = node.children[char]
+            path.append(node)
         node.is_end_of_word = True
-
-    def search_prefix(self, prefix):
-        if not prefix: return True
+        node.terms[key] = node.terms.get(key, 0) + count
+        if refresh:
+            self._refresh_path(path, kind)
+
+    def remove(self, word, kind='area', count=1):
+        key = (kind, word)
+        if not word or key not in self.counts: return
+        remaining = self.counts[key] - count
+        path = [self.root]
         node = self.root
-        for char in prefix.lower():
-            if char not in node.children:
-                return False
+        for char in word.lower():
             node = node.children[char]
-        return True
+            path.append(node)
+        if remaining > 0:
+            self.counts[key] = remaining
+            node.terms[key] = remaining
+        else:
+            del self.counts[key]
+            del node.terms[key]
+            node.is_end_of_word = bool(node.terms)
+        self._refresh_path(path, kind)
+        # Prune branches that no longer lead to any term
+        for depth in range(len(path) - 1, 0, -1):
+            child = path[depth]
+            if child.terms or child.children:
+                break
+            del path[depth - 1].children[word.lower()[depth - 1]]
+
+    def _recompute(self, node, kind):
+        entries = [(count, display) for (k, display), count in node.terms.items() if k == kind]
+        size = len(entries)
+        for child in node.children.values():
+            entries.extend(child.top.get(kind, ()))
+            size += child.size.get(kind, 0)
+        entries.sort(key=_rank_key)
+        if entries:
+            node.top[kind] = entries[:self.top_k]
+            node.size[kind] = size
+        else:
+            node.top.pop(kind, None)
+            node.size.pop(kind, None)
+
+    def _refresh_path(self, path, kind):
+        for node in reversed(path):
+            self._recompute(node, kind)
+
+    def refresh_all(self):
+        """Recomputes every node's top lists bottom-up (after bulk inserts with refresh=False)"""
+        kinds = {kind for kind, _ in self.counts}
+        stack = [(self.root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if children_done:
+                for kind in kinds:
+                    self._recompute(node, kind)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values())
 
-    def get_all_with_prefix(self, prefix):
-        """Returns all words in the trie that start with prefix"""
-        if not prefix: return []
+    def _find(self, prefix):
         node = self.root
         for char in prefix.lower():
             if char not in node.children:
-                return []
+                return None
             node = node.children[char]
-        
+        return node
+
+    def search_prefix(self, prefix):
+        if not prefix: return True
+        return self._find(prefix) is not None
+
+    def top_matches(self, prefix, kind='area', k=None):
+        """Most used terms of a kind starting with prefix, as (display, count), best first"""
+        node = self._find(prefix or '')
+        if node is None:
+            return []
+        return [(display, count) for count, display in node.top.get(kind, ())[:k or self.top_k]]
+
+    def get_all_with_prefix(self, prefix, kind='area'):
+        """Returns all terms of a kind that start with prefix"""
+        if not prefix: return []
+        node = self._find(prefix)
+        if node is None:
+            return []
+        # The node's top list is already complete when the subtree is small
+        if node.size.get(kind, 0) <= self.top_k:
+            return [display for _, display in node.top.get(kind, ())]
         results = []
-        self._dfs(node, prefix.lower(), results)
+        self._dfs(node, kind, results)
         return results
 
-    def _dfs(self, node, prefix, results):
+    def _dfs(self, node, kind, results):
         if node.is_end_of_word:
-            results.append(prefix)
-        for char, child_node in node.children.items():
-            self._dfs(child_node, prefix + char, results)
-
-# Initialize Search Index
-search_index = ShopTrie()
-
-def rebuild_search_index():
-    global search_index
-    search_index = ShopTrie()
-    with app.app_context():
-        # We can't use g here outside a request easily if not using app_context properly
-        # but since this runs in a thread or on startup, we'll connect directly
-        db_path = app.config['DATABASE']
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT area FROM shops")
-        areas = cursor.fetchall()
-        for area in areas:
-            if area[0]:
-                search_index.insert(area[0])
-        conn.close()
+            results.extend(display for (k, display) in node.terms if k == kind)
+        for child_node in node.children.values():
+            self._dfs(child_node, kind, results)
+
+    def terms(self, kind='area'):
+        return sorted(display for k, display in self.counts if k == kind)
+
+    def fuzzy_search(self, query, kind='area', max_distance=2, limit=10, prefix=False):
+        """Terms within max_distance edits of query, as (display, distance, count).
+
+        Walks the trie carrying one Levenshtein DP row per node (a Levenshtein
+        automaton) and abandons a branch as soon as every cell in the row is
+        over max_distance, so cost tracks the handful of near branches rather
+        than the number of terms. With prefix=True, the query only has to be
+        close to the start of a term (for search-as-you-type) and candidates
+        come from each matching node's ranked top list. Results are ordered by
+        distance, then usage, then name.
+        """
+        query = query.lower()
+        if not query: return []
+        best = {}
+        size = len(query)
+        cap = max_distance + 1
+        # Only cells within max_distance of the diagonal can stay under the
+        # bound, so each row is computed on that band; the rest hold cap
+        first_row = [min(i, cap) for i in range(size + 1)]
+        stack = [(child, char, first_row, 1) for char, child in self.root.children.items()]
+        while stack:
+            node, char, previous, depth = stack.pop()
+            row = [cap] * (size + 1)
+            row[0] = min(depth, cap)
+            low = max(1, depth - max_distance)
+            high = min(size, depth + max_distance)
+            row_min = row[0]
+            for i in range(low, high + 1):
+                value = min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + (query[i - 1] != char))
+                if value < cap:
+                    row[i] = value
+                    if value < row_min:
+                        row_min = value
+            distance = row[size]
+            if distance <= max_distance:
+                if prefix:
+                    candidates = node.top.get(kind, ())
+                else:
+                    candidates = [(count, display) for (k, display), count in node.terms.items() if k == kind]
+                for count, display in candidates:
+                    if display not in best or distance < best[display][0]:
+                        best[display] = (distance, count)
+            # Row minima never shrink going down, so in prefix mode a node
+            # already at its row minimum has nothing better below it
+            if row_min <= max_distance and not (prefix and distance == row_min):
+                stack.extend((child, next_char, row, depth + 1) for next_char, child in node.children.items())
+        ranked = sorted(((display, distance, count) for display, (distance, count) in best.items()),
+                        key=lambda match: (match[1], -match[2], match[0]))
+        return ranked[:limit]
 
 app = Flask(__name__)
 
@@ -107,14 +369,369 @@ app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', os.path.join(os.pa
 app.config['SHOP_UPLOAD_FOLDER'] = os.environ.get('SHOP_UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads', 'shop_pics'))
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# Fingerprinted copies of static/css and static/js, with .gz/.br siblings (see StaticAssets)
+app.config['ASSETS_FOLDER'] = os.environ.get('ASSETS_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'dist'))
+app.config['ASSETS_MAX_AGE'] = int(os.environ.get('ASSETS_MAX_AGE', 365 * 24 * 3600))
+
+# Upload limits: whole request (Flask answers 413 above it), one image, and decoded pixels
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH_MB', 16)) * 1024 * 1024
+app.config['IMAGE_MAX_BYTES'] = int(os.environ.get('IMAGE_MAX_MB', 5)) * 1024 * 1024
+app.config['IMAGE_MAX_PIXELS'] = int(os.environ.get('IMAGE_MAX_PIXELS', 40_000_000))
+# Resized copies made of every upload: name -> longest side in px; WebP quality
+app.config['IMAGE_VARIANTS'] = {'thumb': 480, 'display': 1600}
+app.config['IMAGE_QUALITY'] = int(os.environ.get('IMAGE_QUALITY', 80))
+
+# SQLite connection pool (see SQLite); pool size matters for threaded workers
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 8))
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+app.config['DB_BUSY_TIMEOUT_MS'] = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+app.config['DB_JOURNAL_MODE'] = os.environ.get('DB_JOURNAL_MODE', 'WAL')
+app.config['DB_SYNCHRONOUS'] = os.environ.get('DB_SYNCHRONOUS', 'NORMAL')
+app.config['DB_CACHE_SIZE_KB'] = int(os.environ.get('DB_CACHE_SIZE_KB', 16384))
+app.config['DB_MMAP_SIZE'] = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))
+app.config['DB_STATEMENT_CACHE'] = int(os.environ.get('DB_STATEMENT_CACHE', 256))
+
+# Notification outbox: rows per commit, how long the writer waits to fill a batch, or write inline
+app.config['NOTIFICATION_BATCH_SIZE'] = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 100))
+app.config['NOTIFICATION_FLUSH_INTERVAL_MS'] = int(os.environ.get('NOTIFICATION_FLUSH_INTERVAL_MS', 50))
+app.config['NOTIFICATIONS_SYNC'] = os.environ.get('NOTIFICATIONS_SYNC', '0') == '1'
+
+# Booking write-lock tuning (see ReservationEngine)
+app.config['BOOKING_LOCK_ATTEMPTS'] = int(os.environ.get('BOOKING_LOCK_ATTEMPTS', 8))
+app.config['BOOKING_LOCK_TIMEOUT_MS'] = int(os.environ.get('BOOKING_LOCK_TIMEOUT_MS', 250))
+app.config['BOOKING_LOCK_BACKOFF_MS'] = int(os.environ.get('BOOKING_LOCK_BACKOFF_MS', 5))
+app.config['BOOKING_LOCK_MAX_BACKOFF_MS'] = int(os.environ.get('BOOKING_LOCK_MAX_BACKOFF_MS', 200))
+# Bookings that waited at least this long for the write lock are logged (0 logs every booking)
+app.config['BOOKING_LOCK_LOG_MS'] = float(os.environ.get('BOOKING_LOCK_LOG_MS', 50))
+
+# Ranked results kept per search-trie node
+app.config['SEARCH_TOP_K'] = int(os.environ.get('SEARCH_TOP_K', 10))
+
+# Autocomplete: seconds browsers/proxies may reuse a response, and the p99 we warn above
+app.config['AUTOCOMPLETE_MAX_AGE'] = int(os.environ.get('AUTOCOMPLETE_MAX_AGE', 60))
+app.config['AUTOCOMPLETE_P99_TARGET_MS'] = float(os.environ.get('AUTOCOMPLETE_P99_TARGET_MS', 10))
+
+# Compiled templates: keep their bytecode on disk for the next worker ('' means Jinja's per-user
+# temp dir, 'off' disables it), and compile every template at boot rather than on first hit
+app.config['TEMPLATE_CACHE_DIR'] = os.environ.get('TEMPLATE_CACHE_DIR', '')
+app.config['TEMPLATE_WARMUP'] = os.environ.get('TEMPLATE_WARMUP', '1') == '1'
+
+# Public page cache: entries per worker, seconds a worker trusts its last version check, and the
+# longest any entry is served (bounds staleness from data no write path versions)
+app.config['PAGE_CACHE_SIZE'] = int(os.environ.get('PAGE_CACHE_SIZE', 256))
+app.config['PAGE_CACHE_CHECK_INTERVAL'] = float(os.environ.get('PAGE_CACHE_CHECK_INTERVAL', 1))
+app.config['PAGE_CACHE_MAX_AGE'] = int(os.environ.get('PAGE_CACHE_MAX_AGE', 300))
+
+# Most typos forgiven when matching areas
+app.config['FUZZY_MAX_DISTANCE'] = int(os.environ.get('FUZZY_MAX_DISTANCE', 2))
+
+# Upper bound on the window /api/availability returns in one call
+app.config['AVAILABILITY_MAX_DAYS'] = int(os.environ.get('AVAILABILITY_MAX_DAYS', 31))
+
+# Rows per page on paginated lists, and the most a client may ask for with ?limit=
+app.config['PAGE_SIZE'] = int(os.environ.get('PAGE_SIZE', 20))
+app.config['PAGE_SIZE_MAX'] = int(os.environ.get('PAGE_SIZE_MAX', 100))
+
+# Longest date range one /owner/analytics report may cover
+app.config['ANALYTICS_MAX_DAYS'] = int(os.environ.get('ANALYTICS_MAX_DAYS', 366))
+
+# Rows fetched from SQLite and written out per chunk of a streaming export
+app.config['EXPORT_CHUNK_ROWS'] = int(os.environ.get('EXPORT_CHUNK_ROWS', 1000))
+
+# CSV import: rows inserted per transaction, and how many rejected rows the report lists
+app.config['IMPORT_CHUNK_ROWS'] = int(os.environ.get('IMPORT_CHUNK_ROWS', 500))
+app.config['IMPORT_MAX_ERRORS'] = int(os.environ.get('IMPORT_MAX_ERRORS', 200))
+
+# Homepage stats: seconds before a background recompute, and whether writes adjust counters in between
+app.config['HOME_STATS_TTL'] = int(os.environ.get('HOME_STATS_TTL', 60))
+app.config['HOME_STATS_INCREMENTAL'] = os.environ.get('HOME_STATS_INCREMENTAL', '0') == '1'
+
+# Password hashing: werkzeug method string (its parameters are the cost; stored hashes made with
+# anything else are upgraded at the user's next login), hashing processes per worker (0 hashes
+# inline), and how many hashes may be running or waiting before requests are turned away
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['HASH_POOL_SIZE'] = int(os.environ.get('HASH_POOL_SIZE', 1))
+app.config['HASH_QUEUE_DEPTH'] = int(os.environ.get('HASH_QUEUE_DEPTH', 8))
+app.config['HASH_QUEUE_WAIT'] = float(os.environ.get('HASH_QUEUE_WAIT', 2))
+
 # Ensure upload directories exist
 for folder in [app.config['UPLOAD_FOLDER'], app.config['SHOP_UPLOAD_FOLDER']]:
     if not os.path.exists(folder):
         os.makedirs(folder, exist_ok=True)
 
-db = SQLite(app.config['DATABASE'])
+db = SQLite(
+    app.config['DATABASE'],
+    pool_size=app.config['DB_POOL_SIZE'],
+    pool_timeout=app.config['DB_POOL_TIMEOUT'],
+    busy_timeout_ms=app.config['DB_BUSY_TIMEOUT_MS'],
+    journal_mode=app.config['DB_JOURNAL_MODE'],
+    synchronous=app.config['DB_SYNCHRONOUS'],
+    cache_size_kb=app.config['DB_CACHE_SIZE_KB'],
+    mmap_size=app.config['DB_MMAP_SIZE'],
+    statement_cache=app.config['DB_STATEMENT_CACHE'],
+)
 app.teardown_appcontext(db.teardown)
 
+def fuzzy_distance(text):
+    """Edits tolerated for a search term: none for very short input, up to FUZZY_MAX_DISTANCE"""
+    if len(text) < 4:
+        return 0
+    return min(app.config['FUZZY_MAX_DISTANCE'], 1 if len(text) < 7 else 2)
+
+# --- Search Index ---
+class SearchIndex:
+    """The worker's ShopTrie, kept in step with shops and services.
+
+    Writers bump the 'search_index' row of cache_versions in the same
+    transaction as their change and, once committed, apply the change to this
+    worker's trie. Other workers notice the version moved on their next
+    lookup and rebuild from the database.
+    """
+    VERSION_KEY = 'search_index'
+
+    def __init__(self, top_k=10):
+        self.top_k = top_k
+        self.trie = ShopTrie(top_k)
+        self.version = None
+        self._lock = threading.Lock()
+
+    def _read_version(self, conn):
+        row = conn.execute('SELECT version FROM cache_versions WHERE name = ?', (self.VERSION_KEY,)).fetchone()
+        return row[0] if row else 0
+
+    def load(self, conn):
+        """Builds a fresh trie from the database and swaps it in"""
+        version = self._read_version(conn)
+        trie = ShopTrie(self.top_k)
+        for kind, sql in (('area', 'SELECT area, COUNT(*) FROM shops WHERE area IS NOT NULL GROUP BY area'),
+                          ('shop', 'SELECT name, COUNT(*) FROM shops GROUP BY name'),
+                          ('service', 'SELECT name, COUNT(*) FROM services GROUP BY name')):
+            for term, count in conn.execute(sql):
+                trie.insert(term, kind, count, refresh=False)
+        trie.refresh_all()
+        with self._lock:
+            self.trie = trie
+            self.version = version
+
+    def current(self, conn):
+        """The trie, rebuilt first if another worker changed shops or services"""
+        if self._read_version(conn) != self.version:
+            self.load(conn)
+        return self.trie
+
+    def bump(self, conn):
+        """Marks the index stale for every worker; call inside the writing transaction"""
+        conn.execute('''
+            INSERT INTO cache_versions (name, version) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET version = version + 1
+        ''', (self.VERSION_KEY,))
+        return self._read_version(conn)
+
+    def apply(self, version, added=(), removed=()):
+        """Applies a committed change to this worker's trie; added/removed are (kind, term) pairs"""
+        with self._lock:
+            if self.version != version - 1:
+                # Missed someone else's change: the next current() rebuilds
+                return
+            for kind, term in removed:
+                self.trie.remove(term, kind)
+            for kind, term in added:
+                self.trie.insert(term, kind)
+            self.version = version
+
+search_index = SearchIndex(top_k=app.config['SEARCH_TOP_K'])
+
+def rebuild_search_index():
+    with db.borrow() as conn:
+        search_index.load(conn)
+
+# --- Full-Text Search ---
+def fts_query(text):
+    """Turns free text into an FTS5 query: every word must match, as a prefix"""
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{word}"*' for word in words[:8])
+
+def search_shops(conn, text, limit=20, areas=None, after=None):
+    """Shops ranked by BM25 over their own fields and their services' fields.
+
+    Weights favour shop name over area, description and address; a service
+    match counts toward its shop. Lower score is better. areas narrows the
+    hits to those areas; after is the (score, id) of the last row already
+    shown, so later pages pick up right behind it.
+    """
+    match = fts_query(text)
+    if not match or areas is not None and not areas:
+        return []
+    params = {'match': match, 'limit': limit}
+    where = ''
+    if areas is not None:
+        where = f"WHERE sh.area IN ({', '.join(f':area{n}' for n in range(len(areas)))})"
+        params.update((f'area{n}', area) for n, area in enumerate(areas))
+    having = ''
+    if after is not None:
+        having = 'HAVING (score, sh.id) > (:after_score, :after_id)'
+        params.update(after_score=after[0], after_id=after[1])
+    return conn.execute(f'''
+        WITH hits AS (
+            SELECT rowid AS shop_id, bm25(shops_fts, 10.0, 6.0, 1.0, 2.0) AS score
+            FROM shops_fts WHERE shops_fts MATCH :match
+            UNION ALL
+            SELECT s.shop_id, bm25(services_fts, 8.0, 2.0)
+            FROM services_fts JOIN services s ON s.id = services_fts.rowid
+            WHERE services_fts MATCH :match
+        )
+        SELECT sh.*, r.avg_rating, SUM(h.score) AS score
+        FROM hits h
+        JOIN shops sh ON sh.id = h.shop_id
+        LEFT JOIN shop_rating_stats r ON r.shop_id = sh.id
+        {where}
+        GROUP BY sh.id
+        {having}
+        ORDER BY score, sh.id
+        LIMIT :limit
+    ''', params).fetchall()
+
+# --- Schema Migrations ---
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database_sqlite.sql')
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def discover_migrations():
+    """(version, name, path) for every migration, oldest first.
+
+    Version 1 is the baseline schema in database_sqlite.sql; later versions
+    are migrations/NNNN_name.sql. Each file runs once, in its own transaction.
+    """
+    migrations = [(1, 'baseline', SCHEMA_PATH)]
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = re.match(r'^(\d{4})_(\w+)\.sql$', filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    versions = [version for version, _, _ in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f'Duplicate migration numbers in {MIGRATIONS_DIR}')
+    return migrations
+
+def split_sql(script):
+    """Splits a script into complete statements (trigger bodies stay whole)"""
+    statements = []
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ''
+    leftover = [line for line in buffer.splitlines() if line.strip() and not line.strip().startswith('--')]
+    if leftover:
+        raise ValueError(f'Incomplete SQL statement: {leftover[0][:80]}')
+    return statements
+
+def apply_migrations(conn):
+    """Brings the database up to the newest migration, returns the versions applied.
+
+    The version check and the migration share one BEGIN IMMEDIATE transaction,
+    so workers starting together apply each migration exactly once.
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    applied = []
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+            )
+        ''')
+        for version, name, path in discover_migrations():
+            with open(path, encoding='utf-8') as f:
+                statements = split_sql(f.read())
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone():
+                    conn.execute('COMMIT')
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            applied.append(version)
+            app.logger.info('Applied migration %04d_%s', version, name)
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
+
+def init_db():
+    """Applies any pending migrations to app.config['DATABASE']"""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    try:
+        apply_migrations(conn)
+    finally:
+        conn.close()
+
+# Queries that must stay on an index: (label, sql, params, index the plan has to use)
+HOT_QUERIES = [
+    ('day appointments', "SELECT appointment_time, total_duration FROM appointments WHERE shop_id = ? AND appointment_date = ? AND status != 'cancelled'",
+     (1, '2025-01-01'), 'idx_appointments_shop_schedule'),
+    ('unread notifications', 'SELECT COUNT(*) FROM notifications WHERE user_id = ? AND id > ?',
+     (1, 100), 'idx_notifications_user_id'),
+    ('shop reviews', 'SELECT r.*, u.name as user_name FROM reviews r JOIN users u ON r.user_id = u.id WHERE r.shop_id = ? ORDER BY r.created_at DESC',
+     (1,), 'idx_reviews_shop_created'),
+    ('shop services', 'SELECT * FROM services WHERE shop_id = ?',
+     (1,), 'idx_services_shop'),
+    ('owner shop', 'SELECT id FROM shops WHERE owner_id = ?',
+     (1,), 'idx_shops_owner'),
+    ('shops by area', 'SELECT * FROM shops WHERE area IN (?, ?)',
+     ('Satellite', 'Navrangpura'), 'idx_shops_area'),
+    ('owner appointments page', 'SELECT * FROM appointments WHERE shop_id = ? AND (appointment_date, appointment_time, id) < (?, ?, ?) ORDER BY appointment_date DESC, appointment_time DESC, id DESC LIMIT 21',
+     (1, '2025-01-01', '10:00', 100), 'idx_appointments_shop_schedule'),
+    ('customer appointments page', 'SELECT * FROM appointments WHERE user_id = ? AND (appointment_date, appointment_time, id) < (?, ?, ?) ORDER BY appointment_date DESC, appointment_time DESC, id DESC LIMIT 21',
+     (1, '2025-01-01', '10:00', 100), 'idx_appointments_user_schedule'),
+    ('inbox page', 'SELECT * FROM notifications WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT 21',
+     (1, 100), 'idx_notifications_user_id'),
+    ('analytics days', 'SELECT * FROM shop_daily_stats WHERE shop_id = ? AND day BETWEEN ? AND ? ORDER BY day',
+     (1, '2025-01-01', '2025-01-31'), 'sqlite_autoindex_shop_daily_stats_1'),
+    ('analytics hours', 'SELECT hour, SUM(bookings) FROM shop_hourly_stats WHERE shop_id = ? AND day BETWEEN ? AND ? GROUP BY hour',
+     (1, '2025-01-01', '2025-01-31'), 'sqlite_autoindex_shop_hourly_stats_1'),
+    ('payments export', 'SELECT p.* FROM appointments a CROSS JOIN payments p ON p.appointment_id = a.id WHERE a.shop_id = ? AND p.transaction_date >= ? AND p.transaction_date < ? ORDER BY p.transaction_date, p.id',
+     (1, '2025-01-01', '2025-02-01'), 'idx_appointments_shop_schedule'),
+]
+
+def check_query_plans(conn, queries=HOT_QUERIES):
+    """Runs EXPLAIN QUERY PLAN over the hot queries, returns a list of problems (empty when all indexed)"""
+    problems = []
+    for label, sql, params, index in queries:
+        details = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+        scans = [detail for detail in details if detail.startswith('SCAN ') and 'INDEX' not in detail]
+        if scans:
+            problems.append(f'{label}: full scan ({"; ".join(scans)})')
+        elif not any(index in detail for detail in details):
+            problems.append(f'{label}: expected {index}, got {"; ".join(details)}')
+    return problems
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    applied = apply_migrations(conn)
+    version = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0]
+    conn.close()
+    print(f'Applied {len(applied)} migration(s); schema is at version {version}.')
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any hot query is not served by its index."""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    problems = check_query_plans(conn)
+    conn.close()
+    for problem in problems:
+        print(problem)
+    if problems:
+        raise SystemExit(1)
+    print(f'All {len(HOT_QUERIES)} hot queries use their indexes.')
+
 @app.template_filter('datetimeformat')
 def datetimeformat(value, format='%d %b, %H:%M'):
     if value is None:
@@ -143,57 +760,1575 @@ def is_logged_in():
 def is_owner():
     return 'role' in session and session['role'] == 'shop_owner'
 
+class OwnerShops:
+    """Each owner's shop ids, kept per worker and revalidated against cache_versions.
+
+    An owner's entry depends on the 'owner_shops:<owner id>' row. add_shop,
+    edit_shop, switch_shop and the CSV importer bump that row inside their
+    transaction, so every worker notices on the owner's next page and reloads
+    the ids; a warm lookup costs one cache_versions probe and no shops query.
+    """
+    def __init__(self, size=4096):
+        self.size = size
+        self._entries = collections.OrderedDict()  # owner id -> (version, shop ids)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def version_key(owner_id):
+        return f'owner_shops:{owner_id}'
+
+    def shop_ids(self, conn, owner_id):
+        """The owner's shop ids, oldest first"""
+        row = conn.execute('SELECT version FROM cache_versions WHERE name = ?', (self.version_key(owner_id),)).fetchone()
+        version = row[0] if row else 0
+        with self._lock:
+            entry = self._entries.get(owner_id)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(owner_id)
+                return entry[1]
+        shop_ids = tuple(row[0] for row in conn.execute('SELECT id FROM shops WHERE owner_id = ? ORDER BY id', (owner_id,)))
+        with self._lock:
+            self._entries[owner_id] = (version, shop_ids)
+            self._entries.move_to_end(owner_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return shop_ids
+
+    def bump(self, conn, *owner_ids):
+        """Marks those owners' entries stale for every worker; call inside the writing transaction"""
+        conn.executemany('''
+            INSERT INTO cache_versions (name, version) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET version = version + 1
+        ''', [(self.version_key(owner_id),) for owner_id in owner_ids])
+
+owner_shops = OwnerShops()
+
+def get_owner_shop_id():
+    """Id of the shop the logged-in owner is managing, or None before they create one.
+
+    Owners with several branches choose one with switch_shop; that choice is
+    kept in the session but checked against owner_shops once per request, so
+    a branch deleted or never owned falls back to the owner's first shop
+    instead of sticking.
+    """
+    if 'owner_shop_id' not in g:
+        shop_ids = owner_shops.shop_ids(db.connection, session['id'])
+        chosen = session.get('owner_shop_id')
+        g.owner_shop_id = chosen if chosen in shop_ids else (shop_ids[0] if shop_ids else None)
+    return g.owner_shop_id
+
+def get_owner_shop(columns='*'):
+    """Row of the shop the owner is managing (see get_owner_shop_id), or None"""
+    return db.connection.execute(f'SELECT {columns} FROM shops WHERE id = ? AND owner_id = ?',
+                                 (get_owner_shop_id(), session['id'])).fetchone()
+
+def get_unread_count(user_id):
+    cursor = get_db_cursor()
+    cursor.execute('SELECT unread_count FROM user_inbox_state WHERE user_id = ?', (user_id,))
+    res = cursor.fetchone()
+    return res['unread_count'] if res else 0
+
+def mark_inbox_read(conn, user_id, up_to_id):
+    """Moves the user's read watermark forward and recounts only what arrived after it"""
+    conn.execute('''
+        UPDATE user_inbox_state
+        SET last_read_notification_id = ?,
+            unread_count = (SELECT COUNT(*) FROM notifications WHERE user_id = ? AND id > ?)
+        WHERE user_id = ? AND last_read_notification_id < ?
+    ''', (up_to_id, user_id, up_to_id, user_id, up_to_id))
+
 @app.context_processor
 def inject_shop_status():
-    unread_count = 0
-    if is_logged_in():
-        from flask import g
-        cursor = get_db_cursor()
-        cursor.execute("SELECT COUNT(*) as count FROM notifications WHERE user_id = ? AND is_read = FALSE", (session['id'],))
-        res = cursor.fetchone()
-        unread_count = res['count'] if res else 0
+    # Computed once per request, however many templates get rendered
+    if 'shop_status' not in g:
+        unread_count = 0
+        owner_shop_id = None
+        if is_logged_in():
+            unread_count = get_unread_count(session['id'])
+            if is_owner():
+                owner_shop_id = get_owner_shop_id()
+        g.shop_status = {'owner_has_shop': owner_shop_id is not None, 'owner_shop_id': owner_shop_id, 'unread_notifications': unread_count, 'get_now': get_now}
+    return g.shop_status
+
+# --- Keyset Pagination ---
+class Page:
+    """One page of a keyset-paginated list plus the cursor for the page after it"""
+    def __init__(self, rows, next_cursor, param):
+        self.rows = rows
+        self.next_cursor = next_cursor
+        self.param = param
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def as_json(self):
+        return {'items': [dict(row) for row in self.rows], 'next_cursor': self.next_cursor}
+
+def encode_cursor(values):
+    """Opaque token carrying the ordering key of the last row on a page"""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(token, width):
+    """Ordering key from a cursor token; None for the first page or a token we did not issue"""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != width or not all(isinstance(v, (int, float, str)) for v in values):
+        return None
+    return values
+
+def page_limit():
+    """Page size from ?limit=, clamped to PAGE_SIZE_MAX"""
+    return min(max(request.args.get('limit', app.config['PAGE_SIZE'], type=int), 1), app.config['PAGE_SIZE_MAX'])
+
+def fetch_page(sql, params, key, descending=True, param='cursor'):
+    """Runs one page of a keyset query.
+
+    key lists the ORDER BY columns (unique together, e.g. ending in the id).
+    sql has a {keyset} placeholder in its WHERE clause, followed only by
+    ORDER BY ... LIMIT ?, so the key values and the limit are bound last.
+    """
+    limit = page_limit()
+    after = decode_cursor(request.args.get(param), len(key))
+    if after is None:
+        keyset, args = '1', list(params)
+    else:
+        keyset = f"({', '.join(key)}) {'<' if descending else '>'} ({', '.join('?' * len(key))})"
+        args = list(params) + after
+    rows = get_db_cursor().execute(sql.format(keyset=keyset), args + [limit + 1]).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][column.rsplit('.', 1)[-1]] for column in key])
+    return Page(rows, next_cursor, param)
+
+def wants_json():
+    return request.args.get('format') == 'json'
+
+@app.template_global()
+def next_page_url(page):
+    """Same view and filters, one page further along"""
+    args = request.args.to_dict()
+    args.pop('format', None)
+    args[page.param] = page.next_cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+# --- Notification Outbox ---
+class NotificationOutbox:
+    """Takes notification writes off the request path.
+
+    create_notification drops rows into an in-process queue; a writer thread
+    collects whatever arrives within flush_interval_ms (up to batch_size rows)
+    and writes the batch, with the matching unread counter updates, in a
+    single commit. flush() blocks until everything queued so far is written;
+    in sync mode rows are written and committed by the caller instead.
+    Pending rows are flushed at interpreter exit.
+    """
+    def __init__(self, db, batch_size=100, flush_interval_ms=50, sync=False):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.sync = sync
+        self.stats = {'enqueued': 0, 'written': 0, 'batches': 0, 'dropped': 0}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    @staticmethod
+    def write(conn, rows):
+        """Inserts rows and bumps unread counters without committing"""
+        conn.executemany('INSERT INTO notifications (user_id, appointment_id, title, message, created_at) VALUES (?, ?, ?, ?, ?)', rows)
+        per_user = {}
+        for row in rows:
+            per_user[row[0]] = per_user.get(row[0], 0) + 1
+        conn.executemany('''
+            INSERT INTO user_inbox_state (user_id, unread_count) VALUES (?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET unread_count = unread_count + excluded.unread_count
+        ''', list(per_user.items()))
+
+    def _ensure_writer(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # Forked: whatever the parent had queued is the parent's to write
+                self._queue = queue.Queue()
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='notification-outbox', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, row):
+        self.stats['enqueued'] += 1
+        self._ensure_writer()
+        self._queue.put(row)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = perf_counter() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._deliver(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
 
-    if is_logged_in() and is_owner():
-        cursor = get_db_cursor()
-        cursor.execute('SELECT id FROM shops WHERE owner_id = ?', (session['id'],))
-        shop = cursor.fetchone()
-        return {'owner_has_shop': shop is not None, 'owner_shop_id': shop['id'] if shop else None, 'unread_notifications': unread_count, 'get_now': get_now}
-    return {'owner_has_shop': False, 'owner_shop_id': None, 'unread_notifications': unread_count, 'get_now': get_now}
+    def _deliver(self, batch):
+        for attempt in range(3):
+            try:
+                with self.db.borrow() as conn:
+                    try:
+                        self.write(conn, batch)
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+                return
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e):
+                    break
+                sleep(0.05 * (attempt + 1))
+            except Exception:
+                break
+        self.stats['dropped'] += len(batch)
+        app.logger.exception('Dropped %d notification(s) after failed delivery', len(batch))
+
+    def flush(self, timeout=None):
+        """Waits until every queued notification is committed; False on timeout"""
+        if self._pid != os.getpid():
+            return True
+        deadline = None if timeout is None else perf_counter() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+outbox = NotificationOutbox(db, batch_size=app.config['NOTIFICATION_BATCH_SIZE'],
+                            flush_interval_ms=app.config['NOTIFICATION_FLUSH_INTERVAL_MS'],
+                            sync=app.config['NOTIFICATIONS_SYNC'])
+atexit.register(outbox.flush, 5)
 
 def create_notification(user_id, title, message, appointment_id=None):
-    cursor = get_db_cursor()
     now = get_now().strftime('%Y-%m-%d %H:%M:%S')
-    cursor.execute('INSERT INTO notifications (user_id, appointment_id, title, message, created_at) VALUES (?, ?, ?, ?, ?)',
-                   (user_id, appointment_id, title, message, now))
-    db.connection.commit()
+    row = (user_id, appointment_id, title, message, now)
+    if outbox.sync:
+        outbox.write(db.connection, [row])
+        db.connection.commit()
+    else:
+        outbox.enqueue(row)
+
+# --- Rating Aggregates ---
+def record_review_rating(conn, shop_id, rating):
+    """Folds one new review into shop_rating_stats; call inside the review's transaction"""
+    rating = int(rating)
+    conn.execute(f'''
+        INSERT INTO shop_rating_stats (shop_id, review_count, rating_sum, avg_rating, stars_{rating})
+        VALUES (?, 1, ?, ?, 1)
+        ON CONFLICT(shop_id) DO UPDATE SET
+            review_count = review_count + 1,
+            rating_sum = rating_sum + excluded.rating_sum,
+            avg_rating = (rating_sum + excluded.rating_sum) * 1.0 / (review_count + 1),
+            stars_{rating} = stars_{rating} + 1
+    ''', (shop_id, rating, float(rating)))
+
+def backfill_rating_stats(conn):
+    """Rebuilds shop_rating_stats from the reviews table"""
+    conn.execute('DELETE FROM shop_rating_stats')
+    conn.execute('''
+        INSERT INTO shop_rating_stats (shop_id, review_count, rating_sum, avg_rating, stars_1, stars_2, stars_3, stars_4, stars_5)
+        SELECT shop_id, COUNT(*), SUM(rating), AVG(rating),
+               SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+        FROM reviews
+        WHERE rating IS NOT NULL
+        GROUP BY shop_id
+    ''')
+
+@app.cli.command('backfill-ratings')
+def backfill_ratings_command():
+    """Recompute per-shop rating aggregates from existing reviews."""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    backfill_rating_stats(conn)
+    conn.commit()
+    count = conn.execute('SELECT COUNT(*) FROM shop_rating_stats').fetchone()[0]
+    conn.close()
+    print(f'Rebuilt rating aggregates for {count} shops.')
+
+# --- Booking Engine ---
+def is_busy_error(error):
+    """True for SQLITE_BUSY / SQLITE_LOCKED errors raised by sqlite3"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+def time_to_minutes(value):
+    """Converts 'HH:MM' or 'HH:MM:SS' (hour may be unpadded) to minutes since midnight; ValueError otherwise"""
+    try:
+        parsed = datetime.strptime(value, '%H:%M')
+    except ValueError:
+        parsed = datetime.strptime(value, '%H:%M:%S')
+    return parsed.hour * 60 + parsed.minute
+
+# Bookable slots: every 30 minutes from 9 AM, last one at 7:30 PM; bookings must end by closing at 8 PM
+SLOT_STARTS = [hour * 60 + minute for hour in range(9, 20) for minute in (0, 30)]
+CLOSING_MINUTE = 20 * 60
+SLOT_LABELS = [f"{start // 60:02d}:{start % 60:02d}" for start in SLOT_STARTS]
+MINUTES_PER_DAY = 24 * 60
+MASK_BYTES = MINUTES_PER_DAY // 8
+
+# Start of an appointment in minutes since midnight, computed inside SQLite.
+# Splits on the colon so a legacy unpadded time ('9:30') still reads as 570
+START_MINUTE_SQL = ("CAST(substr(appointment_time, 1, instr(appointment_time, ':') - 1) AS INTEGER) * 60"
+                    " + CAST(substr(appointment_time, instr(appointment_time, ':') + 1, 2) AS INTEGER)")
+START_HOUR_SQL = "CAST(substr(appointment_time, 1, instr(appointment_time, ':') - 1) AS INTEGER)"
+
+def range_mask(start, duration):
+    """Bit mask covering [start, start + duration) minutes, clipped to the day"""
+    end = min(start + int(duration), MINUTES_PER_DAY)
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+class OccupancyIndex:
+    """Per-(shop, date) occupancy stored as a minute-resolution bitmap.
+
+    Bit N of a day's mask is set when minute N is taken by a non-cancelled
+    appointment. Masks live in shop_day_occupancy (180 bytes per row) and are
+    kept current inside the same transaction as the booking, cancellation or
+    completion that changes them, so every worker reads the same state. A day
+    with no row yet is built from appointments on first use.
+    """
+    def build(self, conn, shop_id, day):
+        """Recomputes a day's mask from its non-cancelled appointments"""
+        mask = 0
+        rows = conn.execute(f'''
+            SELECT {START_MINUTE_SQL} AS start_min, total_duration
+            FROM appointments
+            WHERE shop_id = ? AND appointment_date = ? AND status != 'cancelled'
+        ''', (shop_id, day))
+        for start_min, duration in rows:
+            mask |= range_mask(start_min, duration)
+        return mask
+
+    def load(self, conn, shop_id, day):
+        row = conn.execute('SELECT mask FROM shop_day_occupancy WHERE shop_id = ? AND day = ?', (shop_id, day)).fetchone()
+        if row is None:
+            return self.build(conn, shop_id, day)
+        return int.from_bytes(row[0], 'little')
+
+    def store(self, conn, shop_id, day, mask):
+        conn.execute('INSERT OR REPLACE INTO shop_day_occupancy (shop_id, day, mask) VALUES (?, ?, ?)',
+                     (shop_id, day, mask.to_bytes(MASK_BYTES, 'little')))
+
+    def load_range(self, conn, shop_id, first_day, last_day):
+        """Masks and day offs for every day in [first_day, last_day] in one round trip.
+
+        Returns (masks, dayoffs): day -> mask for days with bookings, and
+        day -> reason for the shop's days off. Days without a stored mask are
+        built from their appointments in the same query.
+        """
+        rows = conn.execute(f'''
+            SELECT 'mask' AS kind, day, mask AS payload, NULL AS start_min, NULL AS duration
+            FROM shop_day_occupancy
+            WHERE shop_id = :shop AND day BETWEEN :first AND :last
+            UNION ALL
+            SELECT 'appt', appointment_date, NULL, {START_MINUTE_SQL}, total_duration
+            FROM appointments
+            WHERE shop_id = :shop AND appointment_date BETWEEN :first AND :last AND status != 'cancelled'
+              AND appointment_date NOT IN (
+                  SELECT day FROM shop_day_occupancy WHERE shop_id = :shop AND day BETWEEN :first AND :last)
+            UNION ALL
+            SELECT 'off', off_date, reason, NULL, NULL
+            FROM shop_dayoffs
+            WHERE shop_id = :shop AND off_date BETWEEN :first AND :last
+        ''', {'shop': shop_id, 'first': first_day, 'last': last_day})
+        masks = {}
+        dayoffs = {}
+        for kind, day, payload, start_min, duration in rows:
+            if kind == 'mask':
+                masks[day] = masks.get(day, 0) | int.from_bytes(payload, 'little')
+            elif kind == 'appt':
+                masks[day] = masks.get(day, 0) | range_mask(start_min, duration)
+            else:
+                dayoffs[day] = payload
+        return masks, dayoffs
+
+    def refresh(self, conn, shop_id, day):
+        """Rebuilds and stores a day's mask; call inside the transaction that changed it"""
+        self.store(conn, shop_id, day, self.build(conn, shop_id, day))
+
+    @staticmethod
+    def is_free(mask, start, duration):
+        return mask & range_mask(start, duration) == 0
+
+    @staticmethod
+    def slots(mask, not_before=0, duration=1):
+        """Availability of each bookable slot for a booking lasting duration minutes.
+
+        A slot is available when it does not start before not_before (minutes),
+        every minute of the booking is free, and the booking ends by closing time.
+        """
+        duration = max(int(duration or 1), 1)
+        return [{'time': label, 'is_available': start >= not_before and start + duration <= CLOSING_MINUTE
+                                                and OccupancyIndex.is_free(mask, start, duration)}
+                for start, label in zip(SLOT_STARTS, SLOT_LABELS)]
+
+occupancy = OccupancyIndex()
+
+def slot_cutoff(day, current_now):
+    """First minute still bookable on day: slots that have already started today are not"""
+    if day != current_now.strftime('%Y-%m-%d'):
+        return 0
+    return current_now.hour * 60 + current_now.minute + (1 if current_now.second or current_now.microsecond else 0)
+
+class ReservationEngine:
+    """Runs the occupancy check and the appointment insert as one write transaction.
+
+    BEGIN IMMEDIATE takes SQLite's RESERVED lock up front, so two workers
+    booking the same shop are serialised and the second one sees the first
+    one's appointment. Lock acquisition is retried with bounded, jittered
+    backoff on SQLITE_BUSY and the time spent waiting is reported back.
+    """
+    def __init__(self, occupancy, max_attempts=8, lock_timeout_ms=250, backoff_ms=5, max_backoff_ms=200):
+        self.occupancy = occupancy
+        self.max_attempts = max_attempts
+        self.lock_timeout_ms = lock_timeout_ms
+        self.backoff_ms = backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.stats = {'reserved': 0, 'conflicts': 0, 'busy_retries': 0, 'lock_wait_ms': 0.0}
+        # Callables run inside the booking transaction as hook(conn, appointment)
+        self.on_reserve = []
+
+    def begin_immediate(self, conn):
+        """Opens a write transaction, returns the seconds spent waiting for the lock"""
+        previous_timeout = conn.execute('PRAGMA busy_timeout').fetchone()[0]
+        conn.execute(f'PRAGMA busy_timeout = {int(self.lock_timeout_ms)}')
+        waited = 0.0
+        delay = self.backoff_ms / 1000
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                started = perf_counter()
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    return waited + (perf_counter() - started)
+                except sqlite3.OperationalError as e:
+                    waited += perf_counter() - started
+                    if not is_busy_error(e) or attempt == self.max_attempts:
+                        raise
+                self.stats['busy_retries'] += 1
+                pause = random.uniform(delay / 2, delay)
+                sleep(pause)
+                waited += pause
+                delay = min(delay * 2, self.max_backoff_ms / 1000)
+        finally:
+            self.stats['lock_wait_ms'] += waited * 1000
+            conn.execute(f'PRAGMA busy_timeout = {int(previous_timeout)}')
+
+    def reserve(self, conn, user_id, shop_id, date, time_str, total_duration, amount, service_ids, created_at):
+        """Books the slot if it is still free.
+
+        Returns (appointment_id, lock_wait_seconds); appointment_id is None when
+        the requested range overlaps an existing booking.
+        """
+        requested_start = time_to_minutes(time_str)
+        requested_end = requested_start + int(total_duration)
+
+        lock_wait = self.begin_immediate(conn)
+        try:
+            mask = self.occupancy.load(conn, shop_id, date)
+            if not self.occupancy.is_free(mask, requested_start, requested_end - requested_start):
+                conn.rollback()
+                self.stats['conflicts'] += 1
+                return None, lock_wait
+
+            cursor = conn.execute('INSERT INTO appointments (user_id, shop_id, appointment_date, appointment_time, total_duration, total_price, status, payment_status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                  (user_id, shop_id, date, time_str, total_duration, amount, 'pending', 'unpaid', created_at))
+            appointment_id = cursor.lastrowid
+            conn.executemany('INSERT INTO appointment_services (appointment_id, service_id) VALUES (?, ?)',
+                             [(appointment_id, s_id) for s_id in service_ids])
+            self.occupancy.store(conn, shop_id, date, mask | range_mask(requested_start, requested_end - requested_start))
+            appointment = {'id': appointment_id, 'user_id': user_id, 'shop_id': shop_id, 'appointment_date': date,
+                           'appointment_time': time_str, 'total_duration': total_duration, 'total_price': amount,
+                           'service_ids': service_ids}
+            for hook in self.on_reserve:
+                hook(conn, appointment)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self.stats['reserved'] += 1
+        return appointment_id, lock_wait
+
+reservations = ReservationEngine(
+    occupancy,
+    max_attempts=app.config['BOOKING_LOCK_ATTEMPTS'],
+    lock_timeout_ms=app.config['BOOKING_LOCK_TIMEOUT_MS'],
+    backoff_ms=app.config['BOOKING_LOCK_BACKOFF_MS'],
+    max_backoff_ms=app.config['BOOKING_LOCK_MAX_BACKOFF_MS'],
+)
+
+# --- Appointment Summaries ---
+def refresh_appointment_summaries(conn, appointment_ids):
+    """Rewrites services_list/service_count on the given appointments from appointment_services"""
+    appointment_ids = list(appointment_ids)
+    # Chunked to stay under SQLite's bound-parameter limit for popular services
+    for start in range(0, len(appointment_ids), 500):
+        chunk = appointment_ids[start:start + 500]
+        placeholders = ', '.join(['?'] * len(chunk))
+        conn.execute(f'''
+            UPDATE appointments SET
+                services_list = COALESCE((SELECT GROUP_CONCAT(name, ', ') FROM (
+                    SELECT s.name FROM appointment_services asrv JOIN services s ON s.id = asrv.service_id
+                    WHERE asrv.appointment_id = appointments.id ORDER BY asrv.id)), ''),
+                service_count = (SELECT COUNT(*) FROM appointment_services WHERE appointment_id = appointments.id)
+            WHERE id IN ({placeholders})
+        ''', chunk)
+
+def summarise_new_booking(conn, appointment):
+    refresh_appointment_summaries(conn, [appointment['id']])
+
+reservations.on_reserve.append(summarise_new_booking)
+
+# --- Owner Analytics ---
+# Counters in shop_daily_stats that track an appointment's current status
+STATUS_ROLLUP_COLUMNS = {'cancelled': 'cancellations', 'completed': 'completions'}
+
+def record_booking_analytics(conn, appointment):
+    """Counts a new booking against its day, hour and services; runs inside the reservation"""
+    shop_id, day = appointment['shop_id'], appointment['appointment_date']
+    conn.execute('''
+        INSERT INTO shop_daily_stats (shop_id, day, bookings) VALUES (?, ?, 1)
+        ON CONFLICT(shop_id, day) DO UPDATE SET bookings = bookings + 1
+    ''', (shop_id, day))
+    conn.execute('''
+        INSERT INTO shop_hourly_stats (shop_id, day, hour, bookings) VALUES (?, ?, ?, 1)
+        ON CONFLICT(shop_id, day, hour) DO UPDATE SET bookings = bookings + 1
+    ''', (shop_id, day, time_to_minutes(appointment['appointment_time']) // 60))
+    conn.executemany('''
+        INSERT INTO shop_service_daily_stats (shop_id, day, service_id, bookings) VALUES (?, ?, ?, 1)
+        ON CONFLICT(shop_id, day, service_id) DO UPDATE SET bookings = bookings + 1
+    ''', [(shop_id, day, service_id) for service_id in appointment['service_ids']])
+
+reservations.on_reserve.append(record_booking_analytics)
+
+def record_payment_analytics(conn, appointment_id, amount):
+    """Adds a payment to the revenue of its appointment's day; call inside the payment's transaction"""
+    conn.execute('''
+        INSERT INTO shop_daily_stats (shop_id, day, revenue)
+        SELECT shop_id, appointment_date, ? FROM appointments WHERE id = ?
+        ON CONFLICT(shop_id, day) DO UPDATE SET revenue = revenue + excluded.revenue
+    ''', (amount, appointment_id))
+
+def record_status_analytics(conn, appointment, new_status):
+    """Moves an appointment between the cancellation/completion counters of its day"""
+    old_column = STATUS_ROLLUP_COLUMNS.get(appointment['status'])
+    new_column = STATUS_ROLLUP_COLUMNS.get(new_status)
+    if old_column == new_column:
+        return
+    deltas = {column: delta for column, delta in ((old_column, -1), (new_column, 1)) if column}
+    columns = ', '.join(deltas)
+    updates = ', '.join(f'{column} = {column} + excluded.{column}' for column in deltas)
+    conn.execute(f'''
+        INSERT INTO shop_daily_stats (shop_id, day, {columns}) VALUES (?, ?, {', '.join('?' * len(deltas))})
+        ON CONFLICT(shop_id, day) DO UPDATE SET {updates}
+    ''', (appointment['shop_id'], appointment['appointment_date'], *deltas.values()))
+
+def backfill_shop_analytics(conn):
+    """Rebuilds the daily rollups from appointments, appointment_services and payments"""
+    for table in ('shop_daily_stats', 'shop_service_daily_stats', 'shop_hourly_stats'):
+        conn.execute(f'DELETE FROM {table}')
+    conn.execute('''
+        INSERT INTO shop_daily_stats (shop_id, day, bookings, cancellations, completions, revenue)
+        SELECT a.shop_id, a.appointment_date, COUNT(*), SUM(a.status = 'cancelled'), SUM(a.status = 'completed'),
+               COALESCE(SUM((SELECT SUM(amount) FROM payments p WHERE p.appointment_id = a.id)), 0)
+        FROM appointments a
+        GROUP BY a.shop_id, a.appointment_date
+    ''')
+    conn.execute('''
+        INSERT INTO shop_service_daily_stats (shop_id, day, service_id, bookings)
+        SELECT a.shop_id, a.appointment_date, asrv.service_id, COUNT(*)
+        FROM appointments a JOIN appointment_services asrv ON asrv.appointment_id = a.id
+        GROUP BY a.shop_id, a.appointment_date, asrv.service_id
+    ''')
+    conn.execute(f'''
+        INSERT INTO shop_hourly_stats (shop_id, day, hour, bookings)
+        SELECT shop_id, appointment_date, {START_HOUR_SQL} AS hour, COUNT(*)
+        FROM appointments
+        GROUP BY shop_id, appointment_date, hour
+    ''')
+
+def shop_analytics(conn, shop_id, first_day, last_day):
+    """Report for one shop over [first_day, last_day]; reads only the rollup rows in that range"""
+    days = [dict(row) for row in conn.execute('''
+        SELECT day, bookings, cancellations, completions, revenue FROM shop_daily_stats
+        WHERE shop_id = ? AND day BETWEEN ? AND ? ORDER BY day
+    ''', (shop_id, first_day, last_day))]
+    services = [dict(row) for row in conn.execute('''
+        SELECT st.service_id, COALESCE(s.name, 'Removed service') as name, SUM(st.bookings) as bookings
+        FROM shop_service_daily_stats st LEFT JOIN services s ON s.id = st.service_id
+        WHERE st.shop_id = ? AND st.day BETWEEN ? AND ?
+        GROUP BY st.service_id ORDER BY bookings DESC, name
+    ''', (shop_id, first_day, last_day))]
+    hours = [dict(row) for row in conn.execute('''
+        SELECT hour, SUM(bookings) as bookings FROM shop_hourly_stats
+        WHERE shop_id = ? AND day BETWEEN ? AND ?
+        GROUP BY hour ORDER BY hour
+    ''', (shop_id, first_day, last_day))]
+
+    bookings = sum(day['bookings'] for day in days)
+    cancellations = sum(day['cancellations'] for day in days)
+    return {
+        'from': first_day,
+        'to': last_day,
+        'totals': {
+            'bookings': bookings,
+            'cancellations': cancellations,
+            'completions': sum(day['completions'] for day in days),
+            'revenue': round(sum(day['revenue'] for day in days), 2),
+            'cancellation_rate': round(cancellations / bookings, 4) if bookings else 0.0,
+        },
+        'days': days,
+        'services': services,
+        'hours': hours,
+        'peak_hour': max(hours, key=lambda hour: hour['bookings'])['hour'] if hours else None,
+    }
+
+@app.cli.command('backfill-analytics')
+def backfill_analytics_command():
+    """Rebuild the per-shop daily analytics rollups from booking history."""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    backfill_shop_analytics(conn)
+    conn.commit()
+    count = conn.execute('SELECT COUNT(*) FROM shop_daily_stats').fetchone()[0]
+    conn.close()
+    print(f'Rebuilt {count} shop-day analytics rows.')
+
+# --- Data Export ---
+# dataset -> (column names, query over one shop and a date range)
+EXPORTS = {
+    'appointments': (
+        ['id', 'appointment_date', 'appointment_time', 'customer_name', 'services', 'service_count',
+         'total_duration', 'total_price', 'amount_paid', 'status', 'payment_status', 'created_at'],
+        '''
+        SELECT a.id, a.appointment_date, a.appointment_time, u.name, a.services_list, a.service_count,
+               a.total_duration, a.total_price, a.amount_paid, a.status, a.payment_status, a.created_at
+        FROM appointments a JOIN users u ON u.id = a.user_id
+        WHERE a.shop_id = ? AND a.appointment_date >= ? AND a.appointment_date < ?
+        ORDER BY a.appointment_date, a.appointment_time, a.id
+        ''',
+    ),
+    # Driven from the shop's appointments (CROSS JOIN pins the order), so the
+    # work is bounded by one shop's history rather than every shop's payments
+    'payments': (
+        ['id', 'appointment_id', 'appointment_date', 'customer_name', 'amount', 'payment_method', 'status', 'transaction_date'],
+        '''
+        SELECT p.id, p.appointment_id, a.appointment_date, u.name, p.amount, p.payment_method, p.status, p.transaction_date
+        FROM appointments a
+        CROSS JOIN payments p ON p.appointment_id = a.id
+        JOIN users u ON u.id = a.user_id
+        WHERE a.shop_id = ? AND p.transaction_date >= ? AND p.transaction_date < ?
+        ORDER BY p.transaction_date, p.id
+        ''',
+    ),
+}
+
+def csv_safe(value):
+    """Stops spreadsheet apps from evaluating customer-entered text as a formula"""
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + value
+    return value
+
+def stream_export(dataset, fmt, shop_id, first_day, end_day, chunk_rows):
+    """Yields an export chunk by chunk from its own pooled connection.
+
+    Only one fetchmany() batch is in memory at a time, so memory use does not
+    depend on how many rows the export has.
+    """
+    columns, sql = EXPORTS[dataset]
+    with db.borrow() as conn:
+        cursor = conn.execute(sql, (shop_id, first_day, end_day))
+        try:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if fmt == 'csv':
+                writer.writerow(columns)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                if fmt == 'csv':
+                    writer.writerows([csv_safe(value) for value in row] for row in rows)
+                else:
+                    for row in rows:
+                        buffer.write(json.dumps(dict(zip(columns, row))))
+                        buffer.write('\n')
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if fmt == 'csv' and buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            cursor.close()
+
+# --- Bulk Import ---
+class ImportReport:
+    """What one CSV import did: rows read, rows saved and why the others were rejected"""
+    def __init__(self, kind, max_errors):
+        self.kind = kind
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+
+    def reject(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_json(self):
+        return {'kind': self.kind, 'rows': self.rows, 'imported': self.imported,
+                'rejected': self.error_count, 'errors': self.errors}
+
+def import_field(row, name):
+    return (row.get(name) or '').strip()
+
+def import_shop_id(row, state):
+    """The owner's shop a services/day-off row names; may be left blank by an owner with one shop"""
+    name = import_field(row, 'shop')
+    if not name:
+        if len(state['shops']) != 1:
+            raise ValueError('shop is required')
+        return next(iter(state['shops'].values()))
+    if name not in state['shops']:
+        raise ValueError(f'Unknown shop "{name}"')
+    return state['shops'][name]
+
+def validate_shop_row(row, state):
+    name, area, address, contact = (import_field(row, column) for column in ('name', 'area', 'address', 'contact'))
+    if not name or not area or not contact or not address:
+        raise ValueError('name, area, address and contact are required')
+    if len(name) > 100:
+        raise ValueError('Shop name must be less than 100 characters')
+    if not is_valid_phone(contact):
+        raise ValueError('Contact number must be 10-15 digits')
+    if name in state['shops']:
+        raise ValueError(f'Shop "{name}" already exists')
+    state['shops'][name] = None
+    return (state['owner_id'], name, area, address, import_field(row, 'description'), contact, state['now'])
+
+def validate_service_row(row, state):
+    shop_id = import_shop_id(row, state)
+    name, price, duration, description = (import_field(row, column) for column in ('name', 'price', 'duration', 'description'))
+    if not name or not price or not duration:
+        raise ValueError('name, price and duration are required')
+    if len(name) > 100:
+        raise ValueError('Service name must be less than 100 characters')
+    try:
+        price = float(price)
+    except ValueError:
+        raise ValueError('Price must be a number')
+    if price <= 0:
+        raise ValueError('Price must be greater than 0')
+    try:
+        duration = int(duration)
+    except ValueError:
+        raise ValueError('Duration must be a whole number of minutes')
+    if duration <= 0:
+        raise ValueError('Duration must be greater than 0')
+    if len(description) > 500:
+        raise ValueError('Description must be less than 500 characters')
+    return (shop_id, name, description, price, duration)
+
+def validate_dayoff_row(row, state):
+    shop_id = import_shop_id(row, state)
+    off_date = import_field(row, 'off_date')
+    if not off_date:
+        raise ValueError('off_date is required')
+    try:
+        off_date = datetime.strptime(off_date, '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        raise ValueError('off_date must be YYYY-MM-DD')
+    if (shop_id, off_date) in state['dayoffs']:
+        raise ValueError('This date is already marked as a day off')
+    state['dayoffs'].add((shop_id, off_date))
+    return (shop_id, off_date, import_field(row, 'reason') or None)
+
+def write_shops(conn, rows):
+    conn.executemany('INSERT INTO shops (owner_id, name, area, address, description, contact_number, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+    site_stats.bump(conn, active_shops=len(rows))
+    owner_shops.bump(conn, *sorted({row[0] for row in rows}))
+    index_version = search_index.bump(conn)
+    page_cache.bump(conn, 'shop_list')
+    def after_commit():
+        search_index.apply(index_version, added=[('area', row[2]) for row in rows] + [('shop', row[1]) for row in rows])
+        page_cache.invalidate('shop_list')
+    return after_commit
+
+def write_services(conn, rows):
+    conn.executemany('INSERT INTO services (shop_id, name, description, price, duration_minutes) VALUES (?, ?, ?, ?, ?)', rows)
+    pages = [f'shop:{shop_id}' for shop_id in sorted({row[0] for row in rows})] + ['shop_list']
+    index_version = search_index.bump(conn)
+    page_cache.bump(conn, *pages)
+    def after_commit():
+        search_index.apply(index_version, added=[('service', row[1]) for row in rows])
+        page_cache.invalidate(*pages)
+    return after_commit
+
+def write_dayoffs(conn, rows):
+    # Rows are checked against the owner's days off up front; this only covers one added meanwhile
+    conn.executemany('INSERT INTO shop_dayoffs (shop_id, off_date, reason) VALUES (?, ?, ?) ON CONFLICT DO NOTHING', rows)
+
+# kind -> (required columns, optional columns, row validator, chunk writer)
+IMPORTS = {
+    'shops': (['name', 'area', 'address', 'contact'], ['description'], validate_shop_row, write_shops),
+    'services': (['name', 'price', 'duration'], ['shop', 'description'], validate_service_row, write_services),
+    'dayoffs': (['off_date'], ['shop', 'reason'], validate_dayoff_row, write_dayoffs),
+}
+
+def import_csv(conn, kind, lines, owner_id, chunk_rows, max_errors):
+    """Validates and saves one CSV file of shops, services or days off for owner_id.
+
+    lines is any iterable of text lines (an open file, an upload stream), read
+    one row at a time. Rows are checked with the same rules as the owner
+    forms; valid ones are inserted chunk_rows per transaction with
+    executemany, and invalid ones are reported by line without stopping the
+    rest of the file.
+    """
+    required, _, validate, write = IMPORTS[kind]
+    report = ImportReport(kind, max_errors)
+    reader = csv.DictReader(lines)
+    try:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    except (csv.Error, UnicodeDecodeError) as e:
+        report.reject(1, f'Unreadable file: {e}')
+        return report
+    missing = [column for column in required if column not in reader.fieldnames]
+    if missing:
+        report.reject(1, 'Missing column(s): ' + ', '.join(missing))
+        return report
+
+    state = {'owner_id': owner_id, 'now': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'shops': {}, 'dayoffs': set()}
+    for row in conn.execute('SELECT id, name FROM shops WHERE owner_id = ? ORDER BY id', (owner_id,)):
+        state['shops'].setdefault(row['name'], row['id'])
+    if kind == 'dayoffs':
+        state['dayoffs'] = {tuple(row) for row in conn.execute('''
+            SELECT d.shop_id, d.off_date FROM shop_dayoffs d JOIN shops s ON s.id = d.shop_id WHERE s.owner_id = ?
+        ''', (owner_id,))}
+
+    batch = []
+    def flush():
+        try:
+            after_commit = write(conn, [values for _, values in batch])
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            for line, _ in batch:
+                report.reject(line, f'Not saved: {e}')
+            return
+        report.imported += len(batch)
+        if after_commit:
+            after_commit()
+
+    try:
+        for row in reader:
+            report.rows += 1
+            try:
+                batch.append((reader.line_num, validate(row, state)))
+            except ValueError as e:
+                report.reject(reader.line_num, str(e))
+                continue
+            if len(batch) >= chunk_rows:
+                flush()
+                batch = []
+    except (csv.Error, UnicodeDecodeError) as e:
+        report.reject(reader.line_num + 1, f'Unreadable file, stopped here: {e}')
+    if batch:
+        flush()
+    return report
+
+@app.cli.command('import-csv')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--owner', 'owner_email', required=True, help='Email of the shop owner the rows belong to.')
+def import_csv_command(kind, path, owner_email):
+    """Bulk-import shops, services or day offs from a CSV file."""
+    started = perf_counter()
+    with db.borrow() as conn:
+        owner = conn.execute("SELECT id FROM users WHERE email = ? AND role = 'shop_owner'", (owner_email,)).fetchone()
+        if owner is None:
+            raise SystemExit(f'No shop owner with email {owner_email}.')
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            report = import_csv(conn, kind, f, owner['id'], app.config['IMPORT_CHUNK_ROWS'], app.config['IMPORT_MAX_ERRORS'])
+    for error in report.errors:
+        print(f"line {error['line']}: {error['error']}")
+    if report.error_count > len(report.errors):
+        print(f'... and {report.error_count - len(report.errors)} more')
+    print(f'Imported {report.imported} of {report.rows} {kind} rows in {perf_counter() - started:.2f}s '
+          f'({report.error_count} rejected).')
+
+# --- Homepage Stats ---
+class SiteStatsCache:
+    """Homepage statistics cached in the single-row site_stats table.
+
+    Every worker reads the same row, so a page view costs one primary-key
+    lookup regardless of table sizes. Once the row is older than the TTL, the
+    first worker to claim the refresh lease recomputes it on a background
+    thread while everyone (itself included) keeps serving the stale values.
+    With incremental updates on, booking, payment, review and shop writes
+    also adjust the counters in their own transactions between refreshes.
+    """
+    def __init__(self, db, ttl=60, lease=30, incremental=False):
+        self.db = db
+        self.ttl = ttl
+        self.lease = lease
+        self.incremental = incremental
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def compute(conn):
+        """Runs the full aggregate queries"""
+        counters = {}
+        counters['active_shops'] = conn.execute('SELECT COUNT(*) FROM shops').fetchone()[0]
+        counters['monthly_bookings'] = conn.execute("SELECT COUNT(*) FROM appointments WHERE appointment_date >= date('now', '-1 month')").fetchone()[0]
+        review_count, rating_sum = conn.execute('SELECT COALESCE(SUM(review_count), 0), COALESCE(SUM(rating_sum), 0) FROM shop_rating_stats').fetchone()
+        counters['review_count'] = review_count
+        counters['rating_sum'] = rating_sum
+        total, reliable = conn.execute("SELECT COUNT(*), COUNT(CASE WHEN status IN ('confirmed', 'completed') THEN 1 END) FROM appointments").fetchone()
+        counters['total_appointments'] = total
+        counters['reliable_appointments'] = reliable
+        return counters
+
+    def store(self, conn, counters):
+        conn.execute('''
+            INSERT OR REPLACE INTO site_stats (id, active_shops, monthly_bookings, review_count, rating_sum,
+                                               total_appointments, reliable_appointments, computed_at, refresh_lease_until)
+            VALUES (1, :active_shops, :monthly_bookings, :review_count, :rating_sum,
+                    :total_appointments, :reliable_appointments, :computed_at, 0)
+        ''', {**counters, 'computed_at': unix_time()})
+
+    def refresh(self):
+        """Recomputes and stores the row on a connection of its own"""
+        try:
+            with self.db.borrow() as conn:
+                self.store(conn, self.compute(conn))
+                conn.commit()
+        except sqlite3.Error:
+            app.logger.exception('Refreshing homepage stats failed')
+
+    def _claim_lease(self):
+        """Takes the refresh lease on a connection of its own, so the caller's open transaction is left alone"""
+        now = unix_time()
+        try:
+            with self.db.borrow() as conn:
+                cursor = conn.execute('UPDATE site_stats SET refresh_lease_until = ? WHERE id = 1 AND refresh_lease_until < ?',
+                                      (now + self.lease, now))
+                conn.commit()
+        except sqlite3.OperationalError:
+            # Write lock held elsewhere (possibly by the caller): leave the refresh to a later request
+            return False
+        return cursor.rowcount == 1
+
+    def get(self, conn):
+        row = conn.execute('SELECT * FROM site_stats WHERE id = 1').fetchone()
+        if row is None:
+            # Cold start: one thread computes, concurrent requests wait for it
+            with self._lock, self.db.borrow() as own:
+                row = own.execute('SELECT * FROM site_stats WHERE id = 1').fetchone()
+                if row is None:
+                    self.store(own, self.compute(own))
+                    own.commit()
+                    row = own.execute('SELECT * FROM site_stats WHERE id = 1').fetchone()
+        # A caller with uncommitted writes holds the write lock; the next request claims the refresh instead
+        elif unix_time() - row['computed_at'] > self.ttl and not conn.in_transaction and self._claim_lease():
+            threading.Thread(target=self.refresh, name='site-stats-refresh', daemon=True).start()
+        return self.present(row)
+
+    def bump(self, conn, **deltas):
+        """Adjusts counters inside the caller's transaction when incremental updates are on"""
+        if not self.incremental or not deltas:
+            return
+        assignments = ', '.join(f'{column} = {column} + :{column}' for column in deltas)
+        conn.execute(f'UPDATE site_stats SET {assignments} WHERE id = 1', deltas)
+
+    @staticmethod
+    def present(row):
+        return {
+            'active_shops': row['active_shops'],
+            'monthly_bookings': row['monthly_bookings'],
+            'avg_rating': round(row['rating_sum'] / row['review_count'], 1) if row['review_count'] else 5.0,
+            'reliability': round((row['reliable_appointments'] / row['total_appointments']) * 100) if row['total_appointments'] > 0 else 100
+        }
+
+site_stats = SiteStatsCache(db, ttl=app.config['HOME_STATS_TTL'], incremental=app.config['HOME_STATS_INCREMENTAL'])
+
+def count_new_booking(conn, appointment):
+    site_stats.bump(conn, total_appointments=1, monthly_bookings=1)
+
+reservations.on_reserve.append(count_new_booking)
+
+# --- Image Pipeline ---
+# Where each kind of upload lives: config key of the folder, path under static/
+IMAGE_FOLDERS = {
+    'profile': ('UPLOAD_FOLDER', 'uploads/profile_pics'),
+    'shop': ('SHOP_UPLOAD_FOLDER', 'uploads/shop_pics'),
+}
+
+# Leading bytes of each accepted format, and the extension it is stored under
+IMAGE_SIGNATURES = [(b'\x89PNG\r\n\x1a\n', 'png'), (b'\xff\xd8\xff', 'jpg'), (b'GIF87a', 'gif'), (b'GIF89a', 'gif')]
+
+class ImagePipeline:
+    """Stores uploads under content-hash names and builds their variants off the request thread.
+
+    store() runs on the request. It streams the upload to disk while hashing
+    it, enforces the size and pixel limits, checks the file really is an
+    image, and names it <sha256>.<ext>, so a duplicate upload is stored once.
+    A worker thread then strips metadata from the original and writes a
+    WebP file per IMAGE_VARIANTS entry next to it. Without Pillow the
+    original is kept and served as uploaded. Variants lost to a restart are
+    rebuilt by `flask process-images`.
+    """
+    def __init__(self, variants, quality=80, max_bytes=5 * 1024 * 1024, max_pixels=40_000_000):
+        self.variants = variants
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.stats = {'stored': 0, 'duplicates': 0, 'processed': 0, 'failed': 0}
+        self._ready = set()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    @staticmethod
+    def variant_name(name, variant):
+        return f"{name.rsplit('.', 1)[0]}_{variant}.webp"
+
+    def store(self, file, folder):
+        """Saves an uploaded FileStorage and queues its variants; returns the stored name.
+
+        Raises ValueError with a message fit for the user when the upload is rejected.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+        handle, temp_path = tempfile.mkstemp(dir=folder, suffix='.upload')
+        try:
+            with os.fdopen(handle, 'wb') as out:
+                while True:
+                    chunk = file.stream.read(64 * 1024)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f'Image is too large! The limit is {self.max_bytes // (1024 * 1024)} MB.')
+                    if len(head) < 16:
+                        head += chunk[:16]
+                    digest.update(chunk)
+                    out.write(chunk)
+            ext = next((ext for signature, ext in IMAGE_SIGNATURES if head.startswith(signature)), None)
+            if ext is None:
+                raise ValueError('That file is not a PNG, JPEG or GIF image.')
+            if Image is not None:
+                try:
+                    with Image.open(temp_path) as image:
+                        width, height = image.size
+                except Exception:
+                    raise ValueError('That image could not be read.')
+                if width * height > self.max_pixels:
+                    raise ValueError('Image dimensions are too large!')
+
+            name = f'{digest.hexdigest()[:32]}.{ext}'
+            path = os.path.join(folder, name)
+            if os.path.exists(path):
+                self.stats['duplicates'] += 1
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, path)
+                self.stats['stored'] += 1
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.enqueue(folder, name)
+        return name
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='image-pipeline', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, folder, name):
+        if Image is None:
+            return
+        self._ensure_worker()
+        self._queue.put((folder, name))
+
+    def _run(self):
+        while True:
+            folder, name = self._queue.get()
+            try:
+                self.process(folder, name)
+            except Exception:
+                self.stats['failed'] += 1
+                app.logger.exception('Could not build image variants for %s', name)
+            finally:
+                self._queue.task_done()
+
+    def process(self, folder, name):
+        """Strips metadata from the original and writes any missing variants"""
+        if Image is None:
+            return
+        path = os.path.join(folder, name)
+        targets = {variant: os.path.join(folder, self.variant_name(name, variant)) for variant in self.variants}
+        if all(os.path.exists(target) for target in targets.values()):
+            return
+        with Image.open(path) as original:
+            image_format = original.format
+            image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.mode in ('P', 'LA', 'PA') else 'RGB')
+
+        # Re-saving drops EXIF (camera, GPS) and other metadata from the public original
+        if image_format in ('JPEG', 'PNG'):
+            clean = image.convert('RGB') if image_format == 'JPEG' else image
+            self._save(clean, path, image_format, quality=90, optimize=True)
+
+        for variant, longest_side in self.variants.items():
+            if os.path.exists(targets[variant]):
+                continue
+            resized = image.copy()
+            resized.thumbnail((longest_side, longest_side))
+            self._save(resized, targets[variant], 'WEBP', quality=self.quality, method=4)
+        self.stats['processed'] += 1
+
+    @staticmethod
+    def _save(image, path, image_format, **options):
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        image.save(temp_path, image_format, **options)
+        os.replace(temp_path, path)
+
+    def flush(self, timeout=None):
+        """Waits for queued variants to be written (tests and CLI)"""
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        deadline = None if timeout is None else perf_counter() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and perf_counter() > deadline:
+                return False
+            sleep(0.01)
+        return True
+
+    def url(self, kind, name, variant='display'):
+        """Static URL of a variant when it has been built, else of the original"""
+        config_key, static_dir = IMAGE_FOLDERS[kind]
+        if variant:
+            variant_file = self.variant_name(name, variant)
+            path = os.path.join(app.config[config_key], variant_file)
+            if path in self._ready or os.path.exists(path):
+                self._ready.add(path)
+                return url_for('static', filename=f'{static_dir}/{variant_file}')
+        return url_for('static', filename=f'{static_dir}/{name}')
+
+    def discard(self, folder, name):
+        """Removes a stored image and its variants; callers check nothing references it first"""
+        for filename in [name] + [self.variant_name(name, variant) for variant in self.variants]:
+            path = os.path.join(folder, filename)
+            self._ready.discard(path)
+            if os.path.exists(path):
+                os.remove(path)
+
+images = ImagePipeline(
+    app.config['IMAGE_VARIANTS'],
+    quality=app.config['IMAGE_QUALITY'],
+    max_bytes=app.config['IMAGE_MAX_BYTES'],
+    max_pixels=app.config['IMAGE_MAX_PIXELS'],
+)
+
+@app.template_global()
+def image_url(kind, name, variant='display'):
+    """{{ image_url('shop', shop.shop_image, 'thumb') }}: the smallest copy that fits the slot"""
+    return images.url(kind, name, variant)
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    flash(f"Upload is too large! The limit is {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB.", 'danger')
+    return redirect(request.url)
+
+@app.cli.command('process-images')
+def process_images_command():
+    """Build missing image variants for every stored upload."""
+    if Image is None:
+        raise SystemExit('Pillow is not installed; uploads are served as uploaded.')
+    count = 0
+    for kind, (config_key, _) in IMAGE_FOLDERS.items():
+        folder = app.config[config_key]
+        for name in sorted(os.listdir(folder)):
+            if allowed_file(name):
+                try:
+                    images.process(folder, name)
+                    count += 1
+                except Exception as e:
+                    print(f'{kind}/{name}: {e}')
+    print(f'Checked variants for {count} images.')
+
+# --- Static Assets ---
+class StaticAssets:
+    """Content-hashed, precompressed copies of the site's CSS and JS.
+
+    build() copies static/<dir>/name.ext to ASSETS_FOLDER/<dir>/name.<hash>.ext
+    and writes .gz (and .br when brotli is installed) next to it. Because a
+    changed file gets a new name, the copies are served with immutable
+    caching and browsers never revalidate them. build() runs at startup and
+    as `flask build-assets`; it only writes files that are missing.
+    """
+    EXTENSIONS = ('.css', '.js')
+
+    def __init__(self, source_dir, build_dir, subdirs=('css', 'js'), max_age=365 * 24 * 3600):
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.subdirs = subdirs
+        self.max_age = max_age
+        self.manifest = {}
+
+    @staticmethod
+    def _write(path, data):
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def build(self):
+        manifest = {}
+        for subdir in self.subdirs:
+            for root, _, files in os.walk(os.path.join(self.source_dir, subdir)):
+                for filename in sorted(files):
+                    if not filename.endswith(self.EXTENSIONS):
+                        continue
+                    source = os.path.join(root, filename)
+                    logical = os.path.relpath(source, self.source_dir).replace(os.sep, '/')
+                    with open(source, 'rb') as f:
+                        data = f.read()
+                    stem, ext = os.path.splitext(logical)
+                    built = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+                    target = os.path.join(self.build_dir, built)
+                    self._write(target, data)
+                    self._write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                    if brotli is not None:
+                        self._write(target + '.br', brotli.compress(data, quality=11))
+                    manifest[logical] = built
+        self.manifest = manifest
+        return manifest
+
+    def url(self, filename):
+        built = self.manifest.get(filename)
+        if built is None:
+            return url_for('static', filename=filename)
+        return url_for('asset', filename=built)
+
+    def serve(self, filename):
+        """Sends the best encoding the client accepts, cached for good"""
+        mimetype = mimetypes.guess_type(filename)[0]
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[candidate] and os.path.exists(os.path.join(self.build_dir, filename + suffix)):
+                encoding = candidate
+                filename += suffix
+                break
+        response = send_from_directory(self.build_dir, filename, mimetype=mimetype, max_age=self.max_age)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+assets = StaticAssets(app.static_folder, app.config['ASSETS_FOLDER'], max_age=app.config['ASSETS_MAX_AGE'])
+if not SPAWNED_CHILD:
+    try:
+        with boot_step('assets'):
+            assets.build()
+    except OSError as e:
+        # Read-only deployments still work, just without fingerprinting
+        app.logger.warning('Could not build static assets (%s); serving them from /static', e)
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    return assets.serve(filename)
+
+@app.template_global()
+def static_url(filename):
+    """{{ static_url('css/style.css') }}: fingerprinted URL when the asset was built"""
+    return assets.url(filename)
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress static CSS/JS."""
+    for logical, built in assets.build().items():
+        print(f'{logical} -> {built}')
+    if brotli is None:
+        print('brotli is not installed; wrote gzip siblings only.')
+
+# --- Templates ---
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """Jinja's on-disk bytecode cache, counting templates it saved compiling"""
+    def __init__(self, directory=None):
+        super().__init__(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+template_bytecode = None
+if app.config['TEMPLATE_CACHE_DIR'] != 'off':
+    try:
+        if app.config['TEMPLATE_CACHE_DIR']:
+            os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        template_bytecode = TemplateBytecodeCache(app.config['TEMPLATE_CACHE_DIR'] or None)
+        app.jinja_env.bytecode_cache = template_bytecode
+    except OSError as e:
+        app.logger.warning('Template bytecode cache unavailable (%s); compiling templates in memory only', e)
+
+def warm_templates():
+    """Loads every template into the environment's cache so no request pays for compiling one"""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+    """Compile every template and write its bytecode cache."""
+    names = warm_templates()
+    if template_bytecode is None:
+        print(f'Compiled {len(names)} templates; the bytecode cache is off.')
+    else:
+        print(f'Compiled {len(names)} templates ({template_bytecode.hits} already cached) into {template_bytecode.directory}.')
+
+# --- Page Cache ---
+class PageCache:
+    """Rendered public pages, kept per worker and revalidated against data versions.
+
+    Each page depends on named rows of cache_versions ('shop:<id>' for a shop
+    page, 'shop_list' for /shops). Writers bump those rows inside their
+    transaction and call invalidate() once committed; other workers re-read
+    the versions at most every check_interval seconds, so a warm hit costs no
+    SQLite work at all. Bodies carry a strong ETag (a hash of the bytes) and
+    a matching If-None-Match is answered with 304.
+    """
+    def __init__(self, size=256, check_interval=1.0, max_age=300):
+        self.size = size
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._entries = collections.OrderedDict()  # key -> (versions, etag, body, content_type, stored_at)
+        self._versions = {}  # name -> (version, checked_at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cacheable():
+        """Only anonymous GETs with nothing flashed share one rendering"""
+        return request.method == 'GET' and not session.get('loggedin') and '_flashes' not in session
+
+    def versions(self, names):
+        """Current versions of names, from memory while the last check is recent enough"""
+        now = unix_time()
+        with self._lock:
+            known = {name: self._versions.get(name) for name in names}
+        stale = [name for name, seen in known.items() if seen is None or now - seen[1] >= self.check_interval]
+        if stale:
+            placeholders = ', '.join(['?'] * len(stale))
+            rows = dict(db.connection.execute(f'SELECT name, version FROM cache_versions WHERE name IN ({placeholders})', stale).fetchall())
+            with self._lock:
+                for name in stale:
+                    known[name] = self._versions[name] = (rows.get(name, 0), now)
+        return tuple(known[name][0] for name in names)
+
+    def bump(self, conn, *names):
+        """Marks pages built on names stale for every worker; call inside the writing transaction"""
+        conn.executemany('''
+            INSERT INTO cache_versions (name, version) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET version = version + 1
+        ''', [(name,) for name in names])
+
+    def invalidate(self, *names):
+        """After a committed bump: this worker re-reads those versions on its next request"""
+        with self._lock:
+            for name in names:
+                self._versions.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def serve(self, key, names, render):
+        """The stored page for key while its versions hold, else render() and store the result"""
+        versions = self.versions(names)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (entry[0] != versions or unix_time() - entry[4] > self.max_age):
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+        state = 'HIT'
+        if entry is None:
+            response = app.make_response(render())
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            entry = (versions, hashlib.sha256(body).hexdigest()[:32], body, response.content_type, unix_time())
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+            state = 'MISS'
+
+        etag = entry[1]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(entry[2], content_type=entry[3])
+        response.set_etag(etag)
+        response.headers['X-Page-Cache'] = state
+        # Browsers keep the copy but revalidate every time; the 304 keeps that cheap
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response
+
+page_cache = PageCache(size=app.config['PAGE_CACHE_SIZE'], check_interval=app.config['PAGE_CACHE_CHECK_INTERVAL'],
+                       max_age=app.config['PAGE_CACHE_MAX_AGE'])
+
+def cached_page(depends_on):
+    """Serves a public view through page_cache; depends_on(**view_args) names the versions it reads"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            if not page_cache.size or not PageCache.cacheable():
+                return view(**kwargs)
+            return page_cache.serve(request.full_path, depends_on(**kwargs), lambda: view(**kwargs))
+        return wrapper
+    return decorator
+
+# --- Password Hashing ---
+class HashingBusy(Exception):
+    """Every hashing slot stayed taken for the whole wait; the client should retry shortly"""
+
+def full_hash_method(method):
+    """Spells out werkzeug's defaults so stored hashes can be compared against it"""
+    if method == 'scrypt':
+        return 'scrypt:32768:8:1'
+    if method in ('pbkdf2', 'pbkdf2:sha256'):
+        return f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+class PasswordHasher:
+    """generate_password_hash/check_password_hash on a small process pool.
+
+    Hashing is deliberately slow, so it runs in pool_size child processes
+    instead of on the request's CPU time. At most queue_depth hashes per
+    worker are running or queued; a request that cannot get a slot within
+    wait seconds gets HashingBusy, so a burst of logins is shed quickly
+    instead of starving everything else. The pool is started on first use
+    and again after a fork.
+    """
+    def __init__(self, method, pool_size=1, queue_depth=8, wait=2.0):
+        self.method = full_hash_method(method)
+        self.pool_size = pool_size
+        self.wait = wait
+        self.stats = {'hashed': 0, 'rejected': 0}
+        self._slots = threading.BoundedSemaphore(queue_depth)
+        self._pool = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _executor(self):
+        if self._pid == os.getpid():
+            return self._pool
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # A forked copy of the parent's pool cannot be used: start our own
+                self._pool = ProcessPoolExecutor(self.pool_size, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+        return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.wait):
+            self.stats['rejected'] += 1
+            raise HashingBusy()
+        try:
+            self.stats['hashed'] += 1
+            if not self.pool_size:
+                return fn(*args)
+            try:
+                return self._executor().submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A child died (e.g. OOM-killed): replace the pool and try once more
+                with self._start_lock:
+                    self._pid = None
+                return self._executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, stored, password):
+        return self._run(check_password_hash, stored, password)
+
+    def needs_rehash(self, stored):
+        """Whether stored was made with another method or cost than the configured one"""
+        return stored.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], pool_size=app.config['HASH_POOL_SIZE'],
+                                 queue_depth=app.config['HASH_QUEUE_DEPTH'], wait=app.config['HASH_QUEUE_WAIT'])
+atexit.register(password_hasher.shutdown)
+
+def busy_page(template, msg):
+    """Re-renders a form with msg as a 503 the client may retry after a moment"""
+    return render_template(template, msg=msg), 503, {'Retry-After': '2'}
 
 # --- Routes ---
 
 @app.route('/')
 def index():
-    cursor = get_db_cursor()
-    
     # Live Social Proof Stats
-    cursor.execute('SELECT COUNT(*) as count FROM shops')
-    active_shops = cursor.fetchone()['count']
-    
-    cursor.execute("SELECT COUNT(*) as count FROM appointments WHERE appointment_date >= date('now', '-1 month')")
-    monthly_bookings = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT AVG(rating) as avg_rating FROM reviews')
-    res = cursor.fetchone()
-    avg_rating = round(res['avg_rating'], 1) if res['avg_rating'] else 5.0
-    
-    cursor.execute('SELECT COUNT(*) as total, COUNT(CASE WHEN status IN ("confirmed", "completed") THEN 1 END) as reliable FROM appointments')
-    res_rel = cursor.fetchone()
-    reliability = round((res_rel['reliable'] / res_rel['total']) * 100) if res_rel['total'] > 0 else 100
-
-    stats = {
-        'active_shops': active_shops,
-        'monthly_bookings': monthly_bookings,
-        'avg_rating': avg_rating,
-        'reliability': reliability
-    }
+    stats = site_stats.get(db.connection)
 
     return render_template('index.html', stats=stats)
 
@@ -208,7 +2343,20 @@ def login():
         cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
         account = cursor.fetchone()
         
-        if account and check_password_hash(account['password'], password):
+        try:
+            valid = account is not None and password_hasher.check(account['password'], password)
+        except HashingBusy:
+            return busy_page('login.html', 'Too many sign-ins right now. Please try again in a moment.')
+
+        if valid:
+            if password_hasher.needs_rehash(account['password']):
+                # Upgrade to the configured method/cost while we have the plain password
+                try:
+                    cursor.execute('UPDATE users SET password = ? WHERE id = ? AND password = ?',
+                                   (password_hasher.hash(password), account['id'], account['password']))
+                    db.connection.commit()
+                except HashingBusy:
+                    pass  # Next login will do it
             session['loggedin'] = True
             session['id'] = account['id']
             session['email'] = account['email']
@@ -255,7 +2403,10 @@ def register():
         elif len(password) < 8:
             msg = 'Password must be at least 8 characters long!'
         else:
-            hashed_password = generate_password_hash(password)
+            try:
+                hashed_password = password_hasher.hash(password)
+            except HashingBusy:
+                return busy_page('register.html', 'Too many sign-ups right now. Please try again in a moment.')
             now = get_now().strftime('%Y-%m-%d %H:%M:%S')
             cursor.execute('INSERT INTO users (name, email, password, role, phone_number, gender, area, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', 
                            (name, email, hashed_password, role, phone_number, gender, area, now))
@@ -303,12 +2454,11 @@ def profile():
                 file = request.files['profile_pic']
                 if file and file.filename != '':
                     if allowed_file(file.filename):
-                        filename = secure_filename(file.filename)
-                        import uuid
-                        unique_filename = f"{uuid.uuid4()}_{filename}"
                         try:
-                            file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
-                            cursor.execute('UPDATE users SET profile_pic = ? WHERE id = ?', (unique_filename, user_id))
+                            stored_name = images.store(file, app.config['UPLOAD_FOLDER'])
+                            cursor.execute('UPDATE users SET profile_pic = ? WHERE id = ?', (stored_name, user_id))
+                        except ValueError as e:
+                            flash(str(e), 'danger')
                         except Exception as e:
                             flash(f'Error saving profile picture: {str(e)}', 'danger')
                     else:
@@ -316,7 +2466,12 @@ def profile():
             
             cursor.execute('UPDATE users SET name = ?, phone_number = ?, gender = ?, area = ? WHERE id = ?', 
                            (name, phone, gender, area, user_id))
+            # Their name appears on the pages of shops they reviewed
+            cursor.execute('SELECT DISTINCT shop_id FROM reviews WHERE user_id = ?', (user_id,))
+            reviewed = [f"shop:{row['shop_id']}" for row in cursor.fetchall()]
+            page_cache.bump(db.connection, *reviewed)
             db.connection.commit()
+            page_cache.invalidate(*reviewed)
             session['name'] = name # Update session name
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('profile'))
@@ -333,44 +2488,62 @@ def owner_dashboard():
         return redirect(url_for('login'))
     
     cursor = get_db_cursor()
-    # Get Owner's Shop
-    cursor.execute('SELECT * FROM shops WHERE owner_id = ?', (session['id'],))
-    shop = cursor.fetchone()
+    # Get the shop being managed, and the owner's other branches to switch to
+    shop = get_owner_shop()
+    cursor.execute('SELECT id, name, area FROM shops WHERE owner_id = ? ORDER BY name, id', (session['id'],))
+    branches = cursor.fetchall()
     
     services = []
-    appointments = []
-    reviews = []
+    appointments = Page([], None, 'cursor')
+    reviews = Page([], None, 'reviews_cursor')
     
     if shop:
         # Get Services
         cursor.execute('SELECT * FROM services WHERE shop_id = ?', (shop['id'],))
         services = cursor.fetchall()
         
-        # Get Appointments (with joins for user details, multiple services, and total duration)
-        cursor.execute('''
-            SELECT a.*, u.name as user_name, GROUP_CONCAT(s.name, ', ') as services_list, p.amount, p.status as payment_status
+        # Get Appointments, a page at a time; services and payments are summarised on the row
+        appointments = fetch_page('''
+            SELECT a.*, u.name as user_name
             FROM appointments a 
             JOIN users u ON a.user_id = u.id 
-            LEFT JOIN appointment_services asrv ON a.id = asrv.appointment_id
-            LEFT JOIN services s ON asrv.service_id = s.id
-            LEFT JOIN payments p ON a.id = p.appointment_id
-            WHERE a.shop_id = ?
-            GROUP BY a.id
-            ORDER BY a.appointment_date DESC, a.appointment_time DESC
-        ''', (shop['id'],))
-        appointments = cursor.fetchall()
+            WHERE a.shop_id = ? AND {keyset}
+            ORDER BY a.appointment_date DESC, a.appointment_time DESC, a.id DESC
+            LIMIT ?
+        ''', (shop['id'],), ('a.appointment_date', 'a.appointment_time', 'a.id'))
 
         # Get Reviews for this shop
-        cursor.execute('''
+        reviews = fetch_page('''
             SELECT r.*, u.name as user_name 
             FROM reviews r
             JOIN users u ON r.user_id = u.id
-            WHERE r.shop_id = ?
-            ORDER BY r.created_at DESC
-        ''', (shop['id'],))
-        reviews = cursor.fetchall()
+            WHERE r.shop_id = ? AND {keyset}
+            ORDER BY r.created_at DESC, r.id DESC
+            LIMIT ?
+        ''', (shop['id'],), ('r.created_at', 'r.id'), param='reviews_cursor')
+
+        if wants_json():
+            return jsonify({'appointments': appointments.as_json(), 'reviews': reviews.as_json()})
+
+    return render_template('owner_dashboard.html', shop=shop, branches=branches, services=services, appointments=appointments, reviews=reviews)
+
+@app.route('/owner/switch_shop', methods=['POST'])
+def switch_shop():
+    """Chooses which of the owner's branches the owner pages manage"""
+    if not is_logged_in() or not is_owner():
+        return redirect(url_for('login'))
 
-    return render_template('owner_dashboard.html', shop=shop, services=services, appointments=appointments, reviews=reviews)
+    cursor = get_db_cursor()
+    cursor.execute('SELECT id, name FROM shops WHERE id = ? AND owner_id = ?', (request.form.get('shop_id', type=int), session['id']))
+    shop = cursor.fetchone()
+    if shop:
+        session['owner_shop_id'] = shop['id']
+        owner_shops.bump(db.connection, session['id'])
+        db.connection.commit()
+        flash(f"Now managing {shop['name']}.", 'info')
+    else:
+        flash('Shop not found!', 'danger')
+    return redirect(url_for('owner_dashboard'))
 
 @app.route('/owner/add_shop', methods=['GET', 'POST'])
 def add_shop():
@@ -390,12 +2563,10 @@ def add_shop():
             file = request.files['shop_image']
             if file and file.filename != '':
                 if allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    timestamp = get_now().strftime('%Y%m%d%H%M%S')
-                    filename = f"{timestamp}_{filename}"
                     try:
-                        file.save(os.path.join(app.config['SHOP_UPLOAD_FOLDER'], filename))
-                        shop_image_name = filename
+                        shop_image_name = images.store(file, app.config['SHOP_UPLOAD_FOLDER'])
+                    except ValueError as e:
+                        flash(str(e), 'danger')
                     except Exception as e:
                         flash(f'Error saving image: {str(e)}', 'danger')
                 else:
@@ -413,7 +2584,17 @@ def add_shop():
             now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             cursor.execute('INSERT INTO shops (owner_id, name, area, address, description, contact_number, shop_image, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
                            (session['id'], name, area, address, description, contact, shop_image_name, now))
+            shop_id = cursor.lastrowid
+            site_stats.bump(db.connection, active_shops=1)
+            owner_shops.bump(db.connection, session['id'])
+            index_version = search_index.bump(db.connection)
+            page_cache.bump(db.connection, 'shop_list')
             db.connection.commit()
+            search_index.apply(index_version, added=[('area', area), ('shop', name)])
+            page_cache.invalidate('shop_list')
+            # The dashboard opens on the new shop
+            session['owner_shop_id'] = shop_id
+            g.pop('owner_shop_id', None)
             flash('Shop created successfully!', 'success')
             return redirect(url_for('owner_dashboard'))
         
@@ -425,8 +2606,7 @@ def edit_shop():
         return redirect(url_for('login'))
         
     cursor = get_db_cursor()
-    cursor.execute('SELECT * FROM shops WHERE owner_id = ?', (session['id'],))
-    shop = cursor.fetchone()
+    shop = get_owner_shop()
 
     if not shop:
         flash('Shop profile not found!', 'danger')
@@ -445,21 +2625,10 @@ def edit_shop():
             file = request.files['shop_image']
             if file and file.filename != '':
                 if allowed_file(file.filename):
-                    # Delete old file if it exists
-                    if shop_image_name:
-                        old_path = os.path.join(app.config['SHOP_UPLOAD_FOLDER'], shop_image_name)
-                        if os.path.exists(old_path):
-                            try:
-                                os.remove(old_path)
-                            except:
-                                pass
-                    
-                    filename = secure_filename(file.filename)
-                    timestamp = get_now().strftime('%Y%m%d%H%M%S')
-                    filename = f"{timestamp}_{filename}"
                     try:
-                        file.save(os.path.join(app.config['SHOP_UPLOAD_FOLDER'], filename))
-                        shop_image_name = filename
+                        shop_image_name = images.store(file, app.config['SHOP_UPLOAD_FOLDER'])
+                    except ValueError as e:
+                        flash(str(e), 'danger')
                     except Exception as e:
                         flash(f'Error saving image: {str(e)}', 'danger')
                 else:
@@ -471,9 +2640,23 @@ def edit_shop():
         elif not is_valid_phone(contact):
             flash('Contact number must be 10-15 digits!', 'danger')
         else:
-            cursor.execute('UPDATE shops SET name = ?, area = ?, address = ?, description = ?, contact_number = ?, shop_image = ? WHERE owner_id = ?',
-                           (name, area, address, description, contact, shop_image_name, session['id']))
+            cursor.execute('UPDATE shops SET name = ?, area = ?, address = ?, description = ?, contact_number = ?, shop_image = ? WHERE id = ? AND owner_id = ?',
+                           (name, area, address, description, contact, shop_image_name, shop['id'], session['id']))
+            owner_shops.bump(db.connection, session['id'])
+            index_version = search_index.bump(db.connection)
+            page_cache.bump(db.connection, f"shop:{shop['id']}", 'shop_list')
             db.connection.commit()
+            search_index.apply(index_version, added=[('area', area), ('shop', name)],
+                               removed=[('area', shop['area']), ('shop', shop['name'])])
+            page_cache.invalidate(f"shop:{shop['id']}", 'shop_list')
+            # Replaced image: remove it unless another shop uploaded the same file
+            if shop['shop_image'] and shop['shop_image'] != shop_image_name:
+                cursor.execute('SELECT 1 FROM shops WHERE shop_image = ?', (shop['shop_image'],))
+                if not cursor.fetchone():
+                    try:
+                        images.discard(app.config['SHOP_UPLOAD_FOLDER'], shop['shop_image'])
+                    except OSError:
+                        pass
             flash('Shop details updated successfully!', 'success')
             return redirect(url_for('owner_dashboard'))
             
@@ -485,8 +2668,7 @@ def add_service():
         return redirect(url_for('login'))
         
     cursor = get_db_cursor()
-    cursor.execute('SELECT id FROM shops WHERE owner_id = ?', (session['id'],))
-    shop = cursor.fetchone()
+    shop = get_owner_shop('id')
     
     if not shop:
         flash('Please create a shop first!', 'warning')
@@ -512,7 +2694,11 @@ def add_service():
         else:
             cursor.execute('INSERT INTO services (shop_id, name, description, price, duration_minutes) VALUES (?, ?, ?, ?, ?)',
                            (shop['id'], name, description, price, duration))
+            index_version = search_index.bump(db.connection)
+            page_cache.bump(db.connection, f"shop:{shop['id']}", 'shop_list')
             db.connection.commit()
+            search_index.apply(index_version, added=[('service', name)])
+            page_cache.invalidate(f"shop:{shop['id']}", 'shop_list')
             flash('Service added successfully!', 'success')
             return redirect(url_for('owner_dashboard'))
         
@@ -560,7 +2746,15 @@ def edit_service(service_id):
                 SET name = ?, description = ?, price = ?, duration_minutes = ? 
                 WHERE id = ?
             ''', (name, description, price, duration, service_id))
+            if name != service['name']:
+                # Bookings that included it show the new name in their stored summary
+                cursor.execute('SELECT DISTINCT appointment_id FROM appointment_services WHERE service_id = ?', (service_id,))
+                refresh_appointment_summaries(db.connection, [row['appointment_id'] for row in cursor.fetchall()])
+            index_version = search_index.bump(db.connection)
+            page_cache.bump(db.connection, f"shop:{service['shop_id']}", 'shop_list')
             db.connection.commit()
+            search_index.apply(index_version, added=[('service', name)], removed=[('service', service['name'])])
+            page_cache.invalidate(f"shop:{service['shop_id']}", 'shop_list')
             flash('Service updated successfully!', 'success')
             return redirect(url_for('owner_dashboard'))
         
@@ -574,7 +2768,7 @@ def delete_service(service_id):
     cursor = get_db_cursor()
     # Ensure the service belongs to a shop owned by the current user
     cursor.execute('''
-        SELECT s.id 
+        SELECT s.id, s.name, s.shop_id 
         FROM services s 
         JOIN shops sh ON s.shop_id = sh.id 
         WHERE s.id = ? AND sh.owner_id = ?
@@ -585,8 +2779,16 @@ def delete_service(service_id):
         flash('Service not found or unauthorized access!', 'danger')
         return redirect(url_for('owner_dashboard'))
 
+    # Bookings that included it lose it from their summary once the cascade runs
+    cursor.execute('SELECT DISTINCT appointment_id FROM appointment_services WHERE service_id = ?', (service_id,))
+    affected = [row['appointment_id'] for row in cursor.fetchall()]
     cursor.execute('DELETE FROM services WHERE id = ?', (service_id,))
+    refresh_appointment_summaries(db.connection, affected)
+    index_version = search_index.bump(db.connection)
+    page_cache.bump(db.connection, f"shop:{service['shop_id']}", 'shop_list')
     db.connection.commit()
+    search_index.apply(index_version, removed=[('service', service['name'])])
+    page_cache.invalidate(f"shop:{service['shop_id']}", 'shop_list')
     flash('Service deleted successfully!', 'success')
     return redirect(url_for('owner_dashboard'))
 
@@ -596,8 +2798,7 @@ def manage_dayoffs():
         return redirect(url_for('login'))
     
     cursor = get_db_cursor()
-    cursor.execute('SELECT id FROM shops WHERE owner_id = ?', (session['id'],))
-    shop = cursor.fetchone()
+    shop = get_owner_shop('id')
     
     if not shop:
         flash('Please create a shop first!', 'warning')
@@ -621,8 +2822,7 @@ def add_dayoff():
         return redirect(url_for('manage_dayoffs'))
     
     cursor = get_db_cursor()
-    cursor.execute('SELECT id FROM shops WHERE owner_id = ?', (session['id'],))
-    shop = cursor.fetchone()
+    shop = get_owner_shop('id')
     
     if not shop:
         flash('Shop not found!', 'danger')
@@ -661,6 +2861,93 @@ def delete_dayoff(dayoff_id):
     flash('Day off removed successfully!', 'success')
     return redirect(url_for('manage_dayoffs'))
 
+@app.route('/owner/analytics')
+def owner_analytics():
+    if not is_logged_in() or not is_owner():
+        return redirect(url_for('login'))
+
+    shop_id = get_owner_shop_id()
+    if shop_id is None:
+        flash('Please create a shop first!', 'warning')
+        return redirect(url_for('add_shop'))
+
+    today = get_now().date()
+    try:
+        last_day = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else today
+        first_day = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else last_day - timedelta(days=29)
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'danger')
+        return redirect(url_for('owner_analytics'))
+    if first_day > last_day:
+        first_day, last_day = last_day, first_day
+    max_days = app.config['ANALYTICS_MAX_DAYS']
+    if (last_day - first_day).days >= max_days:
+        flash(f'Reports cover at most {max_days} days; showing the last {max_days} up to {last_day}.', 'info')
+        first_day = last_day - timedelta(days=max_days - 1)
+
+    report = shop_analytics(db.connection, shop_id, first_day.isoformat(), last_day.isoformat())
+    if wants_json():
+        return jsonify(report)
+    return render_template('owner_analytics.html', report=report)
+
+@app.route('/owner/export/<any(appointments, payments):dataset>.<any(csv, ndjson):fmt>')
+def owner_export(dataset, fmt):
+    """Streams the shop's appointments or payments, optionally limited to ?from=&to= (inclusive)"""
+    if not is_logged_in() or not is_owner():
+        return redirect(url_for('login'))
+
+    shop_id = get_owner_shop_id()
+    if shop_id is None:
+        flash('Please create a shop first!', 'warning')
+        return redirect(url_for('add_shop'))
+
+    try:
+        first_day = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+        last_day = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'danger')
+        return redirect(url_for('owner_analytics'))
+
+    # Half-open range so full timestamps on the last day are included
+    lower = first_day.isoformat() if first_day else '0000-01-01'
+    upper = (last_day + timedelta(days=1)).isoformat() if last_day else '9999-12-31'
+    filename = f"{dataset}-{first_day or 'start'}-to-{last_day or 'latest'}.{fmt}"
+    response = Response(stream_export(dataset, fmt, shop_id, lower, upper, app.config['EXPORT_CHUNK_ROWS']),
+                        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    # Let proxies pass chunks through instead of buffering the whole export
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/owner/import', methods=['GET', 'POST'])
+def owner_import():
+    """Bulk-adds shops, services or day offs from an uploaded CSV file"""
+    if not is_logged_in() or not is_owner():
+        return redirect(url_for('login'))
+
+    report = None
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        file = request.files.get('file')
+        if kind not in IMPORTS:
+            flash('Please choose what the file contains!', 'danger')
+        elif not file or file.filename == '':
+            flash('Please choose a CSV file to import!', 'danger')
+        else:
+            # Decoded as it is read, so the upload is never held in memory as one string
+            lines = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+            report = import_csv(db.connection, kind, lines, session['id'],
+                                app.config['IMPORT_CHUNK_ROWS'], app.config['IMPORT_MAX_ERRORS'])
+            if kind == 'shops':
+                g.pop('owner_shop_id', None)
+            if wants_json():
+                return jsonify(report.as_json())
+            flash(f'Imported {report.imported} of {report.rows} rows.',
+                  'success' if not report.error_count else 'warning')
+
+    return render_template('owner_import.html', report=report, imports=IMPORTS)
+
 # --- Customer Routes ---
 
 @app.route('/dashboard')
@@ -669,18 +2956,18 @@ def customer_dashboard():
         return redirect(url_for('login'))
 
     cursor = get_db_cursor()
-    # Get user's appointments
-    cursor.execute('''
-        SELECT a.*, GROUP_CONCAT(s.name, ', ') as services_list, sh.name as shop_name, sh.area
+    # Get user's appointments, a page at a time; services are summarised on the row
+    appointments = fetch_page('''
+        SELECT a.*, sh.name as shop_name, sh.area
         FROM appointments a
-        LEFT JOIN appointment_services asrv ON a.id = asrv.appointment_id
-        LEFT JOIN services s ON asrv.service_id = s.id
         JOIN shops sh ON a.shop_id = sh.id
-        WHERE a.user_id = ?
-        GROUP BY a.id
-        ORDER BY a.appointment_date DESC
-    ''', (session['id'],))
-    appointments = cursor.fetchall()
+        WHERE a.user_id = ? AND {keyset}
+        ORDER BY a.appointment_date DESC, a.appointment_time DESC, a.id DESC
+        LIMIT ?
+    ''', (session['id'],), ('a.appointment_date', 'a.appointment_time', 'a.id'))
+
+    if wants_json():
+        return jsonify({'appointments': appointments.as_json()})
     
     return render_template('customer_dashboard.html', appointments=appointments)
 
@@ -689,68 +2976,165 @@ def inbox():
     if not is_logged_in():
         return redirect(url_for('login'))
     
+    # Make sure notifications queued by this worker are visible
+    outbox.flush(timeout=1)
+
     cursor = get_db_cursor()
-    cursor.execute('''
-        SELECT n.*, a.appointment_date, a.appointment_time, s.name as shop_name 
+    cursor.execute('SELECT last_read_notification_id FROM user_inbox_state WHERE user_id = ?', (session['id'],))
+    state = cursor.fetchone()
+    last_read = state['last_read_notification_id'] if state else 0
+
+    notifications = fetch_page('''
+        SELECT n.id, n.user_id, n.appointment_id, n.title, n.message, n.created_at, n.id <= ? as is_read,
+               a.appointment_date, a.appointment_time, s.name as shop_name 
         FROM notifications n
         LEFT JOIN appointments a ON n.appointment_id = a.id
         LEFT JOIN shops s ON a.shop_id = s.id
-        WHERE n.user_id = ? 
-        ORDER BY n.created_at DESC
-    ''', (session['id'],))
-    notifications = cursor.fetchall()
+        WHERE n.user_id = ? AND {keyset}
+        ORDER BY n.id DESC
+        LIMIT ?
+    ''', (last_read, session['id']), ('n.id',))
+
+    if wants_json():
+        return jsonify({'notifications': notifications.as_json()})
     
-    # Mark all as read when visiting inbox
-    cursor.execute('UPDATE notifications SET is_read = TRUE WHERE user_id = ?', (session['id'],))
-    db.connection.commit()
+    # Mark all as read when visiting inbox: one row, however long the history
+    if notifications.rows and notifications.rows[0]['id'] > last_read:
+        mark_inbox_read(db.connection, session['id'], notifications.rows[0]['id'])
+        db.connection.commit()
     
     return render_template('inbox.html', notifications=notifications)
 
 @app.route('/shops')
+@cached_page(lambda: ('shop_list',))
 def list_shops():
     cursor = get_db_cursor()
     area_filter = request.args.get('area', '').strip()
+    search_text = request.args.get('q', '').strip()
     
-    # Get all unique areas for the datalist (autocomplete)
-    cursor.execute('SELECT DISTINCT area FROM shops WHERE area IS NOT NULL')
-    all_areas = [row['area'] for row in cursor.fetchall()]
-    
-    # Optionally rebuild index if new areas are found (simple version)
-    # In a real app, you'd do this on shop creation
-    for area in all_areas:
-        search_index.insert(area)
+    trie = search_index.current(db.connection)
 
-    query = 'SELECT * FROM shops'
+    query = 'SELECT s.*, r.avg_rating FROM shops s LEFT JOIN shop_rating_stats r ON r.shop_id = s.id WHERE {keyset}'
     params = ()
     
     if area_filter:
+        matching_areas = []
         # Use Trie to check if the prefix exists
-        if search_index.search_prefix(area_filter):
+        if trie.search_prefix(area_filter):
             # If it's a valid prefix, we find all full area names that match
-            matching_areas = search_index.get_all_with_prefix(area_filter)
-            if matching_areas:
-                placeholders = ', '.join(['?'] * len(matching_areas))
-                query += f' WHERE area IN ({placeholders})'
-                params = tuple(matching_areas)
-            else:
-                # No full words found for this prefix
-                query += ' WHERE 1=0' 
+            matching_areas = trie.get_all_with_prefix(area_filter, 'area')
+        if not matching_areas:
+            # Typo tolerance: keep the closest areas only
+            fuzzy = trie.fuzzy_search(area_filter, 'area', max_distance=fuzzy_distance(area_filter), prefix=True)
+            matching_areas = [display for display, distance, _ in fuzzy if distance == fuzzy[0][1]]
+        if matching_areas:
+            placeholders = ', '.join(['?'] * len(matching_areas))
+            query += f' AND s.area IN ({placeholders})'
+            params = tuple(matching_areas)
         else:
-            # Prefix doesn't exist in our DS
-            query += ' WHERE 1=0'
+            # Nothing close enough in our DS
+            query += ' AND 1=0'
         
-    cursor.execute(query, params)
-    shops = [dict(row) for row in cursor.fetchall()]
+    if search_text:
+        # Ranked results page on (score, id), the order search_shops returns them in
+        limit = page_limit()
+        rows = search_shops(db.connection, search_text, limit=limit + 1, areas=list(params) if area_filter else None,
+                            after=decode_cursor(request.args.get('cursor'), 2))
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1]['score'], rows[-1]['id']])
+        shops = Page([dict(row) for row in rows], next_cursor, 'cursor')
+    else:
+        shops = fetch_page(query + ' ORDER BY s.id LIMIT ?', params, ('s.id',), descending=False)
+        shops.rows = [dict(row) for row in shops.rows]
     
-    # Get average rating for each shop
     for shop in shops:
-         cursor.execute('SELECT AVG(rating) as avg_rating FROM reviews WHERE shop_id = ?', (shop['id'],))
-         res = cursor.fetchone()
-         shop['rating'] = round(res['avg_rating'], 1) if res['avg_rating'] else 'New'
+        shop['rating'] = round(shop['avg_rating'], 1) if shop['avg_rating'] else 'New'
+
+    if wants_json():
+        return jsonify({'shops': shops.as_json()})
+
+    return render_template('shops.html', shops=shops, area_filter=area_filter, search_text=search_text)
+
+@app.route('/api/search')
+def api_search():
+    """Ranked full-text search over shop names, areas, descriptions and services"""
+    text = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    results = []
+    for row in search_shops(db.connection, text, limit):
+        results.append({
+            'id': row['id'],
+            'name': row['name'],
+            'area': row['area'],
+            'description': row['description'],
+            'rating': round(row['avg_rating'], 1) if row['avg_rating'] else None,
+            'score': round(-row['score'], 4),
+            'url': url_for('shop_details', shop_id=row['id']),
+        })
+    return jsonify({'query': text, 'results': results})
+
+class LatencyTracker:
+    """Rolling window of request latencies checked against a p99 target"""
+    def __init__(self, name, target_ms, window=1000, check_every=200):
+        self.name = name
+        self.target_ms = target_ms
+        self.check_every = check_every
+        self.samples = collections.deque(maxlen=window)
+        self._count = 0
+
+    def percentile(self, fraction):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def record(self, elapsed_ms):
+        self.samples.append(elapsed_ms)
+        self._count += 1
+        if self._count % self.check_every == 0:
+            p99 = self.percentile(0.99)
+            if p99 > self.target_ms:
+                app.logger.warning('%s p99 is %.2f ms over the last %d requests (target %.1f ms)',
+                                   self.name, p99, len(self.samples), self.target_ms)
+
+autocomplete_latency = LatencyTracker('/api/autocomplete', app.config['AUTOCOMPLETE_P99_TARGET_MS'])
+
+@app.route('/api/autocomplete')
+def api_autocomplete():
+    """Top-k completions for a typed prefix, straight from the in-memory ShopTrie"""
+    started = perf_counter()
+    text = request.args.get('q', '').strip()
+    kind = request.args.get('kind')
+    kinds = [kind] if kind in ('area', 'shop', 'service') else ['area', 'shop', 'service']
+    limit = min(max(request.args.get('limit', app.config['SEARCH_TOP_K'], type=int), 1), app.config['SEARCH_TOP_K'])
+
+    suggestions = []
+    if text:
+        trie = search_index.current(db.connection)
+        for k in kinds:
+            suggestions.extend({'term': term, 'kind': k, 'count': count}
+                               for term, count in trie.top_matches(text, k, limit))
+        if not suggestions:
+            # Nothing starts with what was typed: offer the closest spellings
+            for k in kinds:
+                suggestions.extend({'term': term, 'kind': k, 'count': count, 'distance': distance}
+                                   for term, distance, count in trie.fuzzy_search(text, k, fuzzy_distance(text), limit, prefix=True))
+            suggestions.sort(key=lambda item: (item['distance'], -item['count'], item['term']))
+        else:
+            suggestions.sort(key=lambda item: (-item['count'], item['term']))
 
-    return render_template('shops.html', shops=shops, all_areas=all_areas, area_filter=area_filter)
+    response = jsonify({'query': text, 'suggestions': suggestions[:limit]})
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['AUTOCOMPLETE_MAX_AGE']
+    elapsed_ms = (perf_counter() - started) * 1000
+    response.headers['Server-Timing'] = f'trie;dur={elapsed_ms:.2f}'
+    autocomplete_latency.record(elapsed_ms)
+    return response
 
 @app.route('/shop/<int:shop_id>')
+@cached_page(lambda shop_id: (f'shop:{shop_id}',))
 def shop_details(shop_id):
     cursor = get_db_cursor()
     
@@ -760,16 +3144,22 @@ def shop_details(shop_id):
     cursor.execute('SELECT * FROM services WHERE shop_id = ?', (shop_id,))
     services = cursor.fetchall()
     
-    cursor.execute('''
+    reviews = fetch_page('''
         SELECT r.*, u.name as user_name 
         FROM reviews r
         JOIN users u ON r.user_id = u.id
-        WHERE r.shop_id = ?
-        ORDER BY r.created_at DESC
-    ''', (shop_id,))
-    reviews = cursor.fetchall()
+        WHERE r.shop_id = ? AND {keyset}
+        ORDER BY r.created_at DESC, r.id DESC
+        LIMIT ?
+    ''', (shop_id,), ('r.created_at', 'r.id'))
+
+    if wants_json():
+        return jsonify({'reviews': reviews.as_json()})
+
+    cursor.execute('SELECT * FROM shop_rating_stats WHERE shop_id = ?', (shop_id,))
+    rating_stats = cursor.fetchone()
     
-    return render_template('shop_details.html', shop=shop, services=services, reviews=reviews)
+    return render_template('shop_details.html', shop=shop, services=services, reviews=reviews, rating_stats=rating_stats)
 
 @app.route('/book', methods=['GET'])
 def book_confirm():
@@ -803,64 +3193,10 @@ def book_confirm():
 
     selected_date = request.args.get('date', get_now().strftime('%Y-%m-%d'))
     
-    # Generate Slots (Helper Logic)
-    slots_data = []
-    start_hour = 9 # 9 AM
-    end_hour = 20  # 8 PM
-    
-    # Fetch existing appointments for the shop on the selected date
-    cursor.execute('SELECT appointment_time, total_duration FROM appointments WHERE shop_id = ? AND appointment_date = ? AND status != "cancelled"', 
-                   (shop_id, selected_date))
-    existing_appointments = cursor.fetchall()
-    
     current_now = get_now()
-    current_date = current_now.date()
-    current_tz = current_now.tzinfo
-    
-    # Convert existing appointments to time ranges
-    booked_ranges = []
-    for appt in existing_appointments:
-        # SQLite returns string 'HH:MM:SS' or 'HH:MM'
-        appt_time = appt['appointment_time']
-        if isinstance(appt_time, str):
-            try:
-                time_obj = datetime.strptime(appt_time, "%H:%M:%S").time()
-            except ValueError:
-                time_obj = datetime.strptime(appt_time, "%H:%M").time()
-            
-            # Use current_date to ensure "today" is IST
-            start_time = datetime.combine(current_date, time_obj).replace(tzinfo=current_tz)
-        else:
-            # Fallback for timedelta
-            start_time = datetime.combine(current_date, (datetime.min + appt_time).time()).replace(tzinfo=current_tz)
-            
-        end_time = start_time + timedelta(minutes=int(appt['total_duration']))
-        booked_ranges.append((start_time, end_time))
-
-    today_str = current_now.strftime('%Y-%m-%d')
-    is_today = selected_date == today_str
-
-    for hour in range(start_hour, end_hour):
-        for minute in [0, 30]:
-            slot_time_str = f"{hour:02d}:{minute:02d}"
-            # Time objects for comparison
-            slot_time = datetime.strptime(slot_time_str, "%H:%M").time()
-            # Combine with IST today's date and add TZ info
-            slot_time_dt = datetime.combine(current_date, slot_time).replace(tzinfo=current_tz)
-            
-            is_booked = False
-            for b_start, b_end in booked_ranges:
-                # A slot is booked if its start time falls within an existing appointment range
-                if b_start <= slot_time_dt < b_end:
-                    is_booked = True
-                    break
-            
-            is_past = is_today and slot_time_dt < current_now
-
-            slots_data.append({
-                'time': slot_time_str,
-                'is_available': not is_booked and not is_past
-            })
+    mask = occupancy.load(db.connection, shop_id, selected_date)
+    slots_data = occupancy.slots(mask, slot_cutoff(selected_date, current_now),
+                                 sum(service['duration_minutes'] for service in selected_services))
     
     # Check if the selected date is a day off
     cursor.execute('SELECT * FROM shop_dayoffs WHERE shop_id = ? AND off_date = ?', (shop_id, selected_date))
@@ -873,6 +3209,47 @@ def book_confirm():
 
     return render_template('book.html', shop=shop, services=selected_services, slots=slots_data, selected_date=selected_date, now=current_now.strftime('%Y-%m-%d'), is_dayoff=is_dayoff, dayoff_reason=dayoff['reason'] if is_dayoff else None)
 
+@app.route('/api/availability')
+def api_availability():
+    """Slot availability for a shop and a set of services over a range of days"""
+    shop_id = request.args.get('shop_id', type=int)
+    service_ids = request.args.getlist('service_ids', type=int)
+    days = min(max(request.args.get('days', 14, type=int), 1), app.config['AVAILABILITY_MAX_DAYS'])
+
+    if not shop_id or not service_ids:
+        return jsonify({'error': 'shop_id and at least one service_ids are required'}), 400
+
+    cursor = get_db_cursor()
+    format_strings = ','.join(['?'] * len(service_ids))
+    cursor.execute(f'SELECT COUNT(*) as count, SUM(duration_minutes) as total_duration FROM services WHERE id IN ({format_strings}) AND shop_id = ?',
+                   (*service_ids, shop_id))
+    selected = cursor.fetchone()
+    if not selected['count']:
+        return jsonify({'error': 'Selected services not found'}), 404
+
+    current_now = get_now()
+    first_day = current_now.date()
+    start = request.args.get('start')
+    if start:
+        try:
+            first_day = max(first_day, datetime.strptime(start, '%Y-%m-%d').date())
+        except ValueError:
+            return jsonify({'error': 'start must be YYYY-MM-DD'}), 400
+    dates = [(first_day + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(days)]
+
+    masks, dayoffs = occupancy.load_range(db.connection, shop_id, dates[0], dates[-1])
+
+    result = []
+    for day in dates:
+        is_dayoff = day in dayoffs
+        slots_data = occupancy.slots(masks.get(day, 0), slot_cutoff(day, current_now), selected['total_duration'])
+        if is_dayoff:
+            for slot in slots_data:
+                slot['is_available'] = False
+        result.append({'date': day, 'is_dayoff': is_dayoff, 'dayoff_reason': dayoffs.get(day), 'slots': slots_data})
+
+    return jsonify({'shop_id': shop_id, 'total_duration': selected['total_duration'], 'days': result})
+
 @app.route('/process_booking', methods=['POST'])
 def process_booking():
     if not is_logged_in():
@@ -891,8 +3268,16 @@ def process_booking():
         flash('No services selected!', 'danger')
         return redirect(url_for('shop_details', shop_id=shop_id))
 
+    try:
+        booking_date = datetime.strptime(date, '%Y-%m-%d').date()
+        booking_time = datetime.strptime(time, '%H:%M').time()
+    except ValueError:
+        flash('Please choose a valid date and time slot!', 'danger')
+        return redirect(url_for('book_confirm', shop_id=shop_id, service_ids=service_ids))
+    # Stored zero-padded so times sort correctly in the schedule indexes
+    time = booking_time.strftime('%H:%M')
+
     # Validation: Ensure date/time is not in the past
-    booking_date = datetime.strptime(date, '%Y-%m-%d').date()
     current_now = get_now()
     
     if booking_date < current_now.date():
@@ -900,7 +3285,6 @@ def process_booking():
         return redirect(url_for('book_confirm', shop_id=shop_id, service_ids=service_ids))
     
     if booking_date == current_now.date():
-        booking_time = datetime.strptime(time, "%H:%M").time()
         booking_dt = datetime.combine(booking_date, booking_time).replace(tzinfo=current_now.tzinfo)
         if booking_dt < current_now:
             flash('This time slot has already passed!', 'danger')
@@ -915,51 +3299,32 @@ def process_booking():
     amount = booking_info['total_price']
     total_duration = booking_info['total_duration']
 
-    # --- Double Check Availability ---
-    current_date = current_now.date()
-    current_tz = current_now.tzinfo
-    
-    requested_start = datetime.combine(current_date, datetime.strptime(time, "%H:%M").time()).replace(tzinfo=current_tz)
-    requested_end = requested_start + timedelta(minutes=int(total_duration))
-    
-    cursor.execute('SELECT appointment_time, total_duration FROM appointments WHERE shop_id = ? AND appointment_date = ? AND status != "cancelled"', 
-                   (shop_id, date))
-    existing = cursor.fetchall()
-    
-    for appt in existing:
-        # SQLite returns string 'HH:MM:SS' or 'HH:MM'
-        if isinstance(appt['appointment_time'], str):
-            try:
-                time_obj = datetime.strptime(appt['appointment_time'], "%H:%M:%S").time()
-            except ValueError:
-                time_obj = datetime.strptime(appt['appointment_time'], "%H:%M").time()
-            e_start = datetime.combine(current_date, time_obj).replace(tzinfo=current_tz)
-        else:
-            e_start = datetime.combine(current_date, (datetime.min + appt['appointment_time']).time()).replace(tzinfo=current_tz)
-            
-        e_end = e_start + timedelta(minutes=int(appt['total_duration']))
-        
-        # Overlap check: (Start1 < End2) AND (End1 > Start2)
-        if requested_start < e_end and requested_end > e_start:
-            flash('The selected time slot is no longer available for the full duration of your services. Please choose another time.', 'danger')
-            return redirect(url_for('book_confirm', shop_id=shop_id, service_ids=service_ids))
-    # --- End Check ---
-
-    # Insert Appointment with total_price
+    # --- Atomic check-and-insert ---
     now = get_now().strftime('%Y-%m-%d %H:%M:%S')
-    cursor.execute('INSERT INTO appointments (user_id, shop_id, appointment_date, appointment_time, total_duration, total_price, status, payment_status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                   (session['id'], shop_id, date, time, total_duration, amount, 'pending', 'unpaid', now))
-    appointment_id = cursor.lastrowid
-
-    # Insert into appointment_services
-    for s_id in service_ids:
-        cursor.execute('INSERT INTO appointment_services (appointment_id, service_id) VALUES (?, ?)', (appointment_id, s_id))
-    
-    db.connection.commit()
-    
-    # Redirect to Payment with FULL amount (choice will be made in template)
-    create_notification(session['id'], "Booking Initiated", f"Your appointment for {date} at {time} has been initiated. Please complete the payment to confirm.", appointment_id)
-    return redirect(url_for('payment', appointment_id=appointment_id, amount=float(amount)))
+    try:
+        appointment_id, lock_wait = reservations.reserve(db.connection, session['id'], shop_id, date, time,
+                                                         total_duration, amount, service_ids, now)
+    except sqlite3.OperationalError as e:
+        if not is_busy_error(e):
+            raise
+        app.logger.warning('Booking for shop %s on %s %s gave up waiting for the write lock', shop_id, date, time)
+        flash('We are seeing a lot of bookings right now. Please try again in a moment.', 'warning')
+        return redirect(url_for('book_confirm', shop_id=shop_id, service_ids=service_ids, date=date))
+
+    if lock_wait * 1000 >= app.config['BOOKING_LOCK_LOG_MS']:
+        app.logger.info('Booking for shop %s waited %.1f ms on the write lock', shop_id, lock_wait * 1000)
+
+    if appointment_id is None:
+        flash('The selected time slot is no longer available for the full duration of your services. Please choose another time.', 'danger')
+        response = redirect(url_for('book_confirm', shop_id=shop_id, service_ids=service_ids))
+    else:
+        # Redirect to Payment with FULL amount (choice will be made in template)
+        create_notification(session['id'], "Booking Initiated", f"Your appointment for {date} at {time} has been initiated. Please complete the payment to confirm.", appointment_id)
+        response = redirect(url_for('payment', appointment_id=appointment_id, amount=float(amount)))
+    # --- End Check ---
+    # Every booking reports its lock wait, contended or not
+    response.headers['Server-Timing'] = f'booking-lock;dur={lock_wait * 1000:.2f}'
+    return response
 
 @app.route('/payment/<int:appointment_id>/<float:amount>', methods=['GET', 'POST'])
 def payment(appointment_id, amount):
@@ -1012,12 +3377,15 @@ def payment(appointment_id, amount):
         
         # Determine new payment status and update booking status if it's the initial payment
         if is_final_passed == '1' or payment_plan == 'full':
-            cursor.execute('UPDATE appointments SET payment_status = "paid" WHERE id = ?', (appointment_id,))
+            cursor.execute('UPDATE appointments SET payment_status = "paid", amount_paid = amount_paid + ? WHERE id = ?', (actual_amount, appointment_id))
         else:
-            cursor.execute('UPDATE appointments SET payment_status = "partially_paid" WHERE id = ?', (appointment_id,))
+            cursor.execute('UPDATE appointments SET payment_status = "partially_paid", amount_paid = amount_paid + ? WHERE id = ?', (actual_amount, appointment_id))
+        record_payment_analytics(db.connection, appointment_id, actual_amount)
             
         # Only move from pending to confirmed during the initial payment phase
         cursor.execute('UPDATE appointments SET status = "confirmed" WHERE id = ? AND status = "pending"', (appointment_id,))
+        if cursor.rowcount:
+            site_stats.bump(db.connection, reliable_appointments=1)
             
         db.connection.commit()
         
@@ -1068,6 +3436,10 @@ def cancel_appointment(appointment_id):
         return redirect(url_for('index'))
         
     cursor.execute('UPDATE appointments SET status = "cancelled" WHERE id = ?', (appointment_id,))
+    occupancy.refresh(db.connection, appt['shop_id'], appt['appointment_date'])
+    record_status_analytics(db.connection, appt, 'cancelled')
+    if appt['status'] in ('confirmed', 'completed'):
+        site_stats.bump(db.connection, reliable_appointments=-1)
     db.connection.commit()
     
     # Get details for cross-notification
@@ -1103,12 +3475,18 @@ def complete_appointment(appointment_id):
         JOIN shops s ON a.shop_id = s.id 
         WHERE a.id = ? AND s.owner_id = ?
     ''', (appointment_id, session['id']))
+    appt = cursor.fetchone()
     
-    if not cursor.fetchone():
+    if not appt:
         flash('Unauthorized action.', 'danger')
         return redirect(url_for('owner_dashboard'))
         
     cursor.execute('UPDATE appointments SET status = "completed" WHERE id = ?', (appointment_id,))
+    # Completed appointments keep their minutes; this reconciles the day's mask
+    occupancy.refresh(db.connection, appt['shop_id'], appt['appointment_date'])
+    record_status_analytics(db.connection, appt, 'completed')
+    if appt['status'] not in ('confirmed', 'completed'):
+        site_stats.bump(db.connection, reliable_appointments=1)
     db.connection.commit()
     
     # Get user_id for the appointment to notify them
@@ -1164,10 +3542,37 @@ def add_review():
         now = get_now().strftime('%Y-%m-%d %H:%M:%S')
         cursor.execute('INSERT INTO reviews (user_id, shop_id, rating, comment, created_at) VALUES (?, ?, ?, ?, ?)',
                        (session['id'], shop_id, rating, comment, now))
+        record_review_rating(db.connection, shop_id, rating)
+        site_stats.bump(db.connection, review_count=1, rating_sum=int(rating))
+        page_cache.bump(db.connection, f'shop:{shop_id}', 'shop_list')
         db.connection.commit()
+        page_cache.invalidate(f'shop:{shop_id}', 'shop_list')
         flash('Review submitted!', 'success')
     
     return redirect(url_for('shop_details', shop_id=shop_id))
 
+# Bring the schema up to date, build the search index and compile templates before serving
+if not SPAWNED_CHILD:
+    with boot_step('migrations'):
+        init_db()
+    with boot_step('search_index'):
+        rebuild_search_index()
+    if app.config['TEMPLATE_WARMUP']:
+        with boot_step('templates'):
+            warm_templates()
+    boot_timings['total'] = (perf_counter() - BOOT_STARTED) * 1000
+    app.logger.info('Worker %d ready in %.1f ms (%s)', os.getpid(), boot_timings['total'],
+                    ', '.join(f'{step} {ms:.1f} ms' for step, ms in boot_timings.items() if step != 'total'))
+    if template_bytecode is not None:
+        app.logger.info('Templates: %d loaded from bytecode cache, %d compiled', template_bytecode.hits, template_bytecode.misses)
+
+@app.cli.command('startup-report')
+def startup_report_command():
+    """Show how long this process took to boot, step by step."""
+    for step, ms in boot_timings.items():
+        print(f'{step:<14} {ms:>8.1f} ms')
+    if template_bytecode is not None:
+        print(f'templates: {template_bytecode.hits} from bytecode cache, {template_bytecode.misses} compiled')
+
 if __name__ == '__main__':
     app.run(debug=True)
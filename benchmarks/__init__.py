@@ -0,0 +1,12 @@
+"""Performance benchmarks for BookMyCut.
+
+The route suite seeds a synthetic dataset and times every route:
+
+    python -m benchmarks.suite run --scale small --output results.json
+    python -m benchmarks.suite compare baseline.json results.json
+
+The bench_*.py scripts time single components (search trie, dashboard
+queries, worker startup, password hashing) and run on their own:
+
+    python benchmarks/bench_trie.py
+"""
@@ -0,0 +1,124 @@
+"""Benchmark: dashboard appointment queries and page renders over a long history.
+
+Seeds one shop with a large booking history (default 20,000 appointments,
+1-3 services and 1-2 payments each), then times the legacy join query
+(appointment_services + services + payments with GROUP_CONCAT over the whole
+history), the same join cut to one page, and the page query the dashboards
+now run against the summary columns. Finally it renders /owner/dashboard and
+/dashboard through the test client.
+
+    python benchmarks/bench_dashboards.py [--appointments 20000] [--repeat 50]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+from time import perf_counter
+
+# Importing app opens (and migrates) its database; point it at a throwaway file
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, refresh_appointment_summaries  # noqa: E402
+
+LEGACY_FULL = '''
+    SELECT a.*, u.name as user_name, GROUP_CONCAT(s.name, ', ') as services_list, p.amount, p.status as payment_status
+    FROM appointments a
+    JOIN users u ON a.user_id = u.id
+    LEFT JOIN appointment_services asrv ON a.id = asrv.appointment_id
+    LEFT JOIN services s ON asrv.service_id = s.id
+    LEFT JOIN payments p ON a.id = p.appointment_id
+    WHERE a.shop_id = ?
+    GROUP BY a.id
+    ORDER BY a.appointment_date DESC, a.appointment_time DESC
+'''
+
+LEGACY_PAGE = '''
+    SELECT a.*, u.name as user_name, GROUP_CONCAT(s.name, ', ') as services_list, p.amount, p.status as payment_status
+    FROM (
+        SELECT * FROM appointments WHERE shop_id = ?
+        ORDER BY appointment_date DESC, appointment_time DESC, id DESC LIMIT ?
+    ) a
+    JOIN users u ON a.user_id = u.id
+    LEFT JOIN appointment_services asrv ON a.id = asrv.appointment_id
+    LEFT JOIN services s ON asrv.service_id = s.id
+    LEFT JOIN payments p ON a.id = p.appointment_id
+    GROUP BY a.id
+    ORDER BY a.appointment_date DESC, a.appointment_time DESC, a.id DESC
+'''
+
+SUMMARY_PAGE = '''
+    SELECT a.*, u.name as user_name
+    FROM appointments a
+    JOIN users u ON a.user_id = u.id
+    WHERE a.shop_id = ?
+    ORDER BY a.appointment_date DESC, a.appointment_time DESC, a.id DESC
+    LIMIT ?
+'''
+
+def seed(path, appointments, seed=42):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO users (name, email, password, role, phone_number) VALUES ('Owner', 'owner@bench', 'x', 'shop_owner', '9999999999')")
+    conn.executemany("INSERT INTO users (name, email, password, role, phone_number) VALUES (?, ?, 'x', 'customer', '9999999999')",
+                     [(f'Customer {i}', f'c{i}@bench') for i in range(200)])
+    conn.execute("INSERT INTO shops (owner_id, name, area, address, contact_number) VALUES (1, 'Bench Cuts', 'Satellite', 'addr', '9999999999')")
+    conn.executemany('INSERT INTO services (shop_id, name, price, duration_minutes) VALUES (1, ?, ?, 30)',
+                     [(name, 100 + 50 * i) for i, name in enumerate(['Haircut', 'Beard Trim', 'Shave', 'Facial', 'Hair Spa', 'Colour'])])
+    for i in range(appointments):
+        day = f'{2020 + i // 4000:04d}-{1 + i // 330 % 12:02d}-{1 + i % 28:02d}'
+        slot = f'{9 + i % 10:02d}:{30 * (i % 2):02d}'
+        cursor = conn.execute('''INSERT INTO appointments (user_id, shop_id, appointment_date, appointment_time, total_duration, total_price, status, payment_status, created_at)
+                                 VALUES (?, 1, ?, ?, 60, 300, 'confirmed', 'partially_paid', '2024-01-01 10:00:00')''',
+                              (2 + i % 200, day, slot))
+        appointment_id = cursor.lastrowid
+        conn.executemany('INSERT INTO appointment_services (appointment_id, service_id) VALUES (?, ?)',
+                         [(appointment_id, service_id) for service_id in rng.sample(range(1, 7), rng.randint(1, 3))])
+        conn.executemany("INSERT INTO payments (appointment_id, amount, status) VALUES (?, 150, 'completed')",
+                         [(appointment_id,)] * rng.randint(1, 2))
+    conn.execute('UPDATE appointments SET amount_paid = (SELECT SUM(amount) FROM payments WHERE appointment_id = appointments.id)')
+    refresh_appointment_summaries(conn, [row[0] for row in conn.execute('SELECT id FROM appointments')])
+    conn.commit()
+    conn.execute('ANALYZE')
+    return conn
+
+def timeit(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = perf_counter()
+        fn()
+        samples.append((perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.99) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    conn = seed(app.config['DATABASE'], args.appointments)
+    page = app.config['PAGE_SIZE']
+    print(f'{args.appointments} appointments, {args.repeat} runs each, milliseconds (p50 / p99)')
+    for label, fn in [
+        ('legacy join, whole history', lambda: conn.execute(LEGACY_FULL, (1,)).fetchall()),
+        ('legacy join, one page', lambda: conn.execute(LEGACY_PAGE, (1, page)).fetchall()),
+        ('summary columns, one page', lambda: conn.execute(SUMMARY_PAGE, (1, page)).fetchall()),
+    ]:
+        p50, p99 = timeit(fn, args.repeat)
+        print(f'{label:<32} {p50:>8.2f} / {p99:>8.2f}')
+
+    client = app.test_client()
+    for label, user_id, role, url in [('render /owner/dashboard', 1, 'shop_owner', '/owner/dashboard'),
+                                      ('render /dashboard', 2, 'customer', '/dashboard')]:
+        with client.session_transaction() as sess:
+            sess.update({'loggedin': True, 'id': user_id, 'role': role, 'name': 'Bench'})
+        client.get(url)
+        p50, p99 = timeit(lambda: client.get(url), args.repeat)
+        print(f'{label:<32} {p50:>8.2f} / {p99:>8.2f}')
+
+if __name__ == '__main__':
+    main()
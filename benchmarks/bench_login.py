@@ -0,0 +1,99 @@
+"""Benchmark: a burst of logins against the password hashing pool.
+
+Starts --concurrency threads that each log in --per-thread times (real
+credentials, so every request hashes), while one more thread keeps
+requesting /shops to stand in for booking traffic. Runs once with hashing
+inline on the request thread (HASH_POOL_SIZE=0 behaviour) and once per pool
+size given, reporting login throughput and latency, logins turned away with
+503, and the latency of the concurrent /shops requests.
+
+    python benchmarks/bench_login.py [--concurrency 16] [--per-thread 4] [--pools 1,2] [--queue-depth 8]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+from time import perf_counter
+
+# Importing app opens (and migrates) its database; point it at a throwaway file
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+os.environ.setdefault('PAGE_CACHE_SIZE', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'bench-password'
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+def burst(appmod, users, concurrency, per_thread):
+    app = appmod.app
+    logins, statuses, probes = [], [], []
+    done = threading.Event()
+
+    def login_worker(index):
+        client = app.test_client()
+        for attempt in range(per_thread):
+            email = users[(index * per_thread + attempt) % len(users)]
+            started = perf_counter()
+            response = client.post('/login', data={'email': email, 'password': PASSWORD})
+            logins.append((perf_counter() - started) * 1000)
+            statuses.append(response.status_code)
+            client.get('/logout')
+
+    def probe_worker():
+        client = app.test_client()
+        while not done.is_set():
+            started = perf_counter()
+            client.get('/shops')
+            probes.append((perf_counter() - started) * 1000)
+
+    probe = threading.Thread(target=probe_worker)
+    probe.start()
+    threads = [threading.Thread(target=login_worker, args=(i,)) for i in range(concurrency)]
+    started = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - started
+    done.set()
+    probe.join()
+    return elapsed, logins, statuses, probes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--per-thread', type=int, default=4)
+    parser.add_argument('--pools', default='1,2', help='comma-separated pool sizes to compare with inline hashing')
+    parser.add_argument('--queue-depth', type=int, default=8)
+    parser.add_argument('--wait', type=float, default=2.0)
+    args = parser.parse_args()
+
+    import app as appmod
+    method = appmod.app.config['PASSWORD_HASH_METHOD']
+    stored = appmod.generate_password_hash(PASSWORD, appmod.full_hash_method(method))
+    users = [f'burst{i}@bench' for i in range(args.concurrency * args.per_thread)]
+    with appmod.db.borrow() as conn:
+        conn.executemany("INSERT OR IGNORE INTO users (name, email, password, role, phone_number) VALUES ('Burst', ?, ?, 'customer', '9999999999')",
+                         [(email, stored) for email in users])
+        conn.commit()
+
+    print(f'{method}; {args.concurrency} threads x {args.per_thread} logins, queue depth {args.queue_depth}, wait {args.wait}s')
+    print(f'{"hashing":<10} {"logins/s":>9} {"p50 ms":>8} {"p99 ms":>8} {"503s":>5} {"/shops p50":>11} {"/shops p99":>11}')
+    for pool_size in [0] + [int(size) for size in args.pools.split(',') if size]:
+        appmod.password_hasher = appmod.PasswordHasher(method, pool_size=pool_size,
+                                                       queue_depth=args.queue_depth, wait=args.wait)
+        if pool_size:
+            appmod.password_hasher.check(stored, PASSWORD)  # start the pool before timing
+        elapsed, logins, statuses, probes = burst(appmod, users, args.concurrency, args.per_thread)
+        appmod.password_hasher.shutdown()
+        ok = statuses.count(302)
+        label = f'pool {pool_size}' if pool_size else 'inline'
+        print(f'{label:<10} {ok / elapsed:>9.1f} {statistics.median(logins):>8.1f} {percentile(logins, 0.99):>8.1f} '
+              f'{statuses.count(503):>5} {statistics.median(probes):>11.1f} {percentile(probes, 0.99):>11.1f}')
+
+if __name__ == '__main__':
+    main()
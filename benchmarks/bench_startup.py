@@ -0,0 +1,79 @@
+"""Benchmark: worker cold start with and without the template bytecode cache and warm-up.
+
+Each run is a fresh Python process that imports app (migrations, search index,
+assets and, when enabled, the template warm-up) and then serves the first
+request to a handful of pages through the test client, the way a freshly
+forked gunicorn worker would. Scenarios:
+
+  lazy          no bytecode cache, no warm-up: templates compile on first hit
+  warm-up       templates compiled at import, bytecode cache empty
+  cached        warm-up reading bytecode written by an earlier worker
+
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ['/', '/login', '/register', '/shops', '/shop/1']
+
+WORKER = '''
+import json, sys
+from time import perf_counter
+started = perf_counter()
+sys.path.insert(0, %(root)r)
+import app as appmod
+imported = perf_counter()
+client = appmod.app.test_client()
+first = {}
+for page in %(pages)r:
+    t = perf_counter()
+    client.get(page)
+    first[page] = (perf_counter() - t) * 1000
+print(json.dumps({'import': (imported - started) * 1000, 'first_requests': sum(first.values()),
+                  'boot': appmod.boot_timings}))
+'''
+
+def run_worker(env):
+    out = subprocess.run([sys.executable, '-c', WORKER % {'root': ROOT, 'pages': PAGES}],
+                         env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    base = dict(os.environ, DATABASE_PATH=os.path.join(workdir, 'bench.db'),
+                ASSETS_FOLDER=os.path.join(workdir, 'dist'), PAGE_CACHE_SIZE='0')
+    cache_dir = os.path.join(workdir, 'jinja')
+    run_worker(dict(base, TEMPLATE_CACHE_DIR='off'))  # migrate the database once up front
+
+    scenarios = [
+        ('lazy', dict(base, TEMPLATE_CACHE_DIR='off', TEMPLATE_WARMUP='0'), False),
+        ('warm-up', dict(base, TEMPLATE_CACHE_DIR=cache_dir, TEMPLATE_WARMUP='1'), True),
+        ('cached', dict(base, TEMPLATE_CACHE_DIR=cache_dir, TEMPLATE_WARMUP='1'), False),
+    ]
+    print(f'{args.runs} fresh processes each, median milliseconds; first requests = {", ".join(PAGES)}')
+    print(f'{"scenario":<10} {"import":>8} {"templates":>10} {"first reqs":>11} {"total":>8}')
+    for label, env, clear_cache in scenarios:
+        results = []
+        for _ in range(args.runs):
+            if clear_cache:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            results.append(run_worker(env))
+        imported = statistics.median(r['import'] for r in results)
+        templates = statistics.median(r['boot'].get('templates', 0) for r in results)
+        first = statistics.median(r['first_requests'] for r in results)
+        print(f'{label:<10} {imported:>8.1f} {templates:>10.1f} {first:>11.1f} {imported + first:>8.1f}')
+    shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
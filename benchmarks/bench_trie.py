@@ -0,0 +1,71 @@
+"""Micro-benchmark: exact-prefix vs fuzzy area lookups on ShopTrie.
+
+Builds a trie of synthetic area names (default 5,000) and times, per query:
+the exact path list_shops uses (search_prefix + get_all_with_prefix), the
+ranked top-k path, and fuzzy_search in whole-term and prefix mode.
+
+    python benchmarks/bench_trie.py [--areas 5000] [--repeat 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+from time import perf_counter
+
+# Importing app opens its database; point it at a throwaway file
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import ShopTrie, fuzzy_distance, app  # noqa: E402
+
+SYLLABLES = ['sa', 'te', 'li', 'na', 'vra', 'ng', 'pu', 'ra', 'bo', 'pal', 'kh', 'ej', 'so', 'la',
+             'ma', 'ni', 'na', 'gar', 'va', 'ste', 'jo', 'dh', 'pur', 'ch', 'and', 'khe', 'da']
+
+def make_areas(count, seed=42):
+    rng = random.Random(seed)
+    areas = {'Satellite', 'Navrangpura', 'Bopal', 'Sola', 'Maninagar', 'Vastrapur', 'Chandkheda'}
+    while len(areas) < count:
+        areas.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))).capitalize())
+    return sorted(areas)
+
+def timeit(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = perf_counter()
+        fn()
+        samples.append((perf_counter() - started) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--areas', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--max-distance', type=int, default=None,
+                        help='edits allowed for every query (default: the length-based policy list_shops uses)')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    trie = ShopTrie()
+    for area in make_areas(args.areas):
+        trie.insert(area, 'area', rng.randint(1, 40), refresh=False)
+    trie.refresh_all()
+
+    queries = ['Sat', 'Satellite', 'Satelite', 'Navrangpur', 'Navrangpra', 'Vastrapr', 'Manin']
+    print(f'{args.areas} areas, {args.repeat} runs per query, microseconds (p50 / p99)')
+    print(f'{"query":<12} {"exact prefix":>16} {"top-k":>16} {"fuzzy term":>16} {"fuzzy prefix":>16}')
+    for query in queries:
+        with app.app_context():
+            distance = args.max_distance if args.max_distance is not None else fuzzy_distance(query)
+        exact = timeit(lambda: trie.search_prefix(query) and trie.get_all_with_prefix(query, 'area'), args.repeat)
+        top = timeit(lambda: trie.top_matches(query, 'area'), args.repeat)
+        term = timeit(lambda: trie.fuzzy_search(query, 'area', max_distance=distance), args.repeat)
+        prefix = timeit(lambda: trie.fuzzy_search(query, 'area', max_distance=distance, prefix=True), args.repeat)
+        print(f'{query:<12} ' + ' '.join(f'{p50:>7.1f} / {p99:>6.1f}' for p50, p99 in (exact, top, term, prefix)))
+        best = trie.fuzzy_search(query, 'area', max_distance=distance, prefix=True)[:3]
+        print(f'{"":<12} max distance {distance}, fuzzy prefix -> {", ".join(f"{name} (d={distance})" for name, distance, _ in best) or "-"}')
+
+if __name__ == '__main__':
+    main()
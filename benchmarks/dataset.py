@@ -0,0 +1,197 @@
+"""Deterministic synthetic dataset for the route benchmarks.
+
+The database is created the way the app creates any database: importing app
+with DATABASE_PATH pointing at a new file applies database_sqlite.sql and
+every migration. build() then bulk-loads users, shops, services,
+appointments (with their services and payments), reviews, notifications and
+days off from a seeded RNG, and fills the derived tables (summary columns,
+rating aggregates, analytics rollups, inbox counters) the same way the app's
+backfills do. The same sizes, seed and today always produce the same rows.
+
+Ids are assigned in order, so callers can rely on the layout: users
+1..shops are shop owners and own shop N = user N; the next user owns no shop
+yet; every later user is a customer.
+"""
+import json
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+from time import perf_counter
+
+# Sizes for --scale; 'full' is the production-sized dataset
+SCALES = {
+    'tiny': {'shops': 20, 'users': 500, 'appointments': 5_000, 'reviews': 1_000},
+    'small': {'shops': 200, 'users': 5_000, 'appointments': 50_000, 'reviews': 12_500},
+    'medium': {'shops': 2_000, 'users': 20_000, 'appointments': 400_000, 'reviews': 100_000},
+    'full': {'shops': 10_000, 'users': 100_000, 'appointments': 2_000_000, 'reviews': 500_000},
+}
+
+PASSWORD = 'bench-password'
+CHUNK = 10_000
+
+AREAS = ['Satellite', 'Navrangpura', 'Bopal', 'Sola', 'Maninagar', 'Vastrapur', 'Chandkheda', 'Thaltej',
+         'Prahlad Nagar', 'Bodakdev', 'Paldi', 'Naranpura', 'Gota', 'Ghatlodia', 'Vejalpur', 'Nikol',
+         'Naroda', 'Ambawadi', 'Ellisbridge', 'Ashram Road', 'Shahibaug', 'Memnagar', 'Motera', 'Isanpur']
+SHOP_WORDS = ['Sharp', 'Royal', 'Classic', 'Urban', 'Gentle', 'Fresh', 'Elite', 'Style', 'Fade', 'Crown',
+              'Blade', 'Studio', 'Groom', 'Mane', 'Edge', 'Craft']
+SHOP_KINDS = ['Cuts', 'Salon', 'Barbers', 'Lounge', 'Studio', 'Parlour', 'Hair Co.', 'Grooming']
+SERVICES = [('Haircut', 200, 30), ('Beard Trim', 100, 15), ('Shave', 120, 20), ('Hair Spa', 600, 45),
+            ('Facial', 500, 40), ('Hair Colour', 800, 60), ('Head Massage', 150, 20), ('Kids Haircut', 150, 20),
+            ('Keratin', 2500, 90), ('Skin Fade', 300, 40), ('Threading', 60, 10), ('Manicure', 400, 30)]
+COMMENTS = ['Great cut, will come back.', 'Friendly staff and on time.', 'A bit of a wait but worth it.',
+            'Best beard trim in the area.', 'Clean place, fair prices.', 'Not what I asked for.']
+SLOTS = [f'{hour:02d}:{minute:02d}' for hour in range(9, 20) for minute in (0, 30)]
+
+def resolve_sizes(scale='small', **overrides):
+    sizes = dict(SCALES[scale])
+    sizes.update({key: value for key, value in overrides.items() if value is not None})
+    if sizes['users'] <= sizes['shops'] + 1:
+        raise ValueError('users must exceed shops + 1 so there are customers to book')
+    sizes.setdefault('notifications', sizes['appointments'] // 4)
+    return sizes
+
+def is_built(path, sizes, seed):
+    """Whether path already holds exactly this dataset (recorded in a .json sidecar)"""
+    try:
+        with open(path + '.json', encoding='utf-8') as f:
+            return json.load(f) == {'sizes': sizes, 'seed': seed} and os.path.exists(path)
+    except (OSError, ValueError):
+        return False
+
+def chunks(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def insert(conn, sql, rows):
+    for batch in chunks(rows):
+        conn.executemany(sql, batch)
+
+def build(path, sizes, seed, password_hash, today=None, log=print):
+    """Loads the dataset into the (already migrated, still empty) database at path"""
+    rng = random.Random(seed)
+    today = today or date.today()
+    started = perf_counter()
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA foreign_keys = OFF')
+    if conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]:
+        raise RuntimeError(f'{path} already has users; build() needs a freshly migrated database')
+
+    shops, users = sizes['shops'], sizes['users']
+    customers = range(shops + 2, users + 1)
+
+    def user_rows():
+        for user_id in range(1, users + 1):
+            role = 'shop_owner' if user_id <= shops + 1 else 'customer'
+            yield (user_id, f'User {user_id}', f'user{user_id}@bench.test', password_hash, role,
+                   f'9{user_id:09d}'[-10:], rng.choice(['Male', 'Female', 'Other']), rng.choice(AREAS))
+    insert(conn, 'INSERT INTO users (id, name, email, password, role, phone_number, gender, area) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', user_rows())
+
+    shop_services = {}
+    def shop_rows():
+        for shop_id in range(1, shops + 1):
+            name = f'{rng.choice(SHOP_WORDS)} {rng.choice(SHOP_KINDS)} {shop_id}'
+            yield (shop_id, shop_id, name, rng.choice(AREAS), f'{rng.randint(1, 400)} Main Road',
+                   f'{name} offers haircuts, beard trims and grooming.', f'9{shop_id:09d}'[-10:])
+    insert(conn, 'INSERT INTO shops (id, owner_id, name, area, address, description, contact_number) VALUES (?, ?, ?, ?, ?, ?, ?)', shop_rows())
+
+    def service_rows():
+        service_id = 0
+        for shop_id in range(1, shops + 1):
+            shop_services[shop_id] = []
+            for name, price, duration in rng.sample(SERVICES, rng.randint(3, 8)):
+                service_id += 1
+                shop_services[shop_id].append((service_id, name, price, duration))
+                yield (service_id, shop_id, name, f'{name} by our senior stylists.', price, duration)
+    insert(conn, 'INSERT INTO services (id, shop_id, name, description, price, duration_minutes) VALUES (?, ?, ?, ?, ?, ?)', service_rows())
+    conn.commit()
+    log(f'  users, shops, services      {perf_counter() - started:6.1f}s')
+
+    # Appointments run from two years back to a month ahead; past ones are mostly completed
+    first_day = today - timedelta(days=730)
+    span = 760
+    appointment_services, payments = [], []
+    def appointment_rows():
+        link_id = payment_id = 0
+        for appointment_id in range(1, sizes['appointments'] + 1):
+            shop_id = rng.randint(1, shops)
+            day = first_day + timedelta(days=rng.randrange(span))
+            chosen = rng.sample(shop_services[shop_id], rng.randint(1, min(3, len(shop_services[shop_id]))))
+            price = sum(service[2] for service in chosen)
+            duration = sum(service[3] for service in chosen)
+            if day < today:
+                status = rng.choices(['completed', 'cancelled', 'confirmed'], [80, 12, 8])[0]
+            else:
+                status = rng.choices(['confirmed', 'pending', 'cancelled'], [70, 20, 10])[0]
+            paid = 0
+            if status != 'pending':
+                paid = price if rng.random() < 0.6 else price / 2
+            payment_status = 'unpaid' if not paid else ('paid' if paid >= price else 'partially_paid')
+            for service in chosen:
+                link_id += 1
+                appointment_services.append((link_id, appointment_id, service[0]))
+            if paid:
+                payment_id += 1
+                payments.append((payment_id, appointment_id, paid, f'{day.isoformat()} 08:00:00'))
+            yield (appointment_id, rng.choice(customers), shop_id, day.isoformat(), rng.choice(SLOTS), duration, price,
+                   status, payment_status, f'{(day - timedelta(days=rng.randint(0, 14))).isoformat()} 12:00:00',
+                   ', '.join(service[1] for service in chosen), len(chosen), paid)
+            if len(appointment_services) >= CHUNK:
+                conn.executemany('INSERT INTO appointment_services (id, appointment_id, service_id) VALUES (?, ?, ?)', appointment_services)
+                conn.executemany('INSERT INTO payments (id, appointment_id, amount, transaction_date) VALUES (?, ?, ?, ?)', payments)
+                appointment_services.clear()
+                payments.clear()
+    insert(conn, '''INSERT INTO appointments (id, user_id, shop_id, appointment_date, appointment_time, total_duration, total_price,
+                                              status, payment_status, created_at, services_list, service_count, amount_paid)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', appointment_rows())
+    conn.executemany('INSERT INTO appointment_services (id, appointment_id, service_id) VALUES (?, ?, ?)', appointment_services)
+    conn.executemany('INSERT INTO payments (id, appointment_id, amount, transaction_date) VALUES (?, ?, ?, ?)', payments)
+    conn.commit()
+    log(f'  appointments                {perf_counter() - started:6.1f}s')
+
+    def review_rows():
+        for review_id in range(1, sizes['reviews'] + 1):
+            day = first_day + timedelta(days=rng.randrange(730))
+            yield (review_id, rng.choice(customers), rng.randint(1, shops), rng.choices([5, 4, 3, 2, 1], [45, 30, 12, 7, 6])[0],
+                   rng.choice(COMMENTS), f'{day.isoformat()} {rng.randint(9, 21):02d}:{rng.randint(0, 59):02d}:00')
+    insert(conn, 'INSERT INTO reviews (id, user_id, shop_id, rating, comment, created_at) VALUES (?, ?, ?, ?, ?, ?)', review_rows())
+
+    def notification_rows():
+        for notification_id in range(1, sizes['notifications'] + 1):
+            appointment_id = rng.randint(1, sizes['appointments'])
+            yield (notification_id, rng.choice(customers), appointment_id, 'Booking Confirmed',
+                   f'Your appointment #{appointment_id} is confirmed.')
+    insert(conn, 'INSERT INTO notifications (id, user_id, appointment_id, title, message) VALUES (?, ?, ?, ?, ?)', notification_rows())
+
+    def dayoff_rows():
+        for shop_id in range(1, shops + 1):
+            for offset in sorted(rng.sample(range(1, 60), 2)):
+                yield (shop_id, (today + timedelta(days=offset)).isoformat(), 'Staff holiday')
+    insert(conn, 'INSERT INTO shop_dayoffs (shop_id, off_date, reason) VALUES (?, ?, ?)', dayoff_rows())
+    conn.commit()
+    log(f'  reviews, notifications      {perf_counter() - started:6.1f}s')
+
+    # Derived tables, as the migrations' backfills would leave them
+    import app as appmod
+    appmod.backfill_rating_stats(conn)
+    appmod.backfill_shop_analytics(conn)
+    conn.execute('DELETE FROM user_inbox_state')
+    conn.execute('''
+        INSERT INTO user_inbox_state (user_id, unread_count, last_read_notification_id)
+        SELECT user_id, SUM(id > :watermark), COALESCE(MAX(CASE WHEN id <= :watermark THEN id END), 0)
+        FROM notifications GROUP BY user_id
+    ''', {'watermark': sizes['notifications'] // 2})
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    log(f'  derived tables, ANALYZE     {perf_counter() - started:6.1f}s')
+
+    with open(path + '.json', 'w', encoding='utf-8') as f:
+        json.dump({'sizes': sizes, 'seed': seed}, f)
@@ -0,0 +1,175 @@
+"""One scenario per route in app.py, for the benchmark suite.
+
+A Scenario names the endpoint it exercises, who makes the request (None for
+anonymous, 'customer', 'owner', or 'new_owner' for the owner without a shop)
+and how to build the request for iteration i. url and data may be plain
+values or callables taking (ctx, i); setup(ctx, client, i), when given, runs
+untimed before each request with the scenario's client, and its return
+value is passed on as ctx.prepared.
+Writes use a fresh day, email or date per iteration so every request takes
+its real path instead of bailing out on a duplicate.
+"""
+import io
+from datetime import date, timedelta
+
+class Scenario:
+    def __init__(self, name, endpoint, url, role=None, method='GET', data=None, setup=None, max_repeat=None):
+        self.name = name
+        self.endpoint = endpoint
+        self.url = url
+        self.role = role
+        self.method = method
+        self.data = data
+        self.setup = setup
+        self.max_repeat = max_repeat
+
+    def build(self, ctx, i):
+        url = self.url(ctx, i) if callable(self.url) else self.url
+        data = self.data(ctx, i) if callable(self.data) else self.data
+        return url, data
+
+class Context:
+    """Ids the scenarios work with, read from the seeded database"""
+    def __init__(self, conn, sizes, password):
+        self.conn = conn
+        self.password = password
+        self.owner_id = 1
+        self.shop_id = 1
+        self.new_owner_id = sizes['shops'] + 1
+        # The busiest customer, so dashboard and inbox pages are full
+        self.customer_id = conn.execute('''
+            SELECT user_id FROM appointments GROUP BY user_id ORDER BY COUNT(*) DESC, user_id LIMIT 1
+        ''').fetchone()[0]
+        self.services = [row[0] for row in conn.execute('SELECT id FROM services WHERE shop_id = ? ORDER BY id', (self.shop_id,))]
+        self.today = date.today()
+        self.prepared = None
+        # Filled in by the suite once the app is imported
+        self.clients = {}
+        self.asset_url = None
+        self.shop_cursor = None
+
+    def email(self, user_id):
+        return self.conn.execute('SELECT email FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+
+    def future(self, offset):
+        """A day past anything the dataset booked, distinct per offset"""
+        return (self.today + timedelta(days=400 + offset)).isoformat()
+
+    def book(self, client, offset, service_count=1):
+        """Books shop 1 for the customer through the app; returns (appointment id, total price)"""
+        services = self.services[:service_count]
+        client.post('/process_booking', data={'shop_id': self.shop_id, 'service_ids': services,
+                                              'date': self.future(offset), 'time': '10:00'})
+        return self.conn.execute('SELECT id, total_price FROM appointments WHERE user_id = ? ORDER BY id DESC LIMIT 1',
+                                 (self.customer_id,)).fetchone()
+
+    def paid_booking(self, client, offset, plan):
+        appointment_id, price = self.book(client, offset)
+        client.post(f'/payment/{appointment_id}/{float(price)}', data=payment_form(price, plan))
+        return appointment_id, price
+
+def owner_service(ctx, client, i):
+    client.post('/owner/add_service', data={'name': f'Bench Service {i}', 'price': '100', 'duration': '30', 'description': ''})
+    return ctx.conn.execute('SELECT MAX(id) FROM services WHERE shop_id = ?', (ctx.shop_id,)).fetchone()[0]
+
+def owner_dayoff(ctx, client, i):
+    day = ctx.future(3000 + i)
+    client.post('/owner/add_dayoff', data={'off_date': day, 'reason': 'Bench'})
+    return ctx.conn.execute('SELECT id FROM shop_dayoffs WHERE shop_id = ? AND off_date = ?', (ctx.shop_id, day)).fetchone()[0]
+
+def payment_form(price, plan):
+    return {'payment_plan': plan, 'payment_method': 'Card', 'amount': price / 2 if plan == 'half' else price}
+
+def shop_form(name):
+    return {'name': name, 'area': 'Satellite', 'address': '1 Bench Road', 'description': 'Benchmark shop', 'contact': '9999999999'}
+
+def import_form(i, rows=500):
+    lines = ['name,area,address,contact'] + [f'Import Shop {i}-{n},Bopal,{n} Import Road,9999999999' for n in range(rows)]
+    return {'kind': 'shops', 'file': (io.BytesIO('\n'.join(lines).encode()), 'shops.csv')}
+
+def service_form(i):
+    return {'name': f'Haircut {i % 2}', 'price': '200', 'duration': '30', 'description': 'Edited by the benchmark'}
+
+SCENARIOS = [
+    # Public pages
+    Scenario('GET /', 'index', '/'),
+    Scenario('GET /shops', 'list_shops', '/shops'),
+    Scenario('GET /shops?area=', 'list_shops', '/shops?area=Sate'),
+    Scenario('GET /shops?q=', 'list_shops', '/shops?q=beard+trim'),
+    Scenario('GET /shops json cursor', 'list_shops', lambda ctx, i: f'/shops?format=json&cursor={ctx.shop_cursor}'),
+    Scenario('GET /shop/<id>', 'shop_details', lambda ctx, i: f'/shop/{ctx.shop_id}'),
+    Scenario('GET /shop/<id> json', 'shop_details', lambda ctx, i: f'/shop/{ctx.shop_id}?format=json'),
+    Scenario('GET /api/search', 'api_search', '/api/search?q=hair'),
+    Scenario('GET /api/autocomplete', 'api_autocomplete', '/api/autocomplete?q=sa'),
+    Scenario('GET /api/availability', 'api_availability',
+             lambda ctx, i: f'/api/availability?shop_id={ctx.shop_id}&service_ids={ctx.services[0]}&days=14'),
+    Scenario('GET /assets/<file>', 'asset', lambda ctx, i: ctx.asset_url),
+    Scenario('GET /login', 'login', '/login'),
+    Scenario('POST /login', 'login', '/login', method='POST', max_repeat=10,
+             data=lambda ctx, i: {'email': ctx.email(ctx.customer_id), 'password': ctx.password}),
+    Scenario('GET /register', 'register', '/register'),
+    Scenario('POST /register', 'register', '/register', method='POST', max_repeat=10,
+             data=lambda ctx, i: {'name': 'Bench', 'email': f'register{i}@bench.test', 'password': 'bench-password',
+                                  'phone_number': '9999999999', 'role': 'customer'}),
+    Scenario('GET /logout', 'logout', '/logout'),
+
+    # Customer
+    Scenario('GET /dashboard', 'customer_dashboard', '/dashboard', role='customer'),
+    Scenario('GET /inbox', 'inbox', '/inbox', role='customer'),
+    Scenario('GET /profile', 'profile', '/profile', role='customer'),
+    Scenario('POST /profile', 'profile', '/profile', role='customer', method='POST',
+             data=lambda ctx, i: {'name': f'Bench Customer {i % 2}', 'phone': '9999999999', 'gender': 'Other', 'area': 'Bopal'}),
+    Scenario('GET /book', 'book_confirm', lambda ctx, i: f'/book?shop_id={ctx.shop_id}&service_ids={ctx.services[0]}', role='customer'),
+    Scenario('POST /process_booking', 'process_booking', '/process_booking', role='customer', method='POST',
+             data=lambda ctx, i: {'shop_id': ctx.shop_id, 'service_ids': ctx.services[:2], 'date': ctx.future(i), 'time': '11:00'}),
+    Scenario('GET /payment', 'payment', role='customer',
+             setup=lambda ctx, client, i: ctx.book(client, 1000 + i),
+             url=lambda ctx, i: f'/payment/{ctx.prepared[0]}/{float(ctx.prepared[1])}'),
+    Scenario('POST /payment', 'payment', role='customer', method='POST',
+             setup=lambda ctx, client, i: ctx.book(client, 1500 + i),
+             url=lambda ctx, i: f'/payment/{ctx.prepared[0]}/{float(ctx.prepared[1])}',
+             data=lambda ctx, i: payment_form(ctx.prepared[1], 'half')),
+    Scenario('GET /pay_remaining', 'pay_remaining', role='customer',
+             setup=lambda ctx, client, i: ctx.paid_booking(client, 2000 + i, 'half'),
+             url=lambda ctx, i: f'/pay_remaining/{ctx.prepared[0]}'),
+    Scenario('POST /cancel_appointment', 'cancel_appointment', role='customer', method='POST',
+             setup=lambda ctx, client, i: ctx.paid_booking(client, 2500 + i, 'full'),
+             url=lambda ctx, i: f'/cancel_appointment/{ctx.prepared[0]}'),
+    Scenario('POST /add_review', 'add_review', '/add_review', role='customer', method='POST',
+             data=lambda ctx, i: {'shop_id': ctx.shop_id, 'rating': str(1 + i % 5), 'comment': 'Benchmark review'}),
+
+    # Owner
+    Scenario('GET /owner/dashboard', 'owner_dashboard', '/owner/dashboard', role='owner'),
+    Scenario('POST /owner/switch_shop', 'switch_shop', '/owner/switch_shop', role='owner', method='POST',
+             data=lambda ctx, i: {'shop_id': ctx.shop_id}),
+    Scenario('GET /owner/analytics', 'owner_analytics', '/owner/analytics', role='owner'),
+    Scenario('GET /owner/export csv', 'owner_export', '/owner/export/appointments.csv', role='owner', max_repeat=10),
+    Scenario('GET /owner/export ndjson', 'owner_export', '/owner/export/payments.ndjson', role='owner', max_repeat=10),
+    Scenario('GET /owner/dayoffs', 'manage_dayoffs', '/owner/dayoffs', role='owner'),
+    Scenario('POST /owner/add_dayoff', 'add_dayoff', '/owner/add_dayoff', role='owner', method='POST',
+             data=lambda ctx, i: {'off_date': ctx.future(3500 + i), 'reason': 'Bench'}),
+    Scenario('POST /owner/delete_dayoff', 'delete_dayoff', role='owner', method='POST',
+             setup=lambda ctx, client, i: owner_dayoff(ctx, client, i),
+             url=lambda ctx, i: f'/owner/delete_dayoff/{ctx.prepared}'),
+    Scenario('GET /owner/edit_shop', 'edit_shop', '/owner/edit_shop', role='owner'),
+    Scenario('POST /owner/edit_shop', 'edit_shop', '/owner/edit_shop', role='owner', method='POST',
+             data=lambda ctx, i: shop_form(f'Bench Cuts {i % 2}')),
+    Scenario('GET /owner/add_service', 'add_service', '/owner/add_service', role='owner'),
+    Scenario('POST /owner/add_service', 'add_service', '/owner/add_service', role='owner', method='POST',
+             data=lambda ctx, i: {'name': f'Added Service {i}', 'price': '150', 'duration': '20', 'description': ''}),
+    Scenario('GET /owner/edit_service', 'edit_service', lambda ctx, i: f'/owner/edit_service/{ctx.services[0]}', role='owner'),
+    Scenario('POST /owner/edit_service', 'edit_service', lambda ctx, i: f'/owner/edit_service/{ctx.services[0]}', role='owner',
+             method='POST', data=lambda ctx, i: service_form(i)),
+    Scenario('POST /owner/delete_service', 'delete_service', role='owner', method='POST',
+             setup=lambda ctx, client, i: owner_service(ctx, client, i),
+             url=lambda ctx, i: f'/owner/delete_service/{ctx.prepared}'),
+    Scenario('POST /complete_appointment', 'complete_appointment', role='owner', method='POST',
+             setup=lambda ctx, client, i: ctx.paid_booking(ctx.clients['customer'], 4000 + i, 'full'),
+             url=lambda ctx, i: f'/complete_appointment/{ctx.prepared[0]}'),
+    Scenario('GET /owner/add_shop', 'add_shop', '/owner/add_shop', role='new_owner'),
+    Scenario('POST /owner/add_shop', 'add_shop', '/owner/add_shop', role='new_owner', method='POST', max_repeat=10,
+             data=lambda ctx, i: shop_form(f'New Bench Shop {i}')),
+    Scenario('GET /owner/import', 'owner_import', '/owner/import', role='new_owner'),
+    Scenario('POST /owner/import 500 shops', 'owner_import', '/owner/import?format=json', role='new_owner', method='POST',
+             max_repeat=10, data=lambda ctx, i: import_form(i)),
+]
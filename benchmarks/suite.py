@@ -0,0 +1,290 @@
+"""Route-level benchmark suite: latency, SQL statements per request and peak RSS.
+
+    python -m benchmarks.suite run [--scale small] [--repeat 30] [--output results.json] [--baseline old.json]
+    python -m benchmarks.suite compare old.json new.json [--threshold 0.25]
+
+run seeds (or reuses) the synthetic dataset from benchmarks.dataset, copies
+it to a scratch database, imports app against that copy and sends every
+scenario in benchmarks.routes through the Flask test client. For each it
+reports p50/p95/p99 latency in milliseconds, the median number of SQL
+statements the request thread ran (counted with sqlite3's trace callback,
+so BEGIN/COMMIT and the statements FTS5 runs on its own tables count too)
+and the process's peak RSS once it finished.
+Endpoints with no scenario are listed so new routes do not go unmeasured.
+
+compare (or run --baseline) flags a route when its p95 grew by more than
+--threshold and by at least --min-ms, when it runs more SQL statements, or
+when peak RSS grew past --threshold, and exits 1 if anything regressed.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import dataset  # noqa: E402
+from benchmarks.routes import SCENARIOS, Context  # noqa: E402
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def copy_database(source, target):
+    """Consistent copy through SQLite's backup API (WAL contents included)"""
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+class StatementCounter:
+    """Counts SQL statements per thread on every pooled connection the app hands out"""
+    def __init__(self, db):
+        self._local = threading.local()
+        acquire = db.acquire
+
+        def traced_acquire():
+            conn = acquire()
+            conn.set_trace_callback(self._count)
+            return conn
+        db.acquire = traced_acquire
+
+    def _count(self, statement):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+def prepare_database(args, sizes, log):
+    """Path of a scratch copy of the dataset, building the dataset first if needed"""
+    pristine = args.db or os.path.join(tempfile.gettempdir(), f'bookmycut-bench-{args.scale}-{args.seed}.db')
+    workdir = tempfile.mkdtemp(prefix='bookmycut-bench-')
+    scratch = os.path.join(workdir, 'bench.db')
+    os.environ['DATABASE_PATH'] = scratch
+    os.environ.setdefault('ASSETS_FOLDER', os.path.join(workdir, 'dist'))
+    os.environ.setdefault('UPLOAD_FOLDER', os.path.join(workdir, 'uploads'))
+    os.environ.setdefault('SHOP_UPLOAD_FOLDER', os.path.join(workdir, 'shop_uploads'))
+    if args.no_page_cache:
+        os.environ['PAGE_CACHE_SIZE'] = '0'
+    built = dataset.is_built(pristine, sizes, args.seed) and not args.rebuild
+    if built:
+        log(f'Reusing dataset {pristine}')
+        copy_database(pristine, scratch)
+
+    import app as appmod  # migrates the scratch database (a no-op on a copy of a built one)
+
+    if not built:
+        log(f'Building dataset {sizes} (seed {args.seed})')
+        password_hash = appmod.generate_password_hash(dataset.PASSWORD, appmod.password_hasher.method)
+        dataset.build(scratch, sizes, args.seed, password_hash, log=log)
+        if os.path.exists(pristine):
+            os.remove(pristine)
+        copy_database(scratch, pristine)
+        os.replace(scratch + '.json', pristine + '.json')
+        appmod.rebuild_search_index()
+    return appmod, scratch
+
+def client_for(app, role, ctx):
+    client = app.test_client()
+    user_id = {'customer': ctx.customer_id, 'owner': ctx.owner_id, 'new_owner': ctx.new_owner_id}.get(role)
+    if user_id:
+        with client.session_transaction() as session:
+            session.update({'loggedin': True, 'id': user_id, 'email': ctx.email(user_id),
+                            'role': 'customer' if role == 'customer' else 'shop_owner', 'name': 'Bench'})
+    return client
+
+def run_scenario(app, scenario, ctx, counter, repeat, warmup):
+    client = ctx.clients.get(scenario.role)
+    timings, statements, statuses = [], [], {}
+    iterations = min(repeat, scenario.max_repeat or repeat)
+    for i in range(warmup + iterations):
+        if scenario.role is None:
+            # Anonymous requests start with an empty cookie jar, as a new visitor would
+            client = app.test_client()
+        if scenario.setup:
+            ctx.prepared = scenario.setup(ctx, client, i)
+        url, data = scenario.build(ctx, i)
+        counter.reset()
+        started = perf_counter()
+        response = client.open(url, method=scenario.method, data=data)
+        body = response.get_data()  # drains streamed exports too
+        elapsed = (perf_counter() - started) * 1000
+        response.close()
+        if i < warmup:
+            continue
+        timings.append(elapsed)
+        statements.append(counter.count)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+    return {
+        'endpoint': scenario.endpoint,
+        'requests': len(timings),
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'statements': statistics.median(statements),
+        'bytes': len(body),
+        'statuses': statuses,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def run(args):
+    log = print if not args.quiet else (lambda *a, **k: None)
+    sizes = dataset.resolve_sizes(args.scale, shops=args.shops, users=args.users,
+                                  appointments=args.appointments, reviews=args.reviews)
+    started = perf_counter()
+    appmod, scratch = prepare_database(args, sizes, log)
+    app = appmod.app
+    log(f'Dataset ready in {perf_counter() - started:.1f}s; peak RSS {peak_rss_mb()} MB')
+
+    conn = sqlite3.connect(scratch)
+    ctx = Context(conn, sizes, dataset.PASSWORD)
+    with app.test_request_context():
+        ctx.asset_url = appmod.static_url('css/style.css')
+    ctx.shop_cursor = appmod.encode_cursor([sizes['shops'] // 2])
+    ctx.clients = {role: client_for(app, role, ctx) for role in ('customer', 'owner', 'new_owner')}
+    counter = StatementCounter(appmod.db)
+
+    selected = [s for s in SCENARIOS if not args.only or any(part in s.name for part in args.only)]
+    results = {}
+    log(f'{"route":<32} {"p50":>8} {"p95":>8} {"p99":>8} {"stmts":>6} {"RSS MB":>7}  statuses')
+    for scenario in selected:
+        result = run_scenario(app, scenario, ctx, counter, args.repeat, args.warmup)
+        results[scenario.name] = result
+        log(f'{scenario.name:<32} {result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} {result["p99_ms"]:>8.2f} '
+            f'{result["statements"]:>6g} {result["peak_rss_mb"]:>7.1f}  {result["statuses"]}')
+    appmod.outbox.flush(5)
+    conn.close()
+    shutil.rmtree(os.path.dirname(scratch), ignore_errors=True)
+
+    covered = {scenario.endpoint for scenario in SCENARIOS}
+    missing = sorted(rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint not in covered | {'static'})
+    if missing:
+        log(f'No scenario for: {", ".join(missing)}')
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'scale': args.scale,
+            'sizes': sizes,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'page_cache': not args.no_page_cache,
+            'peak_rss_mb': peak_rss_mb(),
+            'uncovered_endpoints': missing,
+        },
+        'routes': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        log(f'Wrote {args.output}')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            return report_regressions(json.load(f), report, args.threshold, args.min_ms)
+    return 0
+
+def find_regressions(baseline, current, threshold, min_ms):
+    """(route, what, before, after) for every route that got worse"""
+    regressions = []
+    for name, now in current['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            continue
+        if now['p95_ms'] > before['p95_ms'] * (1 + threshold) and now['p95_ms'] - before['p95_ms'] >= min_ms:
+            regressions.append((name, 'p95_ms', before['p95_ms'], now['p95_ms']))
+        if now['statements'] > before['statements']:
+            regressions.append((name, 'statements', before['statements'], now['statements']))
+    rss_before, rss_now = baseline['meta']['peak_rss_mb'], current['meta']['peak_rss_mb']
+    if rss_now > rss_before * (1 + threshold):
+        regressions.append(('(process)', 'peak_rss_mb', rss_before, rss_now))
+    return regressions
+
+def report_regressions(baseline, current, threshold, min_ms):
+    if baseline['meta'].get('sizes') != current['meta'].get('sizes'):
+        print('Warning: the two runs used different dataset sizes')
+    print(f'{"route":<32} {"p95 before":>11} {"p95 after":>10} {"change":>8}')
+    for name, now in current['routes'].items():
+        before = baseline['routes'].get(name)
+        if before:
+            change = (now['p95_ms'] / before['p95_ms'] - 1) * 100 if before['p95_ms'] else 0.0
+            print(f'{name:<32} {before["p95_ms"]:>11.2f} {now["p95_ms"]:>10.2f} {change:>+7.1f}%')
+    regressions = find_regressions(baseline, current, threshold, min_ms)
+    for name, what, before, after in regressions:
+        print(f'REGRESSION {name}: {what} {before} -> {after}')
+    if not regressions:
+        print(f'No regressions (threshold {threshold:.0%}, at least {min_ms} ms).')
+    return 1 if regressions else 0
+
+def compare(args):
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    return report_regressions(baseline, current, args.threshold, args.min_ms)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='seed the dataset and time every route')
+    run_parser.add_argument('--scale', choices=sorted(dataset.SCALES), default='small')
+    for size in ('shops', 'users', 'appointments', 'reviews'):
+        run_parser.add_argument(f'--{size}', type=int, help=f'override the scale\'s number of {size}')
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--db', help='where the pristine dataset is kept between runs (default: temp dir)')
+    run_parser.add_argument('--rebuild', action='store_true', help='regenerate the dataset even if it exists')
+    run_parser.add_argument('--repeat', type=int, default=30, help='timed requests per scenario')
+    run_parser.add_argument('--warmup', type=int, default=2, help='untimed requests per scenario first')
+    run_parser.add_argument('--no-page-cache', action='store_true', help='render public pages on every request')
+    run_parser.add_argument('--only', nargs='*', help='run scenarios whose name contains any of these')
+    run_parser.add_argument('--output', help='write results as JSON')
+    run_parser.add_argument('--baseline', help='compare against this earlier JSON result')
+    run_parser.add_argument('--quiet', action='store_true')
+
+    compare_parser = commands.add_parser('compare', help='flag regressions between two JSON results')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+
+    for sub in (run_parser, compare_parser):
+        sub.add_argument('--threshold', type=float, default=0.25, help='relative p95/RSS growth that counts (default 0.25)')
+        sub.add_argument('--min-ms', type=float, default=1.0, help='ignore p95 growth smaller than this many ms')
+
+    args = parser.parse_args(argv)
+    return run(args) if args.command == 'run' else compare(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
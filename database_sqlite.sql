@@ -112,3 +112,46 @@ CREATE TABLE IF NOT EXISTS shop_dayoffs (
     FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE,
     UNIQUE(shop_id, off_date)
 );
+
+-- Shop Day Occupancy (minute-resolution bitmap of booked time per shop and date)
+CREATE TABLE IF NOT EXISTS shop_day_occupancy (
+    shop_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    mask BLOB NOT NULL,
+    PRIMARY KEY (shop_id, day),
+    FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE
+);
+
+-- Shop Rating Stats (per-shop review aggregates, maintained on every new review)
+CREATE TABLE IF NOT EXISTS shop_rating_stats (
+    shop_id INTEGER PRIMARY KEY,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    avg_rating REAL,
+    stars_1 INTEGER NOT NULL DEFAULT 0,
+    stars_2 INTEGER NOT NULL DEFAULT 0,
+    stars_3 INTEGER NOT NULL DEFAULT 0,
+    stars_4 INTEGER NOT NULL DEFAULT 0,
+    stars_5 INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE
+);
+
+-- Site Stats (single cached row of homepage statistics)
+CREATE TABLE IF NOT EXISTS site_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    active_shops INTEGER NOT NULL DEFAULT 0,
+    monthly_bookings INTEGER NOT NULL DEFAULT 0,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    total_appointments INTEGER NOT NULL DEFAULT 0,
+    reliable_appointments INTEGER NOT NULL DEFAULT 0,
+    computed_at REAL NOT NULL DEFAULT 0,
+    refresh_lease_until REAL NOT NULL DEFAULT 0
+);
+
+-- User Inbox State (per-user unread notification counter)
+CREATE TABLE IF NOT EXISTS user_inbox_state (
+    user_id INTEGER PRIMARY KEY,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
@@ -0,0 +1,14 @@
+-- Seed the aggregate tables from the rows they summarise.
+-- Safe to re-run: both tables are rebuilt from scratch.
+
+DELETE FROM shop_rating_stats;
+INSERT INTO shop_rating_stats (shop_id, review_count, rating_sum, avg_rating, stars_1, stars_2, stars_3, stars_4, stars_5)
+SELECT shop_id, COUNT(*), SUM(rating), AVG(rating),
+       SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+FROM reviews
+WHERE rating IS NOT NULL
+GROUP BY shop_id;
+
+DELETE FROM user_inbox_state;
+INSERT INTO user_inbox_state (user_id, unread_count)
+SELECT user_id, COUNT(*) FROM notifications WHERE is_read = FALSE GROUP BY user_id;
@@ -0,0 +1,26 @@
+-- Secondary indexes for the queries every page view runs.
+-- Keep in sync with HOT_QUERIES in app.py, which checks they are used.
+
+-- Day view of a shop: slot generation, occupancy rebuilds, availability API
+CREATE INDEX IF NOT EXISTS idx_appointments_shop_date_status ON appointments (shop_id, appointment_date, status);
+
+-- Customer dashboard
+CREATE INDEX IF NOT EXISTS idx_appointments_user_date ON appointments (user_id, appointment_date);
+
+-- Dashboard joins from an appointment to its services
+CREATE INDEX IF NOT EXISTS idx_appointment_services_appointment ON appointment_services (appointment_id);
+
+-- Unread badge and inbox
+CREATE INDEX IF NOT EXISTS idx_notifications_user_read ON notifications (user_id, is_read);
+
+-- Shop page and owner dashboard reviews, newest first
+CREATE INDEX IF NOT EXISTS idx_reviews_shop_created ON reviews (shop_id, created_at);
+
+-- Service menus
+CREATE INDEX IF NOT EXISTS idx_services_shop ON services (shop_id);
+
+-- Owner's shop lookup
+CREATE INDEX IF NOT EXISTS idx_shops_owner ON shops (owner_id);
+
+-- Area search on /shops
+CREATE INDEX IF NOT EXISTS idx_shops_area ON shops (area);
@@ -0,0 +1,6 @@
+-- Version counters for per-worker caches. Writers bump a row in the same
+-- transaction as their change; workers compare it with the version they built.
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
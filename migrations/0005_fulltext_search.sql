@@ -0,0 +1,48 @@
+-- Full-text search over shops and services (FTS5, external content).
+-- Triggers keep the indexes in step with their tables.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS shops_fts USING fts5(
+    name, area, address, description,
+    content='shops', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS services_fts USING fts5(
+    name, description,
+    content='services', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS shops_fts_insert AFTER INSERT ON shops BEGIN
+    INSERT INTO shops_fts (rowid, name, area, address, description)
+    VALUES (new.id, new.name, new.area, new.address, new.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS shops_fts_delete AFTER DELETE ON shops BEGIN
+    INSERT INTO shops_fts (shops_fts, rowid, name, area, address, description)
+    VALUES ('delete', old.id, old.name, old.area, old.address, old.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS shops_fts_update AFTER UPDATE OF name, area, address, description ON shops BEGIN
+    INSERT INTO shops_fts (shops_fts, rowid, name, area, address, description)
+    VALUES ('delete', old.id, old.name, old.area, old.address, old.description);
+    INSERT INTO shops_fts (rowid, name, area, address, description)
+    VALUES (new.id, new.name, new.area, new.address, new.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS services_fts_insert AFTER INSERT ON services BEGIN
+    INSERT INTO services_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS services_fts_delete AFTER DELETE ON services BEGIN
+    INSERT INTO services_fts (services_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS services_fts_update AFTER UPDATE OF name, description ON services BEGIN
+    INSERT INTO services_fts (services_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    INSERT INTO services_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+END;
+
+-- Index what is already there
+INSERT INTO shops_fts (shops_fts) VALUES ('rebuild');
+INSERT INTO services_fts (services_fts) VALUES ('rebuild');
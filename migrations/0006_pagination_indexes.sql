@@ -0,0 +1,15 @@
+-- Indexes that serve the keyset-paginated lists newest first, so each page
+-- is a bounded index range scan instead of a sort over the whole history.
+-- Keep in sync with HOT_QUERIES in app.py.
+
+-- Owner dashboard appointments: ORDER BY appointment_date, appointment_time, id.
+-- Also serves the day view, so it supersedes idx_appointments_shop_date_status
+CREATE INDEX IF NOT EXISTS idx_appointments_shop_schedule ON appointments (shop_id, appointment_date, appointment_time);
+DROP INDEX IF EXISTS idx_appointments_shop_date_status;
+
+-- Customer dashboard appointments, same ordering; supersedes idx_appointments_user_date
+CREATE INDEX IF NOT EXISTS idx_appointments_user_schedule ON appointments (user_id, appointment_date, appointment_time);
+DROP INDEX IF EXISTS idx_appointments_user_date;
+
+-- Inbox, newest first by id
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON notifications (user_id, id);
@@ -0,0 +1,25 @@
+-- Read state becomes a per-user watermark: every notification with an id at
+-- or below last_read_notification_id has been seen. notifications.is_read is
+-- no longer written.
+ALTER TABLE user_inbox_state ADD COLUMN last_read_notification_id INTEGER NOT NULL DEFAULT 0;
+
+-- Legacy is_read rows: the watermark sits just below each user's oldest
+-- unread notification (or on their newest one when all are read), so nothing
+-- unread is hidden.
+INSERT INTO user_inbox_state (user_id, unread_count)
+SELECT DISTINCT user_id, 0 FROM notifications WHERE true
+ON CONFLICT(user_id) DO NOTHING;
+
+UPDATE user_inbox_state SET last_read_notification_id = COALESCE(
+    (SELECT MIN(id) - 1 FROM notifications WHERE user_id = user_inbox_state.user_id AND is_read = FALSE),
+    (SELECT MAX(id) FROM notifications WHERE user_id = user_inbox_state.user_id),
+    0
+);
+
+UPDATE user_inbox_state SET unread_count = (
+    SELECT COUNT(*) FROM notifications
+    WHERE user_id = user_inbox_state.user_id AND id > user_inbox_state.last_read_notification_id
+);
+
+-- Unread counts now come from the id range above the watermark
+DROP INDEX IF EXISTS idx_notifications_user_read;
@@ -0,0 +1,17 @@
+-- Per-appointment summaries so the dashboards read appointments alone instead
+-- of joining appointment_services, services and payments over the history.
+-- Kept current by refresh_appointment_summaries() and the payment route.
+ALTER TABLE appointments ADD COLUMN services_list TEXT NOT NULL DEFAULT '';
+ALTER TABLE appointments ADD COLUMN service_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE appointments ADD COLUMN amount_paid DECIMAL(10, 2) NOT NULL DEFAULT 0;
+
+UPDATE appointments SET
+    services_list = COALESCE((SELECT GROUP_CONCAT(name, ', ') FROM (
+        SELECT s.name FROM appointment_services asrv JOIN services s ON s.id = asrv.service_id
+        WHERE asrv.appointment_id = appointments.id ORDER BY asrv.id)), ''),
+    service_count = (SELECT COUNT(*) FROM appointment_services WHERE appointment_id = appointments.id),
+    amount_paid = COALESCE((SELECT SUM(amount) FROM payments WHERE appointment_id = appointments.id), 0);
+
+-- delete_service finds the appointments whose summary it changes (and the
+-- ON DELETE CASCADE looks up the same rows)
+CREATE INDEX IF NOT EXISTS idx_appointment_services_service ON appointment_services (service_id);
@@ -0,0 +1,50 @@
+-- Daily rollups behind /owner/analytics, keyed by the appointment's day so a
+-- report reads only the days it covers. Maintained incrementally by the
+-- booking, payment, cancel and complete paths (see "Owner Analytics" in app.py).
+CREATE TABLE IF NOT EXISTS shop_daily_stats (
+    shop_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    cancellations INTEGER NOT NULL DEFAULT 0,
+    completions INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(10, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (shop_id, day),
+    FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS shop_service_daily_stats (
+    shop_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    service_id INTEGER NOT NULL,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (shop_id, day, service_id),
+    FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS shop_hourly_stats (
+    shop_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    hour INTEGER NOT NULL,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (shop_id, day, hour),
+    FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE
+);
+
+-- One-off backfill from existing history (same as `flask backfill-analytics`)
+INSERT INTO shop_daily_stats (shop_id, day, bookings, cancellations, completions, revenue)
+SELECT a.shop_id, a.appointment_date, COUNT(*), SUM(a.status = 'cancelled'), SUM(a.status = 'completed'),
+       COALESCE(SUM((SELECT SUM(amount) FROM payments p WHERE p.appointment_id = a.id)), 0)
+FROM appointments a
+GROUP BY a.shop_id, a.appointment_date;
+
+INSERT INTO shop_service_daily_stats (shop_id, day, service_id, bookings)
+SELECT a.shop_id, a.appointment_date, asrv.service_id, COUNT(*)
+FROM appointments a JOIN appointment_services asrv ON asrv.appointment_id = a.id
+GROUP BY a.shop_id, a.appointment_date, asrv.service_id;
+
+-- Hour split on the colon like START_HOUR_SQL in app.py: this runs before
+-- 0011 pads legacy times such as '9:30'
+INSERT INTO shop_hourly_stats (shop_id, day, hour, bookings)
+SELECT shop_id, appointment_date, CAST(substr(appointment_time, 1, instr(appointment_time, ':') - 1) AS INTEGER) AS hour, COUNT(*)
+FROM appointments
+GROUP BY shop_id, appointment_date, hour;
@@ -0,0 +1,4 @@
+-- Payments are read by appointment (dashboards, cascades) and by transaction
+-- date (the streaming payments export).
+CREATE INDEX IF NOT EXISTS idx_payments_appointment ON payments (appointment_id);
+CREATE INDEX IF NOT EXISTS idx_payments_transaction_date ON payments (transaction_date);
@@ -0,0 +1,6 @@
+-- Appointment times are HH:MM. Early rows were stored as typed ('9:30'),
+-- which sorts after '10:00' in the schedule indexes and was misread by the
+-- fixed-width start-minute parse. Pad them, then drop the occupancy bitmaps
+-- built from those reads; each day is rebuilt from appointments on first use.
+UPDATE appointments SET appointment_time = '0' || appointment_time WHERE instr(appointment_time, ':') = 2;
+DELETE FROM shop_day_occupancy;
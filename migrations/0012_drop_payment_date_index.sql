@@ -0,0 +1,4 @@
+-- The payments export now walks the shop's appointments and reaches payments
+-- through idx_payments_appointment. Nothing else reads payments by date, so
+-- the transaction_date index only cost writes.
+DROP INDEX IF EXISTS idx_payments_transaction_date;
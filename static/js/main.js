@@ -29,3 +29,42 @@ document.addEventListener('DOMContentLoaded', function () {
     const revealElements = document.querySelectorAll('.reveal');
     revealElements.forEach(el => revealObserver.observe(el));
 });
+
+// "Load more" for keyset-paginated lists: fetch the next page and append its
+// items in place. Without JS the link simply opens the next page.
+document.addEventListener('click', function (event) {
+    const link = event.target.closest('[data-load-more]');
+    if (!link) return;
+    event.preventDefault();
+
+    const target = link.dataset.loadMore;
+    const wrapper = link.closest('[data-load-more-for]');
+    link.classList.add('disabled');
+
+    fetch(link.href)
+        .then(response => {
+            if (!response.ok) throw new Error(response.statusText);
+            return response.text();
+        })
+        .then(html => {
+            const page = new DOMParser().parseFromString(html, 'text/html');
+            const items = page.querySelector(`[data-page-items="${target}"]`);
+            const list = document.querySelector(`[data-page-items="${target}"]`);
+            if (items && list) {
+                Array.from(items.children).forEach(item => {
+                    item.querySelectorAll('.reveal').forEach(el => el.classList.add('active'));
+                    if (item.classList.contains('reveal')) item.classList.add('active');
+                    list.appendChild(item);
+                });
+            }
+            const next = page.querySelector(`[data-load-more-for="${target}"]`);
+            if (next) {
+                wrapper.replaceWith(next);
+            } else {
+                wrapper.remove();
+            }
+        })
+        .catch(() => {
+            window.location.href = link.href;
+        });
+});
@@ -0,0 +1,81 @@
+"""Shared fixtures: the app is imported once, against a scratch database.
+
+app.py reads its configuration from the environment at import time, so the
+environment is set up here before anything imports it.
+"""
+import itertools
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+SCRATCH = tempfile.mkdtemp(prefix='bookmycut-tests-')
+os.environ['DATABASE_PATH'] = os.path.join(SCRATCH, 'test.db')
+os.environ['UPLOAD_FOLDER'] = os.path.join(SCRATCH, 'profile_pics')
+os.environ['SHOP_UPLOAD_FOLDER'] = os.path.join(SCRATCH, 'shop_pics')
+os.environ['ASSETS_FOLDER'] = os.path.join(SCRATCH, 'dist')
+os.environ['TEMPLATE_CACHE_DIR'] = 'off'
+os.environ['TEMPLATE_WARMUP'] = '0'
+os.environ['HASH_POOL_SIZE'] = '0'
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as bookmycut  # noqa: E402
+
+PASSWORD = 'password123'
+_ids = itertools.count(1)
+
+@pytest.fixture(scope='session')
+def app():
+    bookmycut.app.config['TESTING'] = True
+    return bookmycut.app
+
+@pytest.fixture
+def conn():
+    with bookmycut.db.borrow() as connection:
+        yield connection
+
+@pytest.fixture
+def make_user(conn):
+    password_hash = bookmycut.generate_password_hash(PASSWORD, 'pbkdf2:sha256:1000')
+    def make(role='customer'):
+        n = next(_ids)
+        cursor = conn.execute('INSERT INTO users (name, email, password, role, phone_number) VALUES (?, ?, ?, ?, ?)',
+                              (f'User {n}', f'user{n}@test.local', password_hash, role, '9999999999'))
+        conn.commit()
+        return cursor.lastrowid
+    return make
+
+@pytest.fixture
+def make_shop(conn, make_user):
+    """Creates a shop (and its owner unless given); returns (owner_id, shop_id)"""
+    def make(owner_id=None, name=None, area='Satellite', services=(('Haircut', 200, 30),)):
+        owner_id = owner_id or make_user('shop_owner')
+        cursor = conn.execute('INSERT INTO shops (owner_id, name, area, address, description, contact_number) VALUES (?, ?, ?, ?, ?, ?)',
+                              (owner_id, name or f'Shop {next(_ids)}', area, '1 Test Road', 'A test shop', '9999999999'))
+        shop_id = cursor.lastrowid
+        conn.executemany('INSERT INTO services (shop_id, name, description, price, duration_minutes) VALUES (?, ?, ?, ?, ?)',
+                         [(shop_id, service, '', price, duration) for service, price, duration in services])
+        # As add_shop does, so owner pages already open see the new shop
+        bookmycut.owner_shops.bump(conn, owner_id)
+        conn.commit()
+        return owner_id, shop_id
+    return make
+
+@pytest.fixture
+def client_as(app):
+    """A test client already logged in as user_id"""
+    def make(user_id, role):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session.update({'loggedin': True, 'id': user_id, 'role': role, 'name': 'Test', 'email': 'test@test.local'})
+        return client
+    return make
+
+@pytest.fixture
+def future_day():
+    """A date comfortably ahead of today, distinct per call"""
+    offsets = itertools.count(30)
+    return lambda: (date.today() + timedelta(days=next(offsets))).isoformat()
@@ -0,0 +1,28 @@
+def service_ids(conn, shop_id):
+    return [row[0] for row in conn.execute('SELECT id FROM services WHERE shop_id = ? ORDER BY id', (shop_id,))]
+
+def summaries(conn, shop_id):
+    return [tuple(row) for row in conn.execute('SELECT services_list, service_count FROM appointments WHERE shop_id = ? ORDER BY id', (shop_id,))]
+
+def service_form(name, price='200', duration='30'):
+    return {'name': name, 'price': price, 'duration': duration, 'description': ''}
+
+def test_booking_stores_its_service_summary(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop(services=[('Haircut', 200, 30), ('Beard Trim', 100, 15)])
+    client = client_as(make_user(), 'customer')
+    client.post('/process_booking', data={'shop_id': shop_id, 'service_ids': service_ids(conn, shop_id), 'date': future_day(), 'time': '10:00'})
+    assert summaries(conn, shop_id) == [('Haircut, Beard Trim', 2)]
+
+def test_renamed_service_is_renamed_on_its_bookings(conn, make_user, make_shop, client_as, future_day):
+    owner_id, shop_id = make_shop(services=[('Haircut', 200, 30), ('Beard Trim', 100, 15)])
+    haircut, trim = service_ids(conn, shop_id)
+    customer = client_as(make_user(), 'customer')
+    customer.post('/process_booking', data={'shop_id': shop_id, 'service_ids': [haircut, trim], 'date': future_day(), 'time': '10:00'})
+    customer.post('/process_booking', data={'shop_id': shop_id, 'service_ids': [trim], 'date': future_day(), 'time': '10:00'})
+
+    owner = client_as(owner_id, 'shop_owner')
+    owner.post(f'/owner/edit_service/{trim}', data=service_form('Beard Sculpt', price='150'))
+    assert summaries(conn, shop_id) == [('Haircut, Beard Sculpt', 2), ('Beard Sculpt', 1)]
+
+    owner.post(f'/owner/delete_service/{haircut}')
+    assert summaries(conn, shop_id) == [('Beard Sculpt', 1), ('Beard Sculpt', 1)]
@@ -0,0 +1,114 @@
+import json
+import re
+import shutil
+import subprocess
+
+import pytest
+
+def service_ids(conn, shop_id):
+    return [row[0] for row in conn.execute('SELECT id FROM services WHERE shop_id = ? ORDER BY id', (shop_id,))]
+
+def slots_on(client, shop_id, services, day):
+    response = client.get('/api/availability', query_string={'shop_id': shop_id, 'service_ids': services, 'start': day, 'days': 1})
+    assert response.status_code == 200
+    return {slot['time']: slot['is_available'] for slot in response.get_json()['days'][0]['slots']}
+
+def test_slots_account_for_the_length_of_the_selected_services(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop(services=[('Haircut', 200, 30), ('Hair Spa', 600, 60)])
+    haircut, spa = service_ids(conn, shop_id)
+    client = client_as(make_user(), 'customer')
+    day = future_day()
+    client.post('/process_booking', data={'shop_id': shop_id, 'service_ids': [haircut], 'date': day, 'time': '11:00'})
+
+    short = slots_on(client, shop_id, [haircut], day)
+    long = slots_on(client, shop_id, [spa], day)
+    assert short['10:30'] and not short['11:00'] and short['11:30']
+    # A 60-minute booking from 10:30 would run into the 11:00 one
+    assert long['10:00'] and not long['10:30'] and not long['11:00'] and long['11:30']
+
+def test_slots_that_would_run_past_closing_are_unavailable(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop(services=[('Hair Spa', 600, 60)])
+    client = client_as(make_user(), 'customer')
+
+    slots = slots_on(client, shop_id, service_ids(conn, shop_id), future_day())
+    assert slots['19:00'] and not slots['19:30']
+
+def test_every_available_slot_can_be_booked(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop(services=[('Keratin', 2500, 90)])
+    services = service_ids(conn, shop_id)
+    client = client_as(make_user(), 'customer')
+    day = future_day()
+    client.post('/process_booking', data={'shop_id': shop_id, 'service_ids': services, 'date': day, 'time': '12:00'})
+
+    for time, available in slots_on(client, shop_id, services, day).items():
+        if available:
+            response = client.post('/process_booking', data={'shop_id': shop_id, 'service_ids': services, 'date': day, 'time': time})
+            assert '/payment/' in response.location, time
+            break
+
+def test_book_page_uses_the_same_rule(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop(services=[('Hair Spa', 600, 60)])
+    services = service_ids(conn, shop_id)
+    client = client_as(make_user(), 'customer')
+    day = future_day()
+    client.post('/process_booking', data={'shop_id': shop_id, 'service_ids': services, 'date': day, 'time': '11:00'})
+
+    page = client.get('/book', query_string={'shop_id': shop_id, 'service_ids': services, 'date': day}).get_data(as_text=True)
+    assert 'data-time="10:00" data-available="true"' in page
+    assert 'data-time="10:30" data-available="false"' in page
+
+# Runs the booking page's own script in node against a stub DOM holding the server-rendered slots
+SLOT_CLICK_HARNESS = '''
+const slots = %(slots)s;
+const alerts = [];
+function element(extra) {
+    return Object.assign({dataset: {}, classList: {add() {}, remove() {}, toggle() {}, contains() { return false; }},
+                          querySelector() { return element(); }}, extra);
+}
+const buttons = slots.map(([time, available]) => {
+    const button = element({dataset: {time, available}});
+    button.closest = () => button;
+    return button;
+});
+let onClick;
+const elements = {
+    slotGrid: element({querySelectorAll: () => buttons, replaceChildren() {},
+                       addEventListener: (type, handler) => { if (type === 'click') onClick = handler; }}),
+    selectedTime: element({value: ''}), submitBtn: element({disabled: true}),
+    dayoffNotice: element(), dayoffReason: element(),
+};
+global.document = {addEventListener: (type, handler) => handler(), getElementById: id => elements[id]};
+global.window = {location: {origin: 'http://localhost', href: 'http://localhost/book'}, history: {replaceState() {}}};
+global.flatpickr = () => {};
+global.fetch = () => new Promise(() => {});
+global.alert = message => alerts.push(message);
+%(script)s
+const picked = {};
+for (const [time] of slots) {
+    elements.selectedTime.value = '';
+    onClick({target: buttons.find(button => button.dataset.time === time)});
+    picked[time] = elements.selectedTime.value;
+}
+console.log(JSON.stringify({picked, alerts}));
+'''
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_book_page_lets_customers_pick_every_available_slot(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop(services=[('Hair Spa', 600, 60)])
+    services = service_ids(conn, shop_id)
+    client = client_as(make_user(), 'customer')
+    day = future_day()
+    client.post('/process_booking', data={'shop_id': shop_id, 'service_ids': services, 'date': day, 'time': '11:00'})
+
+    page = client.get('/book', query_string={'shop_id': shop_id, 'service_ids': services, 'date': day}).get_data(as_text=True)
+    slots = re.findall(r'data-time="([\d:]+)" data-available="(true|false)"', page)
+    script = next(block for block in re.findall(r'<script>(.*?)</script>', page, re.S) if 'slotGrid' in block)
+    output = subprocess.run(['node', '-e', SLOT_CLICK_HARNESS % {'slots': json.dumps(slots), 'script': script}],
+                            capture_output=True, text=True, timeout=30, check=True).stdout
+    result = json.loads(output)
+
+    # 10:00 ends as the 11:00 booking starts and 19:00 ends at closing: both must be selectable
+    assert result['picked']['10:00'] == '10:00'
+    assert result['picked']['19:00'] == '19:00'
+    assert result['picked']['10:30'] == '' and result['picked']['19:30'] == ''
+    assert result['alerts'] == []
@@ -0,0 +1,147 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import app as bookmycut
+
+def service_ids(conn, shop_id):
+    return [row[0] for row in conn.execute('SELECT id FROM services WHERE shop_id = ? ORDER BY id', (shop_id,))]
+
+def appointments(conn, shop_id):
+    return [tuple(row) for row in conn.execute('''
+        SELECT appointment_date, appointment_time, total_duration FROM appointments WHERE shop_id = ? ORDER BY id
+    ''', (shop_id,))]
+
+def book(client, shop_id, services, day, time):
+    return client.post('/process_booking', data={'shop_id': shop_id, 'service_ids': services, 'date': day, 'time': time})
+
+def test_overlapping_booking_is_rejected(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop(services=[('Hair Spa', 600, 60)])
+    services = service_ids(conn, shop_id)
+    client = client_as(make_user(), 'customer')
+    day = future_day()
+
+    assert '/payment/' in book(client, shop_id, services, day, '10:00').location
+    # Starts inside the first booking's hour
+    assert '/payment/' not in book(client, shop_id, services, day, '10:30').location
+    # Starts right as the first one ends
+    assert '/payment/' in book(client, shop_id, services, day, '11:00').location
+    assert appointments(conn, shop_id) == [(day, '10:00', 60), (day, '11:00', 60)]
+
+def test_overlap_checks_the_full_duration_of_the_new_booking(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop(services=[('Haircut', 200, 30), ('Hair Spa', 600, 60)])
+    haircut, spa = service_ids(conn, shop_id)
+    client = client_as(make_user(), 'customer')
+    day = future_day()
+
+    book(client, shop_id, [haircut], day, '11:00')
+    # 10:30 is free, but a 60-minute booking from there runs into 11:00
+    assert '/payment/' not in book(client, shop_id, [spa], day, '10:30').location
+    assert '/payment/' in book(client, shop_id, [haircut], day, '10:30').location
+
+def test_cancelled_booking_frees_its_slot(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop()
+    services = service_ids(conn, shop_id)
+    client = client_as(make_user(), 'customer')
+    day = future_day()
+
+    book(client, shop_id, services, day, '15:00')
+    appointment_id = conn.execute('SELECT MAX(id) FROM appointments WHERE shop_id = ?', (shop_id,)).fetchone()[0]
+    client.post(f'/cancel_appointment/{appointment_id}')
+    assert '/payment/' in book(client, shop_id, services, day, '15:00').location
+
+def test_unpadded_time_is_booked_and_stored_padded(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop()
+    client = client_as(make_user(), 'customer')
+    day = future_day()
+
+    assert '/payment/' in book(client, shop_id, service_ids(conn, shop_id), day, '9:00').location
+    assert appointments(conn, shop_id) == [(day, '09:00', 30)]
+
+def test_malformed_time_is_turned_away(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop()
+    client = client_as(make_user(), 'customer')
+
+    for time in ('', 'noon', '25:00'):
+        response = book(client, shop_id, service_ids(conn, shop_id), future_day(), time)
+        assert response.status_code == 302
+        assert '/book' in response.location
+    assert appointments(conn, shop_id) == []
+
+def test_time_to_minutes():
+    assert bookmycut.time_to_minutes('09:30') == 570
+    assert bookmycut.time_to_minutes('9:30') == 570
+    assert bookmycut.time_to_minutes('19:30:00') == 1170
+
+def reserve(engine, conn, user_id, shop_id, services, day, time, duration=30):
+    return engine.reserve(conn, user_id, shop_id, day, time, duration, 200, services, '2030-01-01 09:00:00')
+
+def test_concurrent_bookings_of_one_slot_let_exactly_one_through(conn, make_user, make_shop, future_day):
+    _, shop_id = make_shop()
+    services = service_ids(conn, shop_id)
+    customers = [make_user(), make_user()]
+    for _ in range(10):
+        day = future_day()
+        start = threading.Barrier(2)
+        results = []
+        def book_from_own_connection(user_id):
+            with bookmycut.db.borrow() as own:
+                start.wait()
+                results.append(reserve(bookmycut.reservations, own, user_id, shop_id, services, day, '10:00')[0])
+        threads = [threading.Thread(target=book_from_own_connection, args=(user_id,)) for user_id in customers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        assert len(results) == 2
+        assert sum(result is not None for result in results) == 1
+        assert appointments(conn, shop_id)[-1] == (day, '10:00', 30)
+        assert [row for row in appointments(conn, shop_id) if row[0] == day] == [(day, '10:00', 30)]
+
+def hold_write_lock(seconds):
+    """Another connection keeps SQLite's write lock for seconds, from a background thread"""
+    holder = sqlite3.connect(bookmycut.app.config['DATABASE'], isolation_level=None, check_same_thread=False)
+    holder.execute('BEGIN IMMEDIATE')
+    def release():
+        time.sleep(seconds)
+        holder.execute('COMMIT')
+        holder.close()
+    thread = threading.Thread(target=release)
+    thread.start()
+    return thread
+
+def test_busy_write_lock_is_retried_and_the_wait_reported(conn, make_user, make_shop, future_day):
+    _, shop_id = make_shop()
+    user_id, services = make_user(), service_ids(conn, shop_id)
+    engine = bookmycut.ReservationEngine(bookmycut.occupancy, max_attempts=50, lock_timeout_ms=20, backoff_ms=5, max_backoff_ms=20)
+    holder = hold_write_lock(0.2)
+    try:
+        appointment_id, lock_wait = reserve(engine, conn, user_id, shop_id, services, future_day(), '12:00')
+    finally:
+        holder.join()
+
+    assert appointment_id is not None
+    assert lock_wait >= 0.15
+    assert engine.stats['busy_retries'] > 0
+    assert engine.stats['lock_wait_ms'] >= 150
+
+def test_booking_gives_up_after_its_last_attempt(conn, make_user, make_shop, future_day):
+    _, shop_id = make_shop()
+    user_id, services = make_user(), service_ids(conn, shop_id)
+    engine = bookmycut.ReservationEngine(bookmycut.occupancy, max_attempts=2, lock_timeout_ms=10, backoff_ms=5, max_backoff_ms=5)
+    holder = hold_write_lock(0.3)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            reserve(engine, conn, user_id, shop_id, services, future_day(), '12:00')
+    finally:
+        holder.join()
+    assert engine.stats['busy_retries'] == 1
+
+def test_every_booking_reports_its_lock_wait(conn, make_user, make_shop, client_as, future_day):
+    _, shop_id = make_shop()
+    client = client_as(make_user(), 'customer')
+    response = book(client, shop_id, service_ids(conn, shop_id), future_day(), '16:00')
+    assert response.headers['Server-Timing'].startswith('booking-lock;dur=')
@@ -0,0 +1,117 @@
+import io
+
+import app as bookmycut
+
+def upload(client, kind, text):
+    return client.post('/owner/import?format=json', data={'kind': kind, 'file': (io.BytesIO(text.encode('utf-8')), f'{kind}.csv')},
+                       content_type='multipart/form-data').get_json()
+
+def shops_of(conn, owner_id):
+    return {row['name']: row['id'] for row in conn.execute('SELECT id, name FROM shops WHERE owner_id = ?', (owner_id,))}
+
+def shop_form(name, area='Bopal'):
+    return {'name': name, 'area': area, 'address': '9 New Road', 'description': '', 'contact': '9999999999'}
+
+def test_rows_are_validated_like_the_forms(make_user, client_as):
+    client = client_as(make_user('shop_owner'), 'shop_owner')
+    report = upload(client, 'shops', '﻿Name,Area,Address,Contact\n'
+                                     'Alpha Cuts,Bopal,1 Road,9999999999\n'
+                                     'Bad Phone,Bopal,1 Road,12ab\n'
+                                     ',Bopal,1 Road,9999999999\n'
+                                     + 'L' * 101 + ',Bopal,1 Road,9999999999\n'
+                                     'Alpha Cuts,Sola,2 Road,9999999999\n')
+    assert (report['rows'], report['imported'], report['rejected']) == (5, 1, 4)
+    assert [(error['line'], error['error']) for error in report['errors']] == [
+        (3, 'Contact number must be 10-15 digits'),
+        (4, 'name, area, address and contact are required'),
+        (5, 'Shop name must be less than 100 characters'),
+        (6, 'Shop "Alpha Cuts" already exists'),
+    ]
+
+def test_missing_columns_reject_the_file(make_user, client_as):
+    client = client_as(make_user('shop_owner'), 'shop_owner')
+    report = upload(client, 'shops', 'name,area\nAlpha,Bopal\n')
+    assert report['imported'] == 0
+    assert report['errors'] == [{'line': 1, 'error': 'Missing column(s): address, contact'}]
+
+def test_services_and_dayoffs_name_their_branch(conn, make_user, client_as):
+    owner_id = make_user('shop_owner')
+    client = client_as(owner_id, 'shop_owner')
+    upload(client, 'shops', 'name,area,address,contact\nNorth,Sola,1 Road,9999999999\nSouth,Paldi,2 Road,9999999999\n')
+    shops = shops_of(conn, owner_id)
+
+    report = upload(client, 'services', 'shop,name,price,duration\nNorth,Haircut,200,30\nSouth,Shave,abc,20\n'
+                                        'East,Shave,100,20\n,Shave,100,20\nSouth,Fade,150,0\n')
+    assert report['imported'] == 1
+    assert [error['error'] for error in report['errors']] == ['Price must be a number', 'Unknown shop "East"', 'shop is required',
+                                                             'Duration must be greater than 0']
+    assert conn.execute('SELECT shop_id FROM services WHERE name = ? AND shop_id IN (?, ?)', ('Haircut', shops['North'], shops['South'])).fetchall()[0][0] == shops['North']
+
+    report = upload(client, 'dayoffs', 'shop,off_date,reason\nSouth,2030-05-01,Holiday\nSouth,2030-05-01,Again\nNorth,01/05/2030,\n')
+    assert report['imported'] == 1
+    assert [error['error'] for error in report['errors']] == ['This date is already marked as a day off', 'off_date must be YYYY-MM-DD']
+
+def test_single_shop_owner_may_leave_out_the_shop_column(conn, make_shop, client_as):
+    owner_id, shop_id = make_shop()
+    report = upload(client_as(owner_id, 'shop_owner'), 'services', 'name,price,duration,description\nBeard Trim,100,15,Tidy\n')
+    assert report['imported'] == 1
+    assert conn.execute("SELECT COUNT(*) FROM services WHERE shop_id = ? AND name = 'Beard Trim'", (shop_id,)).fetchone()[0] == 1
+
+def test_rows_are_saved_in_chunks(conn, make_user):
+    owner_id = make_user('shop_owner')
+    lines = ['name,area,address,contact'] + [f'Chunk {n},Bopal,{n} Road,9999999999' for n in range(7)] + ['Broken,Bopal,1 Road,1']
+    report = bookmycut.import_csv(conn, 'shops', lines, owner_id, chunk_rows=3, max_errors=10)
+    assert (report.rows, report.imported, report.error_count) == (8, 7, 1)
+    assert len(shops_of(conn, owner_id)) == 7
+
+def test_editing_one_branch_leaves_the_others_alone(conn, make_user, client_as):
+    owner_id = make_user('shop_owner')
+    client = client_as(owner_id, 'shop_owner')
+    upload(client, 'shops', 'name,area,address,contact\nBranch A,Navrangpura,1 Road,9999999999\nBranch B,Paldi,2 Road,9999999999\n')
+    shops = shops_of(conn, owner_id)
+
+    client.post('/owner/switch_shop', data={'shop_id': shops['Branch B']})
+    client.post('/owner/edit_shop', data=shop_form('Branch B2', area='Bopal'))
+    rows = {tuple(row) for row in conn.execute('SELECT id, name, area FROM shops WHERE owner_id = ?', (owner_id,))}
+    assert rows == {(shops['Branch A'], 'Branch A', 'Navrangpura'), (shops['Branch B'], 'Branch B2', 'Bopal')}
+
+    suggestions = {item['term'] for item in client.get('/api/autocomplete?q=branch').get_json()['suggestions']}
+    assert {'Branch A', 'Branch B2'} <= suggestions and 'Branch B' not in suggestions
+
+def test_owner_pages_follow_the_selected_branch(conn, make_user, client_as):
+    owner_id = make_user('shop_owner')
+    client = client_as(owner_id, 'shop_owner')
+    upload(client, 'shops', 'name,area,address,contact\nFirst,Sola,1 Road,9999999999\nSecond,Gota,2 Road,9999999999\n')
+    shops = shops_of(conn, owner_id)
+
+    assert 'First' in client.get('/owner/dashboard').get_data(as_text=True).split('<h2')[1][:200]
+    client.post('/owner/switch_shop', data={'shop_id': shops['Second']})
+    assert 'Second' in client.get('/owner/dashboard').get_data(as_text=True).split('<h2')[1][:200]
+
+    client.post('/owner/add_service', data={'name': 'Second Cut', 'price': '150', 'duration': '20', 'description': ''})
+    client.post('/owner/add_dayoff', data={'off_date': '2030-06-01', 'reason': 'Stocktake'})
+    assert conn.execute("SELECT shop_id FROM services WHERE name = 'Second Cut'").fetchone()[0] == shops['Second']
+    assert conn.execute("SELECT shop_id FROM shop_dayoffs WHERE off_date = '2030-06-01' AND reason = 'Stocktake'").fetchone()[0] == shops['Second']
+    assert 'Stocktake' in client.get('/owner/dayoffs').get_data(as_text=True)
+
+def test_cannot_switch_to_someone_elses_shop(conn, make_shop, client_as):
+    owner_id, shop_id = make_shop(name='Mine')
+    _, other_shop_id = make_shop(name='Theirs')
+    client = client_as(owner_id, 'shop_owner')
+
+    client.post('/owner/switch_shop', data={'shop_id': other_shop_id})
+    client.post('/owner/edit_shop', data=shop_form('Mine Renamed'))
+    assert conn.execute('SELECT name FROM shops WHERE id = ?', (shop_id,)).fetchone()[0] == 'Mine Renamed'
+    assert conn.execute('SELECT name FROM shops WHERE id = ?', (other_shop_id,)).fetchone()[0] == 'Theirs'
+
+def test_cli_import(conn, make_user, app, tmp_path):
+    owner_id = make_user('shop_owner')
+    email = conn.execute('SELECT email FROM users WHERE id = ?', (owner_id,)).fetchone()[0]
+    path = tmp_path / 'shops.csv'
+    path.write_text('name,area,address,contact\nCLI Shop,Sola,1 Road,9999999999\nCLI Shop,Sola,1 Road,9999999999\n', encoding='utf-8')
+
+    result = app.test_cli_runner().invoke(args=['import-csv', 'shops', str(path), '--owner', email])
+    assert 'Imported 1 of 2 shops rows' in result.output
+    assert 'line 3: Shop "CLI Shop" already exists' in result.output
+    result = app.test_cli_runner().invoke(args=['import-csv', 'shops', str(path), '--owner', 'nobody@test.local'])
+    assert result.exit_code != 0
@@ -0,0 +1,22 @@
+import app as bookmycut
+
+def lease_until(conn):
+    return conn.execute('SELECT refresh_lease_until FROM site_stats WHERE id = 1').fetchone()[0]
+
+def test_stale_stats_never_commit_the_callers_writes(conn):
+    stats = bookmycut.SiteStatsCache(bookmycut.db, ttl=60)
+    stats.refresh = lambda: None
+    stats.get(conn)
+    conn.execute('UPDATE site_stats SET computed_at = 0, refresh_lease_until = 0 WHERE id = 1')
+    conn.commit()
+
+    conn.execute("INSERT INTO users (name, email, password) VALUES ('Pending', 'pending@test.local', 'x')")
+    stats.get(conn)
+    conn.rollback()
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE email = 'pending@test.local'").fetchone()[0] == 0
+    assert lease_until(conn) == 0
+
+    # With nothing pending, the lease is taken on the cache's own connection
+    stats.get(conn)
+    assert not conn.in_transaction
+    assert lease_until(conn) > bookmycut.unix_time()
@@ -0,0 +1,53 @@
+import re
+
+import app as bookmycut
+
+def test_shop_created_in_another_session_is_seen_at_once(conn, make_user, make_shop, client_as):
+    owner_id = make_user('shop_owner')
+    tab = client_as(owner_id, 'shop_owner')
+    assert '/owner/add_shop' in tab.get('/owner/analytics').location
+
+    # Created from another browser (or by an import): the first one must not keep redirecting
+    make_shop(owner_id=owner_id)
+    assert tab.get('/owner/analytics').status_code == 200
+    assert tab.get('/owner/export/appointments.csv').status_code == 200
+
+def test_deleted_shop_is_not_served_from_a_stale_session(conn, make_user, make_shop, client_as):
+    owner_id, shop_id = make_shop()
+    tab = client_as(owner_id, 'shop_owner')
+    assert tab.get('/owner/analytics').status_code == 200
+
+    conn.execute('DELETE FROM services WHERE shop_id = ?', (shop_id,))
+    conn.execute('DELETE FROM shops WHERE id = ?', (shop_id,))
+    bookmycut.owner_shops.bump(conn, owner_id)
+    conn.commit()
+    assert '/owner/add_shop' in tab.get('/owner/analytics').location
+
+def shop_queries(monkeypatch):
+    """SQL run against shops by every pooled connection handed out from now on"""
+    statements = []
+    acquire = bookmycut.db.acquire
+    def traced_acquire():
+        conn = acquire()
+        conn.set_trace_callback(lambda sql: statements.append(sql) if re.search(r'\bFROM shops\b', sql) else None)
+        return conn
+    monkeypatch.setattr(bookmycut.db, 'acquire', traced_acquire)
+    return statements
+
+def test_owner_pages_reuse_the_shop_map_until_an_edit(make_shop, client_as, monkeypatch):
+    owner_id, _ = make_shop()
+    tab = client_as(owner_id, 'shop_owner')
+    statements = shop_queries(monkeypatch)
+
+    def dashboard_queries():
+        statements.clear()
+        assert tab.get('/owner/dashboard').status_code == 200
+        return len(statements)
+
+    cold = dashboard_queries()
+    warm = dashboard_queries()
+    # Warm: the managed shop's row and the branch list, with no lookup of the owner's shop ids
+    assert warm == cold - 1 == 2
+    tab.post('/owner/edit_shop', data={'name': 'Renamed', 'area': 'Bopal', 'address': '1 Road', 'description': '', 'contact': '9999999999'})
+    assert dashboard_queries() == cold
+    assert dashboard_queries() == warm
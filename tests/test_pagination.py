@@ -0,0 +1,75 @@
+import app as bookmycut
+
+def add_appointments(conn, user_id, shop_id, slots):
+    conn.executemany('''
+        INSERT INTO appointments (user_id, shop_id, appointment_date, appointment_time, total_duration, total_price, status, payment_status)
+        VALUES (?, ?, ?, ?, 30, 200, 'confirmed', 'unpaid')
+    ''', [(user_id, shop_id, day, time) for day, time in slots])
+    conn.commit()
+
+def walk(client, url, key, **params):
+    """Follows next_cursor to the end; returns every item and how many pages it took"""
+    items, pages, cursor = [], 0, None
+    while True:
+        response = client.get(url, query_string={**params, 'format': 'json', 'limit': 3, **({'cursor': cursor} if cursor else {})})
+        page = response.get_json()[key]
+        items += page['items']
+        pages += 1
+        cursor = page['next_cursor']
+        if not cursor:
+            return items, pages
+
+def test_cursor_walk_returns_every_row_once_in_order(conn, make_user, make_shop, client_as):
+    customer_id = make_user()
+    _, shop_id = make_shop()
+    # Ties on date and time are broken by id
+    slots = [('2030-01-0%d' % day, time) for day in (1, 2, 3) for time in ('10:00', '10:00', '11:30')] + [('2030-01-04', '09:00')]
+    add_appointments(conn, customer_id, shop_id, slots)
+
+    items, pages = walk(client_as(customer_id, 'customer'), '/dashboard', 'appointments')
+    keys = [(item['appointment_date'], item['appointment_time'], item['id']) for item in items]
+    assert len(keys) == len(slots) == len(set(keys))
+    assert keys == sorted(keys, reverse=True)
+    assert pages == 4
+
+def test_rows_added_while_paging_do_not_shift_later_pages(conn, make_user, make_shop, client_as):
+    customer_id = make_user()
+    _, shop_id = make_shop()
+    add_appointments(conn, customer_id, shop_id, [('2030-02-%02d' % day, '10:00') for day in range(1, 7)])
+    client = client_as(customer_id, 'customer')
+
+    first = client.get('/dashboard?format=json&limit=3').get_json()['appointments']
+    add_appointments(conn, customer_id, shop_id, [('2030-03-01', '10:00')])
+    second = client.get(f"/dashboard?format=json&limit=3&cursor={first['next_cursor']}").get_json()['appointments']
+    assert [item['appointment_date'] for item in first['items'] + second['items']] == ['2030-02-%02d' % day for day in range(6, 0, -1)]
+
+def test_cursor_round_trip_and_foreign_tokens():
+    token = bookmycut.encode_cursor(['2030-01-01', '10:00', 7])
+    assert bookmycut.decode_cursor(token, 3) == ['2030-01-01', '10:00', 7]
+    assert bookmycut.decode_cursor(token, 2) is None
+    assert bookmycut.decode_cursor('not-a-cursor', 3) is None
+    assert bookmycut.decode_cursor(bookmycut.encode_cursor([{'id': 1}]), 1) is None
+
+def test_garbage_cursor_starts_from_the_first_page(conn, make_user, make_shop, client_as):
+    customer_id = make_user()
+    _, shop_id = make_shop()
+    add_appointments(conn, customer_id, shop_id, [('2030-04-01', '10:00')])
+    response = client_as(customer_id, 'customer').get('/dashboard?format=json&cursor=%%%')
+    assert response.status_code == 200
+    assert len(response.get_json()['appointments']['items']) == 1
+
+def test_search_results_page_by_rank_past_the_first_page(conn, make_user, make_shop, client_as):
+    shop_ids = [make_shop(name=f'Zephyr Cuts {n}', area='Gota' if n % 2 else 'Satellite')[1] for n in range(8)]
+    # make_shop writes directly; let the area filter see the new areas
+    bookmycut.search_index.bump(conn)
+    conn.commit()
+    client = client_as(make_user(), 'customer')
+
+    items, pages = walk(client, '/shops', 'shops', q='zephyr')
+    keys = [(item['score'], item['id']) for item in items]
+    assert sorted(item['id'] for item in items) == shop_ids
+    assert keys == sorted(keys)
+    assert pages == 3
+
+    items, _ = walk(client, '/shops', 'shops', q='zephyr', area='Gota')
+    assert [item['id'] for item in items] == sorted(shop_ids[1::2])
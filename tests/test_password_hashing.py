@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import app as bookmycut
+
+APP_PATH = bookmycut.__file__
+
+def test_spawned_child_skips_the_boot_work(tmp_path):
+    # What a 'spawn' hashing process does when the app was started with `python app.py`
+    env = dict(os.environ, DATABASE_PATH=str(tmp_path / 'child.db'), ASSETS_FOLDER=str(tmp_path / 'dist'),
+               TEMPLATE_WARMUP='1')
+    subprocess.run([sys.executable, '-c', f'import runpy; runpy.run_path({APP_PATH!r}, run_name="__mp_main__")'],
+                   env=env, check=True, timeout=60)
+    assert not (tmp_path / 'child.db').exists()
+    assert not (tmp_path / 'dist').exists()
+
+def test_pool_hashes_and_checks():
+    hasher = bookmycut.PasswordHasher('pbkdf2:sha256:1000', pool_size=1, queue_depth=2, wait=5)
+    try:
+        stored = hasher.hash('secret123')
+        assert stored.startswith('pbkdf2:sha256:1000$')
+        assert hasher.check(stored, 'secret123')
+        assert not hasher.check(stored, 'wrong')
+        assert not hasher.needs_rehash(stored)
+        assert hasher.needs_rehash(bookmycut.generate_password_hash('secret123', 'pbkdf2:sha256:2000'))
+    finally:
+        hasher.shutdown()
+
+def test_full_queue_is_turned_away():
+    hasher = bookmycut.PasswordHasher('pbkdf2:sha256:1000', pool_size=0, queue_depth=1, wait=0.01)
+    hasher._slots.acquire()
+    try:
+        with pytest.raises(bookmycut.HashingBusy):
+            hasher.hash('secret123')
+    finally:
+        hasher._slots.release()
+    assert hasher.stats['rejected'] == 1
@@ -0,0 +1,104 @@
+import sqlite3
+
+import app as bookmycut
+
+def migrate_up_to(conn, monkeypatch, last_version):
+    """Applies migrations up to last_version only, as an older deployment would have"""
+    every = bookmycut.discover_migrations()
+    with monkeypatch.context() as patch:
+        patch.setattr(bookmycut, 'discover_migrations', lambda: [m for m in every if m[0] <= last_version])
+        bookmycut.apply_migrations(conn)
+
+def add_legacy_booking(conn, day, time, duration=30):
+    """A booking written straight to the table, the way early releases stored the time as typed"""
+    conn.execute("INSERT OR IGNORE INTO users (id, name, email, password) VALUES (1, 'Old', 'old@test.local', 'x')")
+    conn.execute("INSERT OR IGNORE INTO shops (id, owner_id, name, area, address) VALUES (1, 1, 'Old Shop', 'Sola', '1 Road')")
+    conn.execute('INSERT INTO appointments (user_id, shop_id, appointment_date, appointment_time, total_duration) VALUES (1, 1, ?, ?, ?)',
+                 (day, time, duration))
+    conn.commit()
+
+def test_fresh_database_serves_hot_queries_from_their_indexes(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'fresh.db')
+    try:
+        bookmycut.apply_migrations(conn)
+        assert bookmycut.check_query_plans(conn) == []
+    finally:
+        conn.close()
+
+def test_migrations_apply_once(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'fresh.db')
+    try:
+        assert bookmycut.apply_migrations(conn)
+        assert bookmycut.apply_migrations(conn) == []
+    finally:
+        conn.close()
+
+def test_check_reports_a_dropped_index(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'fresh.db')
+    try:
+        bookmycut.apply_migrations(conn)
+        conn.execute('DROP INDEX idx_services_shop')
+        problems = bookmycut.check_query_plans(conn)
+        assert len(problems) == 1 and problems[0].startswith('shop services:')
+    finally:
+        conn.close()
+
+def test_unpadded_times_are_padded_and_their_bitmaps_rebuilt(tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / 'legacy.db')
+    try:
+        migrate_up_to(conn, monkeypatch, 10)
+        add_legacy_booking(conn, '2030-01-02', '9:30')
+        add_legacy_booking(conn, '2030-01-02', '10:00')
+        # A bitmap built from the old fixed-width read, which took '9:30' as 09:00
+        conn.execute('INSERT INTO shop_day_occupancy (shop_id, day, mask) VALUES (1, ?, ?)',
+                     ('2030-01-02', bookmycut.range_mask(540, 30).to_bytes(bookmycut.MASK_BYTES, 'little')))
+        conn.commit()
+
+        bookmycut.apply_migrations(conn)
+        times = [row[0] for row in conn.execute('SELECT appointment_time FROM appointments ORDER BY appointment_date, appointment_time')]
+        assert times == ['09:30', '10:00']
+        assert bookmycut.occupancy.load(conn, 1, '2030-01-02') == bookmycut.range_mask(570, 60)
+    finally:
+        conn.close()
+
+def test_start_minute_reads_unpadded_times(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'fresh.db')
+    try:
+        bookmycut.apply_migrations(conn)
+        add_legacy_booking(conn, '2030-01-03', '9:30')
+        assert conn.execute(f'SELECT {bookmycut.START_MINUTE_SQL} FROM appointments').fetchone()[0] == 570
+        assert bookmycut.occupancy.build(conn, 1, '2030-01-03') == bookmycut.range_mask(570, 30)
+    finally:
+        conn.close()
+
+def test_hourly_backfill_buckets_unpadded_times(tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / 'legacy.db')
+    conn.row_factory = sqlite3.Row
+    try:
+        migrate_up_to(conn, monkeypatch, 8)
+        for time in ('9:30', '9:00', '10:00', '19:30'):
+            add_legacy_booking(conn, '2030-01-04', time)
+        expected = [(9, 2), (10, 1), (19, 1)]
+
+        bookmycut.apply_migrations(conn)
+        hourly = 'SELECT hour, bookings FROM shop_hourly_stats WHERE shop_id = 1 ORDER BY hour'
+        assert [tuple(row) for row in conn.execute(hourly)] == expected
+
+        conn.execute("UPDATE appointments SET appointment_time = '9:30' WHERE appointment_time = '09:30'")
+        bookmycut.backfill_shop_analytics(conn)
+        assert [tuple(row) for row in conn.execute(hourly)] == expected
+    finally:
+        conn.close()
+
+def test_payments_export_walks_the_shops_appointments(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'fresh.db')
+    try:
+        bookmycut.apply_migrations(conn)
+        _, sql = bookmycut.EXPORTS['payments']
+        plan = [('payments export', sql, (1, '2025-01-01', '2025-02-01'), 'idx_appointments_shop_schedule')]
+        assert bookmycut.check_query_plans(conn, plan) == []
+        details = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', (1, '2025-01-01', '2025-02-01'))]
+        assert details[0].startswith('SEARCH a USING INDEX idx_appointments_shop_schedule')
+        assert any('idx_payments_appointment' in detail for detail in details)
+    finally:
+        conn.close()